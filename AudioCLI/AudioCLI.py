@@ -1,25 +1,41 @@
+# PYTHON_ARGCOMPLETE_OK
 from termcolor import cprint
-
-cprint("Loading AudioCLI...", color="yellow")
-from .src.client import InteractiveClient
+from .src import daemon
 import sys
 import os
 
 
 def main():
+    serve = sys.argv[1:2] == ["serve"]
+    if serve and sys.argv[2:] == ["stop"]:
+        if not daemon.stop():
+            cprint("Error: no daemon is running.", color="red")
+        return
+    if len(sys.argv) > 1 and not serve and "_ARGCOMPLETE" not in os.environ:
+        # a running 'audiocli serve' answers one-shot commands without loading anything here
+        code = daemon.forward(sys.argv[1:])
+        if code is not None:
+            sys.exit(code)
+
+    cprint("Loading AudioCLI...", color="yellow")
+    from .src.client import InteractiveClient, SETTINGS_PATH
+    import argcomplete
+
     # get file path
     client = InteractiveClient()
+    # answers shell tab completion (and exits) when called by argcomplete, the parser comes from the command manifest
+    argcomplete.autocomplete(client.parser)
     client.load_from_settings()
     client.parser.interactive_history_file = os.path.join(
         os.path.dirname(os.path.realpath(__file__)), "h.acli_history"
     )
-    client.parser.sections = {
-        value.name: [] for key, value in client.categories.items()
-    }
+    client.parser.sections = {name: [] for name in client.categories.names()}
 
     cprint(f"Loaded {len(client.categories)} categories.", color="yellow")
 
-    if len(sys.argv) > 1:
+    if serve:
+        daemon.serve(client, SETTINGS_PATH)
+    elif len(sys.argv) > 1:
         client.parser.launch()
     else:
         cprint(
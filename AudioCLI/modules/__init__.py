@@ -45,6 +45,7 @@ Every command function needs to have proper docstrings to be picked up by the pa
 
 Every category class needs an overridden _get_info() function that returns a dictionary with the name and description of the category. 
 You also have to define the exposed commands in the _get_commands() function. This function should return a dictionary with the command name as key and the function as value.
+Discovered categories and commands are saved to command_manifest.json so later launches don't have to import them, the manifest is rebuilt whenever a file in modules/ changes.
 
 Have a look at the header of the process category, together with the resample command:
 ```python
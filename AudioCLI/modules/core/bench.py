@@ -0,0 +1,306 @@
+from AudioCLI.src.client import BaseCommandCategory
+from AudioCLI.src.target_data import TargetData
+from AudioCLI.src.bench import (
+    BENCH_DIR,
+    make_corpus,
+    corpus_stats,
+    measure,
+    serve_directory,
+    save_baseline,
+    load_baseline,
+    list_baselines,
+    compare,
+)
+from termcolor import cprint
+import tempfile
+import shutil
+import time
+import os
+
+"""
+Benchmark process commands, scanning and downloading on synthetic corpora.
+Every run is saved as the 'latest' baseline, --save keeps a named copy to compare later runs against.
+"""
+
+# benchmark name: (process command, kwargs)
+PROCESS_BENCHMARKS = {
+    "resample": ("resample", {"sample_rate": 22050}),
+    "mono": ("mono", {}),
+    "stereo": ("stereo", {}),
+    "bitdepth": ("bitdepth", {"bit_depth": 16}),
+    "phaseflip": ("phaseflip", {}),
+    "noise": ("noise", {"noise_level": 0.1}),
+    "pool": ("pool", {}),
+    "pitch": ("pitch", {"pitch": 2}),
+    "pitch_fast": ("pitch", {"pitch": 2, "mode": "fast"}),
+    "chunk": ("chunk", {"length": 1.0}),
+    "remove_silent": ("remove_silent", {"dry_run": True}),
+}
+
+# client settings a benchmark run resets, so results only depend on the run options
+SETTINGS = [
+    "target_data",
+    "output_dir",
+    "batch_size",
+    "executor",
+    "pipeline",
+    "stream_block",
+    "batching",
+    "cache",
+    "overlap",
+    "coordinator",
+    "memory_budget",
+    "pack_dtype",
+    "pt_format",
+    "pt_dtype",
+]
+
+
+class BenchCommands(BaseCommandCategory):
+    """
+    Benchmark AudioCLI on synthetic corpora.
+    """
+
+    def _get_info(self):
+        return {
+            "name": "bench",
+            "description": "Benchmark on synthetic corpora.",
+        }
+
+    # Declare exposed commands
+    def _get_commands(self):
+        return {
+            "corpus": self.corpus,
+            "run": self.run,
+            "compare": self.compare,
+            "baselines": self.baselines,
+        }
+
+    # Define commands
+    def corpus(self, path: str, files: int = 48, seed: int = 0):
+        """
+        Write a deterministic synthetic corpus of mixed formats, sample rates, channel counts and durations.
+
+        Args:\n
+            path (str): Directory to write the corpus to\n
+            files (int): Number of files\n
+            seed (int): Random seed, the same seed always gives the same corpus\n
+        """
+        paths = make_corpus(path, int(files), int(seed))
+        seconds, size = corpus_stats(paths)
+        cprint(
+            f"Corpus of {len(paths)} files ({seconds:.1f} s, {size / (1 << 20):.1f} MB) in {path}",
+            color="green",
+        )
+
+    def run(
+        self,
+        files: int = 48,
+        seed: int = 0,
+        workers: list = ["1", "4"],
+        executors: list = ["thread", "process"],
+        benchmarks: list = ["all"],
+        save: str = "",
+    ):
+        """
+        Time process commands, scanning and downloading on a synthetic corpus and report files/s, audio seconds/s and MB/s.
+        Process commands run once per executor and worker count, downloads once per worker count against a local HTTP server.
+        Session settings are restored afterwards.
+
+        Args:\n
+            files (int): Number of files in the corpus\n
+            seed (int): Random seed of the corpus\n
+            workers (list): Worker counts to run with\n
+            executors (list): Executors to run with, 'thread' and/or 'process'\n
+            benchmarks (list): Benchmarks to run, any of the process commands, 'scan', 'download' or 'all'\n
+            save (str): Also save the results as a named baseline\n
+        """
+        names = list(PROCESS_BENCHMARKS) + ["scan", "download"]
+        if benchmarks == ["all"]:
+            benchmarks = names
+        unknown = [name for name in benchmarks if name not in names]
+        if unknown:
+            cprint(f"Error: unknown benchmarks {unknown}, use {names}.", color="red")
+            return
+        if any(executor not in ["thread", "process"] for executor in executors):
+            cprint("Error: executors must be 'thread' or 'process'.", color="red")
+            return
+        workers = [int(count) for count in workers]
+
+        corpus_dir = os.path.join(BENCH_DIR, f"corpus_{int(files)}_{int(seed)}")
+        paths = make_corpus(corpus_dir, int(files), int(seed))
+        seconds, size = corpus_stats(paths)
+        cprint(
+            f"Benchmarking on {len(paths)} files ({seconds:.1f} s, {size / (1 << 20):.1f} MB)",
+            color="yellow",
+        )
+
+        saved = {name: getattr(self.client, name) for name in SETTINGS}
+        work_dir = tempfile.mkdtemp(prefix="audiocli_bench_")
+        results = []
+        try:
+            self.client.pipeline = False
+            self.client.stream_block = None
+            self.client.batching = False
+            self.client.cache = "off"
+            self.client.overlap = None
+            self.client.coordinator = None
+            self.client.memory_budget = None
+            self.client.one_shot_args["overwrite_mode"] = None
+            self.client.one_shot_args["pt_save"] = False
+            self.client.one_shot_args["pack"] = False
+            for name in benchmarks:
+                if name == "scan":
+                    results.extend(self._bench_scan(corpus_dir, paths, seconds, size))
+                elif name == "download":
+                    results.extend(
+                        self._bench_download(
+                            corpus_dir, work_dir, paths, seconds, size, workers
+                        )
+                    )
+                else:
+                    results.extend(
+                        self._bench_process(
+                            name,
+                            corpus_dir,
+                            work_dir,
+                            paths,
+                            seconds,
+                            size,
+                            workers,
+                            executors,
+                        )
+                    )
+        finally:
+            for name, value in saved.items():
+                setattr(self.client, name, value)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        config = {"files": int(files), "seed": int(seed), "workers": workers}
+        save_baseline("latest", results, config)
+        if save:
+            path = save_baseline(save, results, config)
+            cprint(f"Saved baseline to {path}", color="green")
+
+    def compare(self, baseline: str, other: str = "latest"):
+        """
+        Compare the files/s of two saved baselines, matching benchmarks by name, executor and worker count.
+
+        Args:\n
+            baseline (str): Name (or path) of the baseline to compare against\n
+            other (str): Name (or path) of the baseline to compare, defaults to the latest run\n
+        """
+        try:
+            old = load_baseline(baseline)
+            new = load_baseline(other)
+        except (OSError, ValueError) as e:
+            cprint(f"Error: {e}", color="red")
+            return
+        cprint(
+            f"{baseline} ({old['commit']}, {old['date']}) -> {other} ({new['commit']}, {new['date']})",
+            color="yellow",
+        )
+        rows = compare(old, new)
+        if not rows:
+            cprint("No matching benchmarks.", color="red")
+            return
+        for (name, executor, workers), before, after, change in rows:
+            color = "green" if change >= 0 else "red"
+            cprint(
+                f"{name:<14} {executor:<8} {workers:>3} workers  {before:9.2f} -> {after:9.2f} files/s  ({change:+.1f}%)",
+                color=color,
+            )
+
+    def baselines(self):
+        """
+        List saved baselines.
+        """
+        names = list_baselines()
+        if not names:
+            cprint("No saved baselines.", color="red")
+            return
+        for name in names:
+            baseline = load_baseline(name)
+            cprint(
+                f"{name}: commit {baseline['commit']}, {baseline['date']}, {baseline['machine']}",
+                color="green",
+            )
+
+    def _report(self, name, executor, workers, result):
+        cprint(
+            f"{name:<14} {executor:<8} {workers:>3} workers  {result['files_per_s']:9.2f} files/s  {result['audio_s_per_s']:9.1f} audio s/s  {result['mb_per_s']:8.2f} MB/s",
+            color="green",
+        )
+        return {"name": name, "executor": executor, "workers": workers, **result}
+
+    def _bench_process(
+        self, name, corpus_dir, work_dir, paths, seconds, size, workers, executors
+    ):
+        process = self.client.categories["ProcessCommands"]
+        command, kwargs = PROCESS_BENCHMARKS[name]
+        self.client.target_data = TargetData(index_path=None)
+        self.client.target_data.scan([corpus_dir])
+        results = []
+        for executor in executors:
+            for count in workers:
+                self.client.executor = executor
+                self.client.batch_size = count
+                self.client.output_dir = os.path.join(
+                    work_dir, f"{name}_{executor}_{count}"
+                )
+                os.makedirs(self.client.output_dir, exist_ok=True)
+                if executor == "process":
+                    # start the worker processes first, importing torch in them is not part of the work
+                    pool = process._get_process_pool(count)
+                    list(pool.map(time.sleep, [0.5] * count))
+                result = measure(
+                    lambda: process._get_commands()[command](**kwargs),
+                    len(paths),
+                    seconds,
+                    size,
+                )
+                results.append(self._report(name, executor, count, result))
+                shutil.rmtree(self.client.output_dir, ignore_errors=True)
+        return results
+
+    def _bench_scan(self, corpus_dir, paths, seconds, size):
+        # cold scans build a new index, warm scans reuse it and only stat the directories
+        index_path = os.path.join(
+            tempfile.mkdtemp(prefix="audiocli_bench_"), "index.db"
+        )
+        results = []
+        try:
+            for name in ["scan_cold", "scan_warm"]:
+                target_data = TargetData(index_path=index_path)
+                result = measure(
+                    lambda: target_data.scan([corpus_dir]), len(paths), seconds, size
+                )
+                results.append(self._report(name, "-", 1, result))
+        finally:
+            shutil.rmtree(os.path.dirname(index_path), ignore_errors=True)
+        return results
+
+    def _bench_download(self, corpus_dir, work_dir, paths, seconds, size, workers):
+        from AudioCLI.src.downloader import AUDIO_EXTS
+
+        download = self.client.categories["DownloadCommands"]
+        # only formats the directory crawler picks up are downloaded
+        listed = [path for path in paths if path.endswith(AUDIO_EXTS)]
+        listed_seconds, listed_size = corpus_stats(listed)
+        server, url = serve_directory(corpus_dir)
+        results = []
+        try:
+            for count in workers:
+                self.client.batch_size = count
+                output_dir = os.path.join(work_dir, f"download_{count}")
+                result = measure(
+                    lambda: download._http_download_all(url, output_dir),
+                    len(listed),
+                    listed_seconds,
+                    listed_size,
+                )
+                results.append(self._report("download", "thread", count, result))
+                shutil.rmtree(output_dir, ignore_errors=True)
+        finally:
+            server.shutdown()
+        return results
@@ -0,0 +1,76 @@
+from AudioCLI.src.client import BaseCommandCategory
+from AudioCLI.src.cluster import Worker, run_task, cluster_token
+from termcolor import cprint
+import functools
+
+"""
+Worker nodes for distributed processing, the coordinator is a session with 'target coordinator <address>' set.
+"""
+
+
+class ClusterCommands(BaseCommandCategory):
+    """
+    Distributed processing over several hosts.
+    """
+
+    def _get_info(self):
+        return {
+            "name": "cluster",
+            "description": "Distributed processing over several hosts.",
+        }
+
+    # Declare exposed commands
+    def _get_commands(self):
+        return {
+            "worker": self.worker,
+        }
+
+    # Define commands
+    def worker(self, address: str, connections: int = 0, jobs: int = 0):
+        """
+        Run as a worker node: pull the tasks of a coordinator, run them on this host and acknowledge them.
+        Tasks run on the executor and device of this session, every connection holds one task at a time.
+        Waits for the coordinator to come up, also between its commands. Stop with Ctrl+C.
+        The worker and the coordinator need the same cluster token (target cluster_token or AUDIOCLI_CLUSTER_TOKEN).
+
+        Args:\n
+            address (str): Coordinator host:port\n
+            connections (int): Tasks run at the same time, defaults to the batch size\n
+            jobs (int): Stop after this many coordinator commands, 0 runs until interrupted\n
+        """
+        connections = int(connections) or self.client.batch_size
+        run = functools.partial(self._run_task, device=str(self.client.device))
+        if self.client.executor == "process":
+            run = functools.partial(
+                self._run_pooled,
+                pool=self.client.categories["ProcessCommands"]._get_process_pool(
+                    connections
+                ),
+                device=str(self.client.device),
+            )
+        try:
+            worker = Worker(
+                address,
+                run,
+                connections=connections,
+                jobs=int(jobs),
+                token=cluster_token(self.client.cluster_token),
+            )
+        except ValueError as e:
+            cprint(f"Error: {e}", color="red")
+            return
+        cprint(
+            f"Worker pulling from {address} with {connections} connections, stop with Ctrl+C.",
+            color="yellow",
+        )
+        try:
+            tasks = worker.start()
+        except KeyboardInterrupt:
+            tasks = worker.tasks
+        cprint(f"Worker stopped after {tasks} tasks.", color="green")
+
+    def _run_task(self, fn_name, task, cwd, device):
+        return run_task(fn_name, task, cwd, device)
+
+    def _run_pooled(self, fn_name, task, cwd, pool, device):
+        return pool.submit(run_task, fn_name, task, cwd, device).result()
@@ -1,13 +1,6 @@
 from AudioCLI.src.client import BaseCommandCategory
 from termcolor import cprint
-import os
-import argparse
-import os
-import concurrent.futures
-import requests
-from bs4 import BeautifulSoup
 from tqdm import tqdm
-import urllib.parse
 
 
 class DownloadCommands(BaseCommandCategory):
@@ -28,85 +21,144 @@ class DownloadCommands(BaseCommandCategory):
             "http": self.http,
         }
 
-    def http(self, session, url, recursive=True):
+    # downloads can be processed on the fly, -pt saves them as .pt and -o keeps the downloaded names
+    def _can_process(self):
+        return True
+
+    def http(
+        self,
+        url: str,
+        recursive: bool = True,
+        retries: int = 3,
+        sync: bool = False,
+        delete: bool = False,
+        process: list = None,
+    ):
         """
-        Download all audio files from an open HTTP directory.
+        Download all audio files from an open HTTP directory to the output directory, mirroring its subdirectories.
+        Listings and files are fetched concurrently by batch size workers over pooled keep-alive connections.
+        Files are streamed to disk, failed downloads are retried with backoff and resumed where they stopped.
+        Downloads are recorded in .audiocli_mirror.json in the output directory, --sync then only fetches new files and files that changed upstream.
+        With --process, every file is decoded from memory as it arrives and run through the given process commands, only the result is written.
+        ie: 'download http <url> --process "resample 44100" mono -pt'. Outputs get the appending IDs of the commands, -o keeps the downloaded names.
 
-        Args:
-            url (str): URL to download from
-            recursive (bool): Whether to recursively download from subdirectories
+        Args:\n
+            url (str): URL to download from\n
+            recursive (bool): Whether to recursively download from subdirectories\n
+            retries (int): Number of retries per request before giving up\n
+            sync (bool): If True, skip files that are unchanged since the last download (by ETag or Last-Modified)\n
+            delete (bool): If True, remove previously downloaded files that are no longer listed upstream\n
+            process (list): Process commands to run on every file, each quoted with its arguments ie: "resample 44100"\n
         """
+        if self.client.output_dir is None:
+            cprint(
+                "Error: no output directory set, use 'target output <path>' first.",
+                color="red",
+            )
+            return
+        if self.client.one_shot_args.get("pack"):
+            # the mirror keeps one output file per download, --sync and --delete need them
+            cprint(
+                "Error: downloads can't be packed, pack the downloaded files with a process command.",
+                color="red",
+            )
+            return
+        if process is None:
+            process = []
+        stages = self._get_download_stages(process)
+        if stages is None:
+            return
         self._http_download_all(
-            session=session,
             url=url,
             output_dir=self.client.output_dir,
             recursive=recursive,
+            retries=int(retries),
+            sync=sync,
+            delete=delete,
+            stages=stages,
         )
 
-    def _download_audio(self, session, href, url, output_dir, prog):
-        audio_url = url + href
-        try:
-            audio_response = session.get(audio_url)
-        except:
-            print(f"Connection error for {audio_url}")
-            return
-        output_path = os.path.join(output_dir, urllib.parse.unquote(href))
-        with open(output_path, "wb") as f:
-            f.write(audio_response.content)
-        prog.update(1)
+    def _get_download_stages(self, commands):
+        """
+        Build the stages of process commands given as strings ie: ['resample 44100', 'mono'].
+        Returns a list of (appending ID, (op_name, op_args)), or None if a command is invalid.
+        """
+        builders = self.client.categories["ProcessCommands"]._get_stages()
+        stages = []
+        for command in commands:
+            name, *args = command.split()
+            if name not in builders:
+                cprint(
+                    f"Error: {name} can't process downloads, use one of {list(builders)}.",
+                    color="red",
+                )
+                return None
+            try:
+                stage = builders[name](*args)
+            except (TypeError, ValueError) as e:
+                cprint(f"Error: invalid arguments for {name}: {e}", color="red")
+                return None
+            if stage is None:
+                return None
+            stages.append(stage)
+        return stages
 
-    def _http_download_all(self, session, url, output_dir, recursive=True):
-        session = requests.Session()
-        cprint(f"Downloading from {url} to {output_dir}", color="green")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        try:
-            response = session.get(url)
-        except:
-            cprint(f"Connection error for {url}", color="red")
-            return
-        soup = BeautifulSoup(response.content, "html.parser")
-        raw_links = soup.find_all("a")
-        audio_links = [
-            link
-            for link in raw_links
-            if link.get("href").endswith((".wav", ".mp3", ".ogg", ".m4a"))
-        ]
-        dir_links = [link for link in raw_links if link.get("href").endswith("/")]
-        dir_links = [link.get("href") for link in dir_links]
-        for link in dir_links:
-            if link in url:
-                dir_links.remove(link)
-        dir_links = list(dict.fromkeys(dir_links))
-        dir_links = [url + link for link in dir_links]
+    def _http_download_all(
+        self,
+        url,
+        output_dir,
+        recursive=True,
+        retries=3,
+        sync=False,
+        delete=False,
+        stages=[],
+    ):
+        from AudioCLI.src.downloader import download_directory
 
-        # process
+        cprint(f"Downloading from {url} to {output_dir}", color="green")
+        options = {}
+        if stages:
+            pt_save = self.client.one_shot_args.get("pt_save", False)
+            options = self.client.categories["ProcessCommands"]._get_task_options(
+                pt_save
+            )
+            ops = [op_name for _, (op_name, _) in stages]
+            cprint(f"Processing downloads with {' -> '.join(ops)}", color="green")
 
-        if audio_links:
-            prog = tqdm(total=len(audio_links), initial=0)
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for link in audio_links:
-                    href = link.get("href")
-                    executor.submit(
-                        self._download_audio, session, href, url, output_dir, prog
-                    )
-            prog.close()
-        else:
+        prog = tqdm(total=0, desc="Syncing" if sync else "Downloading", unit="files")
+        report = download_directory(
+            url,
+            output_dir,
+            workers=self.client.batch_size,
+            recursive=recursive,
+            retries=retries,
+            progress=prog,
+            sync=sync,
+            delete=delete,
+            stages=[op for _, op in stages],
+            id_str=(
+                ""
+                if self.client.one_shot_args.get("overwrite_mode") == "o"
+                else "".join(id_str for id_str, _ in stages)
+            ),
+            options=options,
+        )
+        prog.close()
+        for failed_url, error in report.failed:
+            cprint(f"Error: {failed_url}: {error}", color="red")
+        if delete and report.listing_failed:
+            cprint(
+                "Not removing files, some directory listings could not be read.",
+                color="yellow",
+            )
+        for path in report.deleted:
+            cprint(f"Removed {path}", color="yellow")
+        if not report.downloaded and not report.unchanged and not report.failed:
             cprint("No audio files found.", color="red")
-        cprint(f"Directory complete!\n", color="green")
-
-        # recursive
-
-        if recursive:
-            for directory in dir_links:
-                nw_out = urllib.parse.unquote(
-                    os.path.join(output_dir + "/" + directory.split("/")[-2])
-                )
-                self._http_download_all(
-                    session=session,
-                    url=directory,
-                    output_dir=nw_out,
-                    recursive=recursive,
-                )
+            return report
+        size = sum(size for _, _, size in report.downloaded)
+        cprint(
+            f"Downloaded {len(report.downloaded)} files ({size / (1 << 20):.1f} MB), {len(report.unchanged)} unchanged, {len(report.failed)} failed, {len(report.deleted)} removed.",
+            color="green" if not report.failed else "yellow",
+        )
+        return report
@@ -1,20 +1,33 @@
 from AudioCLI.src.client import BaseCommandCategory
-from AudioCLI.src.util import chunks, load_file, save_to_file
+from AudioCLI.src.util import load_file, save_output
+from AudioCLI.src.derived_cache import DerivedCache
+from AudioCLI.src.target_data import INDEX_PATH
+from AudioCLI.src.cluster import TASK_FUNCTIONS, Coordinator, cluster_token
+from AudioCLI.src.scheduler import (
+    estimate_tasks,
+    format_size,
+    task_paths,
+    run_scheduled,
+)
+from AudioCLI.src import profiling
 from termcolor import cprint
 import os
-import torch
-import torchaudio.transforms as T
-from torch.nn import functional as F
-from tqdm import tqdm, trange
-import importlib
+from tqdm import tqdm
+import importlib.util
 import concurrent.futures
-from aeiou.datasets import PhaseFlipper, Mono, Stereo, RandPool
-import random
+import contextlib
+import functools
+import multiprocessing
+import math
+import time
 
 """
 Process target audio paths with various effects.
 -o can be appended to overwrite the original file.
--pt can be appended to save as .pt (pytorch) file.
+-pt can be appended to save as tensor file, .pt (pytorch) by default, see AudioCLI.src.tensors.
+-pack can be appended to pack the outputs into memory-mappable shards in the output directory, see AudioCLI.src.shards.
+The ops, batch, stream and overlap modules import torch, they are imported when a command runs.
+With a coordinator set (target coordinator) tasks are served to worker nodes instead of run here, see AudioCLI.src.cluster.
 """
 
 
@@ -23,6 +36,11 @@ class ProcessCommands(BaseCommandCategory):
     Process target audio paths with various effects.
     """
 
+    def __init__(self, main_parser, client):
+        self._process_pools = {}
+        self._derived_cache = None
+        super().__init__(main_parser, client)
+
     def _get_info(self):
         return {
             "name": "process",
@@ -45,15 +63,18 @@ class ProcessCommands(BaseCommandCategory):
             "hook": self.hook,
         }
 
-    def _audio_to_batched(self, audio):
-        if len(audio.shape) == 3:
-            itaudio = audio
-        elif len(audio.shape) == 2:
-            itaudio = [audio]
-        elif len(audio.shape) == 1:
-            audio = audio.unsqueeze(0)
-            itaudio = [audio]
-        return itaudio
+    # Declare commands that can be fused into a single pass when chained
+    def _get_stages(self):
+        return {
+            "resample": self._resample_stage,
+            "stereo": self._stereo_stage,
+            "mono": self._mono_stage,
+            "bitdepth": self._bitdepth_stage,
+            "phaseflip": self._phaseflip_stage,
+            "noise": self._noise_stage,
+            "pool": self._pool_stage,
+            "pitch": self._pitch_stage,
+        }
 
     def _get_prog(self, input_batches, text):
         return tqdm(
@@ -64,35 +85,387 @@ class ProcessCommands(BaseCommandCategory):
     def _can_process(self):
         return True
 
+    def _can_shard(self):
+        return True
+
+    def _get_task_options(self, pt_save, pack=False):
+        pack_dir = None
+        if pack:
+            if self.client.output_dir is None:
+                cprint(
+                    "Error: -pack needs an output directory, use 'target output <path>' or -output.",
+                    color="red",
+                )
+                return None
+            pack_dir = os.path.abspath(os.path.join(self.client.output_dir, "pack"))
+        return {
+            "pt_save": pt_save,
+            "pack": pack_dir,
+            "pack_dtype": self.client.pack_dtype,
+            "pt_format": self.client.pt_format,
+            "pt_dtype": self.client.pt_dtype,
+            "block_size": self.client.stream_block,
+            "device": str(self.client.device),
+        }
+
+    def _finish_pack(self, options):
+        if not options["pack"]:
+            return
+        from AudioCLI.src.shards import finish_pack
+
+        items, shards, size = finish_pack(options["pack"])
+        cprint(
+            f"Packed {items} items ({format_size(size)}) in {shards} shards, index at {os.path.join(options['pack'], 'index.json')}",
+            color="green",
+        )
+
+    def _run_stage(self, stage, text, max_workers=None):
+        if stage is None:
+            return
+        id_str, op = stage
+        input_batches = self.client.get_save_paths(id_str)
+        if not input_batches:
+            return
+        options = self._get_task_options(
+            self.client.one_shot_args["pt_save"], self.client.one_shot_args["pack"]
+        )
+        if options is None:
+            return
+        tasks = [
+            (filepath, save_path, [op], options)
+            for batch in input_batches
+            for filepath, save_path in zip(*batch)
+        ]
+        self._run_file_tasks(tasks, text, max_workers=max_workers)
+        self._finish_pack(options)
+
+    def _run_file_tasks(self, tasks, text, max_workers=None):
+        if not tasks:
+            return
+        # packed items have no output file to check
+        if self.client.cache != "off" and not tasks[0][3].get("pack"):
+            start = time.time()
+            cache = self._get_derived_cache()
+            with profiling.stage("cache"):
+                tasks, pending, skipped, linked = cache.plan(tasks, self.client.cache)
+            if skipped or linked:
+                cprint(
+                    f"Cache: {skipped} files up to date, {linked} files linked from identical inputs.",
+                    color="green",
+                )
+            self._run_file_tasks_uncached(tasks, text, max_workers=max_workers)
+            cache.record(pending, start)
+        else:
+            self._run_file_tasks_uncached(tasks, text, max_workers=max_workers)
+
+    def _get_derived_cache(self):
+        if self._derived_cache is None:
+            self._derived_cache = DerivedCache(INDEX_PATH)
+        return self._derived_cache
+
+    def _run_file_tasks_uncached(self, tasks, text, max_workers=None):
+        if not tasks:
+            return
+        # imported once there is work left, batch imports torch
+        from AudioCLI.src.batch import can_batch, plan_batches, process_batch
+        from AudioCLI.src.stream import can_stream
+
+        _, _, stages, options = tasks[0]
+        streaming = options.get("block_size") and can_stream(stages)
+        if (
+            self.client.overlap
+            and not streaming
+            and not self.client.batching
+            and not self.client.coordinator
+        ):
+            if self.client.executor != "process":
+                self._run_overlapped(tasks, text)
+                return
+            # the overlapped stages are threads of this process
+            cprint(
+                "Overlap is ignored with the process executor, files run on the process pool.",
+                color="yellow",
+            )
+        if not self.client.batching or streaming or not can_batch(stages):
+            self._run_tasks(tasks, text, max_workers=max_workers)
+            return
+        filepaths = [task[0] for task in tasks]
+        batches = plan_batches(
+            filepaths,
+            [task[1] for task in tasks],
+            self.client.batch_size,
+            metadata=self.client.target_data.metadata(filepaths),
+        )
+        self._run_tasks(
+            [
+                (filepaths, save_paths, stages, options)
+                for filepaths, save_paths in batches
+            ],
+            text,
+            max_workers=max_workers,
+            fn=process_batch,
+            total=len(tasks),
+        )
+
+    def _run_overlapped(self, tasks, text):
+        from AudioCLI.src.overlap import run_overlapped
+
+        decoders, computers, encoders, queue_size = self.client.overlap
+        prog = tqdm(desc=text, total=len(tasks))
+        for result in run_overlapped(
+            tasks,
+            decoders=decoders,
+            computers=computers,
+            encoders=encoders,
+            queue_size=queue_size,
+            sizes=self._estimate_tasks(tasks),
+            budget=self.client.memory_budget,
+        ):
+            prog.update(result)
+        prog.close()
+
+    def _run_tasks(self, tasks, text, max_workers=None, fn=None, total=None):
+        # tasks covering several files (batches) return the number of files they handled, other results are returned
+        if fn is None:
+            from AudioCLI.src.ops import process_file
+
+            fn = process_file
+        if self.client.coordinator and fn.__name__ in TASK_FUNCTIONS:
+            return self._run_distributed(tasks, text, fn, total=total)
+        max_workers = max_workers or self.client.batch_size
+        prog = tqdm(desc=text, total=total or len(tasks))
+        results = [None] * len(tasks)
+        sizes = self._estimate_tasks(tasks)
+        profiler = profiling.active()
+        if profiler:
+            # tasks send their stage records (and cProfile stats) back with the result
+            fn = functools.partial(profiling.run_profiled, fn, profiler.cprofile)
+        pooled = self.client.executor == "process"
+        if pooled:
+            from AudioCLI.src.ops import run_captured
+
+            # worker processes outlive the command, their output comes back with the result
+            fn = functools.partial(run_captured, fn)
+            executor = contextlib.nullcontext(self._get_process_pool(max_workers))
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        with executor as executor:
+            # largest files first, a window of two tasks per worker (and the memory budget) bounds what is submitted
+            for index, result in run_scheduled(
+                executor,
+                fn,
+                tasks,
+                sizes,
+                window=max_workers * 2,
+                budget=self.client.memory_budget,
+            ):
+                if pooled:
+                    result, output = result
+                    if output:
+                        tqdm.write(output, end="")
+                result = profiler.merge(result) if profiler else result
+                prog.update(result if isinstance(result, int) else 1)
+                results[index] = result
+        prog.close()
+        return results
+
+    def _estimate_tasks(self, tasks):
+        return estimate_tasks(
+            tasks,
+            self.client.target_data.metadata(
+                [path for task in tasks for path in task_paths(task)]
+            ),
+        )
+
+    def _run_distributed(self, tasks, text, fn, total=None):
+        # stage records stay on the workers, --profile only times the coordinator
+        try:
+            coordinator = Coordinator(
+                self.client.coordinator,
+                fn.__name__,
+                tasks,
+                token=cluster_token(self.client.cluster_token),
+            )
+        except ValueError as e:
+            cprint(f"Error: {e}", color="red")
+            return None
+        coordinator.progress = tqdm(desc=text, total=total or len(tasks))
+        cprint(
+            f"Serving {len(tasks)} tasks on {self.client.coordinator}, waiting for workers.",
+            color="yellow",
+        )
+        results = coordinator.run()
+        coordinator.progress.close()
+        if coordinator.failed:
+            cprint(f"{coordinator.failed} tasks failed on workers.", color="red")
+        return results
+
+    def _get_process_pool(self, max_workers):
+        # worker processes are kept alive between commands, starting them means importing torch
+        if max_workers not in self._process_pools:
+            from AudioCLI.src.ops import init_worker
+
+            for pool in self._process_pools.values():
+                pool.shutdown()
+            self._process_pools = {
+                max_workers: concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                )
+            }
+        return self._process_pools[max_workers]
+
+    def _run_pipeline(self, commands):
+        """
+        Run a chain of commands as one pass: every file is decoded once, all stages run in memory and only the final result is encoded.
+        Each command in the chain works on the output of the previous one, so the save path collects all appending IDs ie: _resampled_44100_mono.
+        """
+        if not self.client.target_data.contains_data():
+            cprint("No data loaded.", color="red")
+            return
+        stages = []
+        for command in commands:
+            kwargs = dict(command)
+            name = kwargs.pop("_command")
+            overwrite = kwargs.pop("o", False)
+            for key in [
+                "_category",
+                "pt",
+                "pack",
+                "target",
+                "output",
+                "profile",
+                "shard",
+            ]:
+                kwargs.pop(key, None)
+            stage = self._get_stages()[name](**kwargs)
+            if stage is None:
+                return
+            stages.append((stage, overwrite))
+
+        options = self._get_task_options(
+            commands[-1].get("pt", False), commands[-1].get("pack", False)
+        )
+        if options is None:
+            return
+        tasks = []
+        for filepath in self.client.shard_paths(self.client.target_data.file_paths):
+            save_path = filepath
+            for (id_str, _), overwrite in stages:
+                save_path = self.client.get_save_path(save_path, id_str, overwrite)
+            tasks.append(
+                (
+                    filepath,
+                    save_path,
+                    [op for (_, op), _ in stages],
+                    options,
+                )
+            )
+        ops = [op_name for ((_, (op_name, _)), _) in stages]
+        self._run_file_tasks(tasks, f"Pipeline ({' -> '.join(ops)})")
+        self._finish_pack(options)
+
+    # Define stages, the per-file part of a command as (appending ID, (op_name, op_args))
+    def _resample_stage(self, sample_rate):
+        return f"_resampled_{sample_rate}", (
+            "resample",
+            {"sample_rate": int(sample_rate)},
+        )
+
+    def _phaseflip_stage(self):
+        return "_phaseflipped", ("phaseflip", {})
+
+    def _noise_stage(self, noise_level):
+        return f"_noise_{noise_level}", ("noise", {"noise_level": float(noise_level)})
+
+    def _pool_stage(self):
+        return "_pooled", ("pool", {})
+
+    def _pitch_stage(self, pitch, mode="quality"):
+        if mode not in ["quality", "fast"]:
+            cprint("Error: mode must be 'quality' or 'fast'.", color="red")
+            return None
+        plus = "+" if int(pitch) > 0 else ""
+        # the modes sound different, so their outputs (and cache entries) are kept apart
+        fast = "_fast" if mode == "fast" else ""
+        return f"_pitched_{plus}{pitch}{fast}", (
+            "pitch",
+            {"pitch": int(pitch), "mode": mode},
+        )
+
+    def _bitdepth_stage(self, bit_depth):
+        if int(bit_depth) not in [8, 16, 24, 32]:
+            cprint("Error: bit depth must be 8, 16, 24, or 32.", color="red")
+            return None
+        return f"_bitdepth_{bit_depth}", ("bitdepth", {"bit_depth": int(bit_depth)})
+
+    def _stereo_stage(self):
+        return "_stereo", ("stereo", {})
+
+    def _mono_stage(self):
+        return "_mono", ("mono", {})
+
     # Define commands
-    def remove_silent(self, threshold: float = 0.01):
+    def remove_silent(
+        self,
+        threshold: float = 0.01,
+        criterion: str = "peak",
+        db: bool = False,
+        dry_run: bool = False,
+    ):
         """
         Remove audio files in target folders that are silent or below the threshold.
+        Files are scanned block by block and the scan stops as soon as a file is known to be over the threshold.
         WARNING: This will delete files.
 
         Args:\n
             threshold (float): Threshold for silence detection\n
+            criterion (str): Level to compare, 'peak' (absolute peak) or 'rms'\n
+            db (bool): If True, the threshold is given in dBFS ie: -60\n
+            dry_run (bool): If True, only report the files that would be removed\n
         """
-        input_batches = self.client.get_save_paths(f"UNUSED")
-        prog = self._get_prog(input_batches, "Removing silent")
+        from AudioCLI.src.ops import remove_silent_file
 
-        def remove_silent_batch(args):
-            try:
-                filepath, _ = args
-                audio, sr = load_file(filepath)
-                if audio.max() < float(threshold):
-                    os.remove(filepath)
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(remove_silent_batch, tasks)
+        if criterion not in ["peak", "rms"]:
+            cprint("Error: criterion must be 'peak' or 'rms'.", color="red")
+            return
+        threshold = float(threshold)
+        if db:
+            threshold = 10 ** (threshold / 20)
+        input_batches = self.client.get_save_paths(f"UNUSED")
+        if not input_batches:
+            return
+        tasks = [
+            (filepath, threshold, criterion, dry_run)
+            for batch in input_batches
+            for filepath in batch[0]
+        ]
+        results = self._run_tasks(
+            tasks,
+            "Scanning silent" if dry_run else "Removing silent",
+            fn=remove_silent_file,
+        )
+        if results is None:
+            return
+        # None results are tasks that failed on a cluster worker, a None level a file that could not be read
+        failed = sum(1 for result in results if result is None or result[1] is None)
+        silent = [(result[0], result[1]) for result in results if result and result[2]]
+        if dry_run:
+            for filepath, level in silent:
+                level_db = 20 * math.log10(level) if level > 0 else -math.inf
+                cprint(
+                    f"{filepath} ({criterion} {level:.6f}, {level_db:.1f} dBFS)",
+                    color="yellow",
+                )
+            cprint(
+                f"Dry run: {len(silent)} of {len(tasks)} files would be removed.",
+                color="green",
+            )
+        else:
+            cprint(f"Removed {len(silent)} of {len(tasks)} files.", color="green")
+        if failed:
+            cprint(f"{failed} files could not be scanned.", color="yellow")
 
     def resample(self, sample_rate: int):
         """
@@ -103,36 +476,7 @@ class ProcessCommands(BaseCommandCategory):
         Args:\n
             sample_rate (int): New sample rate\n
         """
-        input_batches = self.client.get_save_paths(f"_resampled_{sample_rate}")
-        prog = self._get_prog(input_batches, "Resampling")
-
-        def resample_batch(args):
-            try:
-                filepath, save_path, _ = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                aug_tf = T.Resample(int(sr), int(sample_rate))
-                auged = aug_tf(audio)
-                save_to_file(
-                    save_path,
-                    auged,
-                    int(sample_rate),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = [
-                        (filepath, save_path, sample_rate)
-                        for filepath, save_path in zip(*batch)
-                    ]
-                    executor.map(resample_batch, tasks)
+        self._run_stage(self._resample_stage(sample_rate), "Resampling")
 
     def phaseflip(self):
         """
@@ -140,33 +484,7 @@ class ProcessCommands(BaseCommandCategory):
 
         Appending ID: _phaseflipped
         """
-        input_batches = self.client.get_save_paths(f"_phaseflipped")
-        prog = self._get_prog(input_batches, "Phase flipping")
-
-        def phaseflip_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                aug_tf = PhaseFlipper(p=1.0)
-                auged = aug_tf(audio)
-                save_to_file(
-                    save_path,
-                    auged,
-                    int(sr),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(phaseflip_batch, tasks)
+        self._run_stage(self._phaseflip_stage(), "Phase flipping")
 
     def noise(self, noise_level: float):
         """
@@ -177,36 +495,7 @@ class ProcessCommands(BaseCommandCategory):
         Args:\n
             noise_level (float): Noise level\n
         """
-        input_batches = self.client.get_save_paths(f"_noise_{noise_level}")
-        prog = self._get_prog(input_batches, "Adding noise")
-
-        def noise_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                itaudio = self._audio_to_batched(audio)
-                for signal in itaudio:
-                    auged = signal + float(noise_level) * random.random() * (
-                        2 * torch.rand_like(signal) - 1
-                    )
-                    save_to_file(
-                        save_path,
-                        auged,
-                        int(sr),
-                        pt_save=self.client.one_shot_args["pt_save"],
-                    )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(noise_batch, tasks)
+        self._run_stage(self._noise_stage(noise_level), "Adding noise")
 
     def pool(self):
         """
@@ -214,71 +503,20 @@ class ProcessCommands(BaseCommandCategory):
 
         Appending ID: _pooled
         """
-        input_batches = self.client.get_save_paths(f"_pooled")
-        prog = self._get_prog(input_batches, "Pooling")
-
-        def pool_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                aug_tf = RandPool(p=1.0)
-                auged = aug_tf(audio)
-                save_to_file(
-                    save_path,
-                    auged,
-                    int(sr),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
+        self._run_stage(self._pool_stage(), "Pooling")
 
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(pool_batch, tasks)
-
-    def pitch(self, pitch: int):
+    def pitch(self, pitch: int, mode: str = "quality"):
         """
         Change pitch of all audio files in the current target paths to a new pitch.
+        Mode 'quality' uses a phase vocoder, 'fast' a time-domain resample and stretch that is several times quicker.
 
-        Appending ID: _pitched_{pitch}
+        Appending ID: _pitched_{pitch} (_pitched_{pitch}_fast in fast mode)
 
         Args:\n
             pitch (int): New pitch\n
+            mode (str): Pitch shifting mode, 'quality' or 'fast'\n
         """
-        plus = "+" if int(pitch) > 0 else ""
-        input_batches = self.client.get_save_paths(f"_pitched_{plus}{pitch}")
-        prog = self._get_prog(input_batches, "Pitch shifting")
-
-        def pitch_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                itaudio = self._audio_to_batched(audio)
-                aug_tf = T.PitchShift(int(sr), int(pitch))
-                for signal in itaudio:
-                    auged = aug_tf(signal)
-                    save_to_file(
-                        save_path,
-                        auged,
-                        int(sr),
-                        pt_save=self.client.one_shot_args["pt_save"],
-                    )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(pitch_batch, tasks)
+        self._run_stage(self._pitch_stage(pitch, mode), "Pitch shifting")
 
     def bitdepth(self, bit_depth: int):
         """
@@ -289,38 +527,7 @@ class ProcessCommands(BaseCommandCategory):
         Args:\n
             bit_depth (int): New bit depth\n
         """
-
-        if bit_depth not in [8, 16, 24, 32]:
-            cprint("Error: bit depth must be 8, 16, 24, or 32.", color="red")
-            return
-
-        input_batches = self.client.get_save_paths(f"_bitdepth_{bit_depth}")
-        prog = self._get_prog(input_batches, "Changing bit depth")
-
-        def bitdepth_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                bit_depth = [int(bit_depth)] * len(filepath)
-                save_to_file(
-                    save_path,
-                    audio,
-                    int(sr),
-                    bits=bit_depth,
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(bitdepth_batch, tasks)
+        self._run_stage(self._bitdepth_stage(bit_depth), "Changing bit depth")
 
     def stereo(self):
         """
@@ -328,33 +535,7 @@ class ProcessCommands(BaseCommandCategory):
 
         Appending ID: _stereo
         """
-        input_batches = self.client.get_save_paths("_stereo")
-        prog = self._get_prog(input_batches, "Converting to stereo")
-
-        def stereo_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                aug_tf = Stereo()
-                auged = aug_tf(audio)
-                save_to_file(
-                    save_path,
-                    auged,
-                    int(sr),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(stereo_batch, tasks)
+        self._run_stage(self._stereo_stage(), "Converting to stereo")
 
     def mono(self):
         """
@@ -362,101 +543,47 @@ class ProcessCommands(BaseCommandCategory):
 
         Appending ID: _mono
         """
-        input_batches = self.client.get_save_paths("_mono")
-        prog = self._get_prog(input_batches, "Converting to mono")
-
-        def mono_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                aug_tf = Mono()
-                auged = aug_tf(audio)
-                save_to_file(
-                    save_path,
-                    auged,
-                    int(sr),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                prog.update(1)
-            except Exception as e:
-                print(e)
-
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in prog:
-                    tasks = list(zip(*batch))
-                    executor.map(mono_batch, tasks)
+        self._run_stage(self._mono_stage(), "Converting to mono")
 
-    def chunk(self, length: float, pad: bool = True, clean: bool = False):
+    def chunk(
+        self, length: float, hop: float = 0.0, pad: bool = True, clean: bool = False
+    ):
         """
-        Splits all audio files in the current target paths into chunks of a specified length. If the
-        last piece does not contain enough audio data, it pads the remaining space with silence.
+        Splits all audio files in the current target paths into windows of a specified length, every hop seconds. If the
+        last window does not contain enough audio data, it pads the remaining space with silence.
 
-        Appending ID: _chunked_{length}
+        Appending ID: _chunked_{length} (_chunked_{length}_hop_{hop} with a hop)
 
         Args:\n
             length (float): Length of each chunk in seconds\n
+            hop (float): Seconds between the starts of consecutive chunks, chunks overlap when shorter than length (default: length)\n
             pad (bool): If True, pad the last chunk to 'length' with silence if it doesn't contain enough audio data\n
             clean (bool): If True, remove the original file after chunking\n
         """
-        length = int(length)
-        input_batches = self.client.get_save_paths(f"_chunked_{length}")
-        prog = self._get_prog(input_batches, "Chunking")
-
-        def chunk_batch(args):
-            try:
-                filepath, save_path = args
-                audio, sr = load_file(filepath)
-                audio.to(self.client.device)
-                n_chunks = audio.shape[1] / length
-                chunks = []
-                index = 1
-                for i in range(0, int(n_chunks)):
-                    isave_path = (
-                        os.path.splitext(save_path)[0]
-                        + f"_{index}"
-                        + os.path.splitext(save_path)[1]
-                    )
-                    chunk = audio[:, i * length : (i + 1) * length]
-                    chunks.append(chunk)
-                    save_to_file(
-                        isave_path,
-                        chunk,
-                        int(sr),
-                        pt_save=self.client.one_shot_args["pt_save"],
-                    )
-                    index += 1
-
-                last_chunk = audio[:, int(n_chunks) * length :]
-                last_save_path = (
-                    os.path.splitext(save_path)[0]
-                    + f"_{index}"
-                    + os.path.splitext(save_path)[1]
-                )
-                if pad:
-                    last_chunk = F.pad(last_chunk, (0, length - last_chunk.shape[1]))
-                save_to_file(
-                    last_save_path,
-                    last_chunk,
-                    int(sr),
-                    pt_save=self.client.one_shot_args["pt_save"],
-                )
-                if clean:
-                    os.remove(filepath)
-                prog.update(1)
-            except Exception as e:
-                print(e)
+        from AudioCLI.src.ops import chunk_file
 
-        if input_batches:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=self.client.batch_size
-            ) as executor:
-                for batch in input_batches:
-                    tasks = list(zip(*batch))
-                    executor.map(chunk_batch, tasks)
+        if float(length) <= 0 or float(hop) < 0:
+            cprint("Error: length must be positive and hop not negative.", color="red")
+            return
+        id_str = f"_chunked_{length}"
+        if float(hop) and float(hop) != float(length):
+            id_str += f"_hop_{hop}"
+        hop = float(hop) or float(length)
+        input_batches = self.client.get_save_paths(id_str)
+        if not input_batches:
+            return
+        options = self._get_task_options(
+            self.client.one_shot_args["pt_save"], self.client.one_shot_args["pack"]
+        )
+        if options is None:
+            return
+        tasks = [
+            (filepath, save_path, float(length), hop, pad, clean, options)
+            for batch in input_batches
+            for filepath, save_path in zip(*batch)
+        ]
+        self._run_tasks(tasks, "Chunking", fn=chunk_file)
+        self._finish_pack(options)
 
     def hook(self, python_file: str, function: str):
         """
@@ -474,6 +601,11 @@ class ProcessCommands(BaseCommandCategory):
             function (str): Name of function to use\n
         """
         input_batches = self.client.get_save_paths(f"_{function}")
+        options = self._get_task_options(
+            self.client.one_shot_args["pt_save"], self.client.one_shot_args["pack"]
+        )
+        if options is None:
+            return
         prog = self._get_prog(input_batches, f"Processing with function: {function}")
 
         # Load python file and import function
@@ -489,12 +621,7 @@ class ProcessCommands(BaseCommandCategory):
                 audio.to(self.client.device)
                 auged = func(audio, save_paths, int(sr))
                 if auged is not None:
-                    save_to_file(
-                        save_paths,
-                        auged,
-                        int(sr),
-                        pt_save=self.client.one_shot_args["pt_save"],
-                    )
+                    save_output(save_paths, auged, int(sr), options=options)
                 prog.update(1)
             except Exception as e:
                 print(e)
@@ -506,6 +633,7 @@ class ProcessCommands(BaseCommandCategory):
                 for batch in input_batches:
                     tasks = list(zip(*batch))
                     executor.map(hook_batch, tasks)
+            self._finish_pack(options)
 
     def file(self, acli_file: str):
         """
@@ -1,6 +1,10 @@
 from AudioCLI.src.client import BaseCommandCategory
 from AudioCLI.src.target_data import TargetData
+from AudioCLI.src.cluster import parse_address, cluster_token, TOKEN_ENV
+from AudioCLI.src.scheduler import parse_size, format_size
+from AudioCLI.src.tensors import PT_FORMATS, DTYPES
 from termcolor import cprint
+from collections import Counter
 import os
 
 
@@ -19,8 +23,21 @@ class TargetCommands(BaseCommandCategory):
             "clear": self.clear,
             "batch_size": self.batch_size,
             "info": self.info,
+            "filter": self.filter,
             "output": self.output,
             "device": self.device,
+            "pipeline": self.pipeline,
+            "stream": self.stream,
+            "executor": self.executor,
+            "batching": self.batching,
+            "cache": self.cache,
+            "overlap": self.overlap,
+            "coordinator": self.coordinator,
+            "cluster_token": self.cluster_token,
+            "memory_budget": self.memory_budget,
+            "pack_dtype": self.pack_dtype,
+            "pt_format": self.pt_format,
+            "pt_dtype": self.pt_dtype,
         }
 
     # Define commands
@@ -59,19 +76,101 @@ class TargetCommands(BaseCommandCategory):
         Args:\n
             size (int): Batch size\n
         """
-        self.client.batch_size = size
+        self.client.batch_size = int(size)
         cprint(f"Batch size set to {self.client.batch_size}", color="yellow")
 
     def info(self):
         """
-        Print information about the current target paths.
+        Print information about the current target paths and session settings.
+        Target files are summarised from their headers (cached in the metadata index), without decoding.
         """
-        if not self.client.target_data.contains_data():
+        target_data = self.client.target_data
+        if not target_data.contains_data():
             cprint("No target paths have been set.", color="red")
+        else:
+            infos = target_data.metadata()
+            total = sum(info["duration"] for info in infos.values())
+            srs = Counter(info["sr"] for info in infos.values())
+            channels = Counter(info["channels"] for info in infos.values())
+            cprint(
+                f"Target files: {len(target_data.file_paths)} ({len(target_data.file_paths) - len(infos)} unreadable)",
+                color="green",
+            )
+            if target_data.filter:
+                cprint(
+                    f"Filter: {target_data.filter} ({target_data.unfiltered_count} files before filtering)",
+                    color="green",
+                )
+            cprint(f"Total duration: {total / 3600:.2f} hours", color="green")
+            cprint(
+                f"Sample rates: {', '.join(f'{sr} ({n})' for sr, n in sorted(srs.items()))}",
+                color="green",
+            )
+            cprint(
+                f"Channels: {', '.join(f'{ch} ({n})' for ch, n in sorted(channels.items()))}",
+                color="green",
+            )
 
         cprint(f"Batch size: {self.client.batch_size}", color="green")
         cprint(f"Output directory: {self.client.output_dir}", color="green")
-        cprint(f"Processing device: {self.client.device}", color="green")
+        cprint(
+            f"Processing device: {self.client.device_setting or 'auto (detected on first use)'}",
+            color="green",
+        )
+        cprint(f"Executor: {self.client.executor}", color="green")
+        cprint(f"Batching: {'on' if self.client.batching else 'off'}", color="green")
+        cprint(
+            f"Pipeline mode: {'on' if self.client.pipeline else 'off'}", color="green"
+        )
+        cprint(
+            f"Streaming block size: {self.client.stream_block or 'off'}", color="green"
+        )
+        if self.client.overlap:
+            decoders, computers, encoders, queue_size = self.client.overlap
+            cprint(
+                f"Overlapped stages: {decoders} decoders, {computers} compute, {encoders} encoders, queue size {queue_size}",
+                color="green",
+            )
+        else:
+            cprint("Overlapped stages: off", color="green")
+        cprint(
+            f"Memory budget: {format_size(self.client.memory_budget) if self.client.memory_budget else 'off'}",
+            color="green",
+        )
+        cprint(f"Coordinator: {self.client.coordinator or 'off'}", color="green")
+        cprint(
+            f"Cluster token: {'set' if cluster_token(self.client.cluster_token) else 'off'}",
+            color="green",
+        )
+        cprint(f"Pack dtype: {self.client.pack_dtype}", color="green")
+        cprint(
+            f"Tensor output (-pt): {self.client.pt_format}, {self.client.pt_dtype}",
+            color="green",
+        )
+
+    def filter(self, expression: list):
+        """
+        Only target files whose header metadata matches an expression, later commands only touch the matching files.
+        Conditions compare sr, channels, frames, duration (seconds) or size (bytes) using ==, !=, <, <=, > or >= and are joined with 'and'.
+        ie: 'target filter sr != 44100 and duration > 30'. Use 'target filter clear' to remove the filter.
+
+        Args:\n
+            expression (list): Filter expression or 'clear'\n
+        """
+        expression = " ".join(expression)
+        if expression == "clear":
+            self.client.target_data.set_filter(None)
+            cprint("Filter cleared.", color="green")
+            return
+        try:
+            self.client.target_data.set_filter(expression)
+        except ValueError as e:
+            cprint(f"Error: {e}", color="red")
+            return
+        cprint(
+            f"Filter set to '{expression}': {len(self.client.target_data.file_paths)} of {self.client.target_data.unfiltered_count} files match.",
+            color="green",
+        )
 
     def output(self, path: str):
         """
@@ -97,3 +196,228 @@ class TargetCommands(BaseCommandCategory):
         """
         self.client.device = device
         cprint(f"Processing device set to {self.client.device}", color="green")
+
+    def pipeline(self, mode: str):
+        """
+        Fuse chained process commands into a single pass. Each file is decoded once, every command runs in memory and only the final result is encoded.
+        Every command in the chain works on the output of the previous one and intermediate files are not written.
+
+        Args:\n
+            mode (str): 'on' or 'off'\n
+        """
+        if mode not in ["on", "off"]:
+            cprint("Error: pipeline mode must be 'on' or 'off'.", color="red")
+            return
+        self.client.pipeline = mode == "on"
+        cprint(f"Pipeline mode set to {mode}", color="green")
+
+    def stream(self, block_size: str):
+        """
+        Stream files block by block instead of loading them whole, keeping memory per worker bounded for long files.
+        Used by resample, mono, stereo, bitdepth, noise and phaseflip (and pipelines made of them) when not saving as .pt.
+
+        Args:\n
+            block_size (str): Block size in frames ie: 65536, or 'off'\n
+        """
+        if block_size == "off":
+            self.client.stream_block = None
+            cprint("Streaming disabled.", color="green")
+            return
+        if not block_size.isdigit() or int(block_size) <= 0:
+            cprint(
+                "Error: block size must be a positive number of frames or 'off'.",
+                color="red",
+            )
+            return
+        self.client.stream_block = int(block_size)
+        cprint(f"Streaming block size set to {self.client.stream_block}", color="green")
+
+    def executor(self, backend: str):
+        """
+        Set the executor backend used to run process commands.
+        'thread' runs files on a thread pool, 'process' runs them on a pool of worker processes to use all cores for CPU-bound transforms.
+        Batch size sets the number of workers for both.
+
+        Args:\n
+            backend (str): 'thread' or 'process'\n
+        """
+        if backend not in ["thread", "process"]:
+            cprint("Error: executor must be 'thread' or 'process'.", color="red")
+            return
+        self.client.executor = backend
+        cprint(f"Executor set to {self.client.executor}", color="green")
+
+    def batching(self, mode: str):
+        """
+        Run transforms once per batch instead of once per file. Files are grouped by sample rate and channel count, sorted by length and padded into one tensor of batch size files on the processing device.
+        Used by resample, mono, stereo, bitdepth, noise, phaseflip, pool and pitch (and pipelines made of them).
+
+        Args:\n
+            mode (str): 'on' or 'off'\n
+        """
+        if mode not in ["on", "off"]:
+            cprint("Error: batching mode must be 'on' or 'off'.", color="red")
+            return
+        self.client.batching = mode == "on"
+        cprint(f"Batching set to {mode}", color="green")
+
+    def cache(self, mode: str):
+        """
+        Skip files whose output is already up to date from an earlier run of the same command.
+        'stat' identifies inputs by path, size and mtime, 'hash' by their content and also links outputs of identical inputs instead of recomputing them.
+        Overwriting (-o) commands are never cached.
+
+        Args:\n
+            mode (str): 'off', 'stat' or 'hash'\n
+        """
+        if mode not in ["off", "stat", "hash"]:
+            cprint("Error: cache mode must be 'off', 'stat' or 'hash'.", color="red")
+            return
+        self.client.cache = mode
+        cprint(f"Output cache set to {mode}", color="green")
+
+    def overlap(self, sizes: list):
+        """
+        Overlap decoding, processing and encoding of different files in a three stage pipeline connected by bounded queues.
+        A pool of decoder threads feeds the compute stage, which runs on the processing device and feeds a pool of encoder threads.
+        Used by per-file process commands and pipelines when batching is off and the executor is 'thread', streaming takes precedence for the files it applies to.
+        The memory budget (target memory_budget) holds back decoding, largest files are decoded first.
+        ie: 'target overlap 4 1 4' or 'target overlap 4 1 4 16'. The queue size (number of files waiting between stages) defaults to twice the decoder count.
+
+        Args:\n
+            sizes (list): Decoder, compute and encoder worker counts and optional queue size, or 'off'\n
+        """
+        if sizes == ["off"]:
+            self.client.overlap = None
+            cprint("Overlapped stages disabled.", color="green")
+            return
+        if len(sizes) not in [3, 4] or not all(
+            size.isdigit() and int(size) > 0 for size in sizes
+        ):
+            cprint(
+                "Error: give 3 or 4 positive numbers (decoders, compute, encoders and optional queue size) or 'off'.",
+                color="red",
+            )
+            return
+        sizes = [int(size) for size in sizes]
+        if len(sizes) == 3:
+            sizes.append(sizes[0] * 2)
+        self.client.overlap = sizes
+        cprint(
+            f"Overlapped stages set to {sizes[0]} decoders, {sizes[1]} compute, {sizes[2]} encoders, queue size {sizes[3]}",
+            color="green",
+        )
+
+    def coordinator(self, address: str):
+        """
+        Serve the tasks of process commands to worker nodes instead of running them here, see 'cluster worker'.
+        Every command listens on the address until its tasks are acknowledged, workers pull them one at a time so faster hosts take more.
+        All hosts need the target and output files at the same paths, ie: a shared filesystem mounted at the same place.
+        ie: 'target coordinator :7070' only listens for workers on this machine, 'target coordinator 0.0.0.0:7070' on all interfaces, which needs a cluster token (target cluster_token).
+
+        Args:\n
+            address (str): host:port to listen on, or 'off'\n
+        """
+        if address == "off":
+            self.client.coordinator = None
+            cprint("Coordinator disabled.", color="green")
+            return
+        try:
+            parse_address(address)
+        except ValueError as e:
+            cprint(f"Error: {e}", color="red")
+            return
+        self.client.coordinator = address
+        cprint(f"Coordinator set to {address}", color="green")
+
+    def cluster_token(self, token: str):
+        """
+        Set the shared token workers and coordinators prove to each other on every connection, the token itself is never sent.
+        The AUDIOCLI_CLUSTER_TOKEN environment variable takes precedence. Needed to serve tasks on any other host than 127.0.0.1.
+        ie: 'target cluster_token 4f9c2e...', generate one with ie: 'python -c "import secrets; print(secrets.token_hex(16))"'.
+
+        Args:\n
+            token (str): Shared token, or 'off'\n
+        """
+        if token == "off":
+            self.client.cluster_token = None
+            cprint("Cluster token cleared.", color="green")
+        else:
+            self.client.cluster_token = token
+            cprint("Cluster token set.", color="green")
+        if os.environ.get(TOKEN_ENV):
+            cprint(f"{TOKEN_ENV} is set and takes precedence.", color="yellow")
+
+    def memory_budget(self, size: str):
+        """
+        Limit the estimated memory of files processed at the same time, the rest wait until running files finish.
+        Memory is estimated from the file headers as the decoded float32 audio plus the output of every stage, files are always started largest first.
+        A file larger than the budget runs on its own.
+        ie: 'target memory_budget 8G' or 'target memory_budget 512M'.
+
+        Args:\n
+            size (str): Budget in bytes with an optional K, M, G or T suffix, or 'off'\n
+        """
+        if size == "off":
+            self.client.memory_budget = None
+            cprint("Memory budget disabled.", color="green")
+            return
+        try:
+            self.client.memory_budget = parse_size(size)
+        except ValueError:
+            cprint(
+                "Error: memory budget must be a positive size ie: 8G, 512M, or 'off'.",
+                color="red",
+            )
+            return
+        cprint(
+            f"Memory budget set to {format_size(self.client.memory_budget)}",
+            color="green",
+        )
+
+    def pack_dtype(self, dtype: str):
+        """
+        Set the sample type commands run with -pack store in their shards.
+        float16 and int16 shards are half the size of float32 ones, int16 clips anything above 0 dBFS that float16 keeps.
+
+        Args:\n
+            dtype (str): 'float32', 'float16' or 'int16'\n
+        """
+        if dtype not in ["float32", "float16", "int16"]:
+            cprint(
+                "Error: pack dtype must be 'float32', 'float16' or 'int16'.",
+                color="red",
+            )
+            return
+        self.client.pack_dtype = dtype
+        cprint(f"Pack dtype set to {dtype}", color="green")
+
+    def pt_format(self, pt_format: str):
+        """
+        Set the file format commands run with -pt save tensors in.
+        'pt' pickles them with torch.save, 'safetensors' and 'npy' store the raw array behind a small header, they load without unpickling and can be memory-mapped (see AudioCLI.src.tensors.load_tensor).
+
+        Args:\n
+            pt_format (str): 'pt', 'safetensors' or 'npy'\n
+        """
+        if pt_format not in PT_FORMATS:
+            cprint(
+                f"Error: tensor format must be one of {list(PT_FORMATS)}.", color="red"
+            )
+            return
+        self.client.pt_format = pt_format
+        cprint(f"Tensor format set to {pt_format}", color="green")
+
+    def pt_dtype(self, dtype: str):
+        """
+        Set the sample type commands run with -pt save tensors as.
+        float16 and int16 (full scale) files are half the size of float32 ones.
+
+        Args:\n
+            dtype (str): 'float32', 'float16' or 'int16'\n
+        """
+        if dtype not in DTYPES:
+            cprint(f"Error: tensor dtype must be one of {list(DTYPES)}.", color="red")
+            return
+        self.client.pt_dtype = dtype
+        cprint(f"Tensor dtype set to {dtype}", color="green")
@@ -0,0 +1,190 @@
+from AudioCLI.src.util import chunks, load_file, save_output, probe_file
+from AudioCLI.src.ops import quantize, fast_pitch
+from AudioCLI.src.kernels import get_transform
+from AudioCLI.src.wav import can_pcm, pcm_file
+from AudioCLI.src.derived_cache import output_path
+from AudioCLI.src.profiling import stage
+import torch
+from torch import nn
+import random
+import concurrent.futures
+
+"""
+Batched versions of the per-file operations in AudioCLI.src.ops.
+Files with the same sample rate and channel count are padded into one tensor (batch_size x channels x n_samples) and every operation runs once per batch.
+Every batched operation takes the padded audio, the valid length of every item and the sample rate and returns all three updated.
+"""
+
+
+def resample(audio, lengths, sr, sample_rate):
+    aug_tf = get_transform("resample", int(sr), int(sample_rate), device=audio.device)
+    # ceil in integer math, float rounding would be off by one for long files
+    lengths = (lengths * int(sample_rate) + int(sr) - 1) // int(sr)
+    return aug_tf(audio), lengths, int(sample_rate)
+
+
+def phaseflip(audio, lengths, sr):
+    return -audio, lengths, sr
+
+
+def noise(audio, lengths, sr, noise_level):
+    # one noise scale per file, like the per-file version
+    scale = float(noise_level) * torch.rand(audio.shape[0], 1, 1, device=audio.device)
+    return audio + scale * (2 * torch.rand_like(audio) - 1), lengths, sr
+
+
+def pool(audio, lengths, sr):
+    ksize = int(random.random() * 100)
+    avger = nn.AvgPool1d(kernel_size=ksize, stride=1, padding=1)
+    return avger(audio), lengths + 3 - ksize, sr
+
+
+def pitch(audio, lengths, sr, pitch, mode="quality"):
+    # both modes work on the last axis, the whole batch goes through one STFT (or one resample and stretch)
+    if mode == "fast":
+        return fast_pitch(audio, sr, pitch), lengths, sr
+    aug_tf = get_transform("pitch", int(sr), int(pitch), device=audio.device)
+    return aug_tf(audio), lengths, sr
+
+
+def bitdepth(audio, lengths, sr, bit_depth):
+    # bit depth is applied when saving, see AudioCLI.src.ops.apply_stages
+    return audio, lengths, sr
+
+
+def stereo(audio, lengths, sr):
+    if audio.shape[1] == 1:
+        return audio.repeat(1, 2, 1), lengths, sr
+    return audio[:, :2], lengths, sr
+
+
+def mono(audio, lengths, sr):
+    return audio.mean(dim=1, keepdim=True), lengths, sr
+
+
+BATCH_OPS = {
+    "resample": resample,
+    "phaseflip": phaseflip,
+    "noise": noise,
+    "pool": pool,
+    "pitch": pitch,
+    "bitdepth": bitdepth,
+    "stereo": stereo,
+    "mono": mono,
+}
+
+
+def can_batch(stages):
+    """Check whether every stage has a batched version."""
+    return all(name in BATCH_OPS for name, _ in stages)
+
+
+def plan_batches(filepaths, save_paths, batch_size, metadata=None, max_workers=8):
+    """
+    Group files by sample rate and channel count and sort them by length, so every batch holds files that need little padding.
+    Headers are probed unless a metadata dict (path: info) from the metadata index is given.
+
+    Returns a list of (filepaths, save_paths) batches.
+    """
+    if metadata is None:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+            infos = list(ex.map(probe_file, filepaths))
+    else:
+        infos = []
+        for filepath in filepaths:
+            info = metadata.get(filepath)
+            if info:
+                infos.append((info["sr"], info["channels"], info["frames"]))
+            else:
+                infos.append((None, None, 0))
+    items = sorted(
+        zip(infos, filepaths, save_paths),
+        key=lambda item: (str(item[0][0]), str(item[0][1]), item[0][2]),
+    )
+    groups = {}
+    for (sr, channels, _), filepath, save_path in items:
+        groups.setdefault((sr, channels), []).append((filepath, save_path))
+    batches = []
+    for group in groups.values():
+        for batch in chunks(group, batch_size):
+            batches.append(([fp for fp, _ in batch], [sp for _, sp in batch]))
+    return batches
+
+
+def pad_batch(audios):
+    """Stack (channels x n_samples) tensors into one zero padded tensor, returns it with the length of every item."""
+    lengths = torch.tensor([audio.shape[-1] for audio in audios])
+    batch = torch.zeros(len(audios), audios[0].shape[0], int(lengths.max()))
+    for idx, audio in enumerate(audios):
+        batch[idx, :, : audio.shape[-1]] = audio
+    return batch, lengths
+
+
+def apply_batched_stages(audio, lengths, sr, stages):
+    """
+    Run a list of stages on a padded batch.
+
+    Returns the processed batch, the lengths, the sample rate and the bit depth to save with (None for default).
+    """
+    bits = None
+    for idx, (name, args) in enumerate(stages):
+        audio, lengths, sr = BATCH_OPS[name](audio, lengths, sr, **args)
+        # keep padding silent so it doesn't leak into the next operation
+        positions = torch.arange(audio.shape[-1], device=audio.device)
+        mask = positions[None, :] < lengths.to(audio.device)[:, None]
+        audio = audio * mask[:, None, :]
+        bits = int(args["bit_depth"]) if name == "bitdepth" else None
+        if bits and bits < 32 and idx < len(stages) - 1:
+            audio = quantize(audio, bits)
+    return audio, lengths, sr, bits
+
+
+def process_batch(args):
+    """
+    Decode a batch of files, run all stages once per group of equal sample rate and channel count and save every file.
+    Files that fit the PCM fast path run on it one by one like in AudioCLI.src.ops.process_file, so the output format doesn't depend on batching.
+
+    Args:
+        args (tuple): (filepaths, save_paths, stages, options)
+
+    Returns:
+        int: Number of files in the batch
+    """
+    filepaths, save_paths, stages, options = args
+    device = options.get("device", "cpu")
+    groups = {}
+    for filepath, save_path in zip(filepaths, save_paths):
+        try:
+            if can_pcm(filepath, save_path, stages, options):
+                out_path = output_path(save_path, options)
+                with stage("pcm", filepath, read=filepath, written=out_path):
+                    pcm_file(filepath, save_path, stages)
+                continue
+            with stage("decode", filepath, read=filepath):
+                audio, sr = load_file(filepath)
+            groups.setdefault((sr, audio.shape[0]), []).append(
+                (audio, filepath, save_path)
+            )
+        except Exception as e:
+            print(e)
+    for (sr, _), items in groups.items():
+        try:
+            # one transform record per batch, under the path of its first file
+            with stage("transform", items[0][1]):
+                batch, lengths = pad_batch([audio for audio, _, _ in items])
+                auged, lengths, out_sr, bits = apply_batched_stages(
+                    batch.to(device), lengths, sr, stages
+                )
+                auged = auged.to("cpu")
+            for idx, (_, filepath, save_path) in enumerate(items):
+                with stage("encode", filepath, written=output_path(save_path, options)):
+                    save_output(
+                        save_path,
+                        auged[idx, :, : int(lengths[idx])],
+                        int(out_sr),
+                        bits=bits,
+                        options=options,
+                    )
+        except Exception as e:
+            print(e)
+    return len(filepaths)
@@ -0,0 +1,191 @@
+from AudioCLI.src.util import probe_file
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import functools
+import platform
+import subprocess
+import threading
+import datetime
+import json
+import time
+import os
+
+"""
+Benchmark harness for the bench category.
+Builds deterministic synthetic corpora, measures throughput of a timed run and saves results as baselines that can be compared across commits.
+"""
+
+BENCH_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"
+)
+
+# (extension, bit depth), files cycle through these
+FORMATS = [("wav", 16), ("wav", 24), ("flac", 16), ("ogg", None), ("mp3", None)]
+RATES = [16000, 22050, 44100]
+CHANNELS = [1, 2]
+DURATIONS = (1.0, 8.0)
+
+
+def make_corpus(root, files=48, seed=0):
+    """
+    Write a synthetic corpus of tones and noise with mixed formats, sample rates, channel counts and durations.
+    The same files and seed always give the same corpus, an existing corpus with a matching manifest is reused.
+
+    Returns the list of file paths.
+    """
+    from pedalboard.io import AudioFile
+    import numpy as np
+
+    manifest_path = os.path.join(root, "corpus.json")
+    manifest = {"files": int(files), "seed": int(seed)}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            existing = json.load(f)
+        if {k: existing.get(k) for k in manifest} == manifest and all(
+            os.path.exists(path) for path in existing["paths"]
+        ):
+            return existing["paths"]
+
+    rng = np.random.default_rng(int(seed))
+    paths = []
+    for idx in range(int(files)):
+        ext, bits = FORMATS[idx % len(FORMATS)]
+        sr = int(rng.choice(RATES))
+        channels = int(rng.choice(CHANNELS))
+        frames = int(rng.uniform(*DURATIONS) * sr)
+        # nest files a few levels deep so scanning has directories to walk
+        directory = os.path.join(root, f"set_{idx % 4}", f"part_{idx % 3}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"tone_{idx:05d}.{ext}")
+        t = np.arange(frames) / sr
+        freq = rng.uniform(110, 880)
+        audio = np.stack(
+            [
+                0.3 * np.sin(2 * np.pi * freq * t + rng.uniform(0, np.pi))
+                + 0.05 * rng.standard_normal(frames)
+                for _ in range(channels)
+            ]
+        ).astype(np.float32)
+        kwargs = {"bit_depth": bits} if bits else {}
+        with AudioFile(path, "w", sr, num_channels=channels, **kwargs) as f:
+            f.write(audio)
+        paths.append(path)
+
+    with open(manifest_path, "w") as f:
+        json.dump({**manifest, "paths": paths}, f, indent=4)
+    return paths
+
+
+def corpus_stats(paths):
+    """Total duration in seconds and size in bytes of a list of files."""
+    seconds = 0.0
+    size = 0
+    for path in paths:
+        sr, _, frames = probe_file(path)
+        if sr:
+            seconds += frames / sr
+        size += os.path.getsize(path)
+    return seconds, size
+
+
+def measure(fn, files, seconds, size):
+    """
+    Time fn() and return the wall time with files/s, audio seconds/s and MB/s for the given amount of work.
+    """
+    start = time.perf_counter()
+    fn()
+    wall = max(time.perf_counter() - start, 1e-9)
+    return {
+        "wall": wall,
+        "files_per_s": files / wall,
+        "audio_s_per_s": seconds / wall,
+        "mb_per_s": size / wall / (1 << 20),
+    }
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(root):
+    """
+    Serve a directory over HTTP on a free local port in a background thread, as a stand-in for an open directory listing.
+
+    Returns the server (call shutdown() when done) and its base url.
+    """
+    handler = functools.partial(_QuietHandler, directory=root)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def _commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(BENCH_DIR),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_baseline(name, results, config):
+    """Save benchmark results with the commit, date and machine they were measured on, returns the file path."""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "commit": _commit(),
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "machine": f"{platform.machine()} {platform.system()} ({os.cpu_count()} cpus)",
+                "python": platform.python_version(),
+                "config": config,
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+    return path
+
+
+def load_baseline(name):
+    path = name if name.endswith(".json") else os.path.join(BENCH_DIR, f"{name}.json")
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def list_baselines():
+    if not os.path.exists(BENCH_DIR):
+        return []
+    return sorted(
+        os.path.splitext(name)[0]
+        for name in os.listdir(BENCH_DIR)
+        if name.endswith(".json")
+    )
+
+
+def compare(old, new):
+    """
+    Match results of two baselines by benchmark, executor and workers.
+
+    Returns a list of (result key, old files/s, new files/s, change in percent) rows.
+    """
+
+    def key(result):
+        return (result["name"], result["executor"], result["workers"])
+
+    old_results = {key(result): result for result in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None:
+            continue
+        change = (result["files_per_s"] / before["files_per_s"] - 1) * 100
+        rows.append((key(result), before["files_per_s"], result["files_per_s"], change))
+    return rows
@@ -1,14 +1,23 @@
 from .target_data import TargetData
 import icli
 from termcolor import cprint
-import inspect
-import torch
 import traceback
 import sys
-import pkgutil
 import importlib
 import os
-from AudioCLI.src.util import chunks, extract_arg_help
+from AudioCLI.src.util import chunks
+from AudioCLI.src.manifest import (
+    module_stamps,
+    load_manifest,
+    save_manifest,
+    discover_categories,
+    add_category_parser,
+    build_manifest,
+)
+from AudioCLI.src.cluster import parse_shard, in_shard
+from AudioCLI.src import profiling
+import contextlib
+import cProfile
 import json
 
 _REPEAT_ONCE = 1
@@ -16,6 +25,7 @@ _REPEAT_CONT = 2
 _REPEAT_CONT_CLS = 3
 
 FILE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS_PATH = os.path.join(FILE_DIR, "last_settings.json")
 
 
 class BaseCommandCategory:
@@ -24,15 +34,13 @@ class BaseCommandCategory:
         self.name = self._get_info()["name"]
         self.description = self._get_info()["description"]
         self.main_parser = main_parser
-        self.cat_parser = main_parser.add_parser(self.name, help=self.description)
-        self.subparsers = self.cat_parser.add_subparsers(
-            dest="_command",
-            metavar="command",
-            help="(<category> <command> -h for more info.)",
-        )
-
-        for command_name, function in self._get_commands().items():
-            self._create_command_parser(command_name, function)
+        # the client builds parsers from the command manifest and passes no parser
+        self.cat_parser = None
+        if main_parser is not None:
+            self.cat_parser = add_category_parser(
+                main_parser,
+                describe_category(type(self).__name__, type(self).__module__, self),
+            )
 
     def _get_info(self):
         return {
@@ -43,98 +51,14 @@ class BaseCommandCategory:
     def _can_process(self):
         return False
 
+    def _can_shard(self):
+        return False
+
     def _get_commands(self):
         return {}
 
-    def _create_command_parser(self, command_name, function):
-        args = inspect.getfullargspec(function)
-        command_parser = self.subparsers.add_parser(
-            command_name,
-            help=function.__doc__
-            if function.__doc__
-            else "No help text available",  # use function docstring as command help text
-        )
-
-        defaults = (
-            dict(zip(args.args[-len(args.defaults) :], args.defaults))
-            if args.defaults
-            else {}
-        )
-
-        for arg in args.args:
-            # skip if arg is self
-            if arg == "self":
-                continue
-
-            default = defaults.get(arg, None)
-            type = args.annotations.get(arg, None)
-            help_text = extract_arg_help(arg, function.__doc__)
-
-            if type == bool:
-                if default is None:  # Required argument
-                    default = False
-                    action = "store_true"
-                else:
-                    default = bool(default)  # Ensure default is a boolean
-                    action = "store_true" if not default else "store_false"
-
-                arg_key = f"--{arg.replace('_', '-')}"
-
-                command_parser.add_argument(
-                    arg_key,
-                    default=default,
-                    help=help_text,
-                    action=action,
-                )
-
-            else:
-                nargs = "+" if type == list else None
-                action = "store"
-
-                if default is None:  # If no default value, create a positional argument
-                    command_parser.add_argument(
-                        arg,
-                        nargs=nargs,
-                        help=help_text,
-                        action=action,
-                    )
-                else:  # If a default value exists, create an optional argument
-                    arg_key = f"--{arg.replace('_', '-')}"
-                    command_parser.add_argument(
-                        arg_key,
-                        nargs=nargs,
-                        default=default,
-                        help=help_text,
-                        action=action,
-                    )
-        # add args for -target
-        command_parser.add_argument(
-            "-target",
-            nargs="+",
-            default=[],
-            help="Target files or directories.",
-        )
-        command_parser.add_argument(
-            "-output",
-            default="",
-            help="Output directory.",
-        )
-
-        if self._can_process():
-            # add args for -o
-            command_parser.add_argument(
-                "-o",
-                action="store_true",
-                default=False,
-                help="Overwrite source file.",
-            )
-            # add args for -pt (saving as pytorch file)
-            command_parser.add_argument(
-                "-pt",
-                action="store_true",
-                default=False,
-                help="Save as pytorch file.",
-            )
+    def _get_stages(self):
+        return {}
 
 
 class InteractiveClient:
@@ -142,40 +66,78 @@ class InteractiveClient:
         self.target_data = TargetData()
         self.output_dir = None
         self.batch_size = 3
+        self.pipeline = False
+        self.stream_block = None
+        self.executor = "thread"
+        self.batching = False
+        self.cache = "off"
+        self.overlap = None
+        self.coordinator = None
+        self.cluster_token = None
+        self.memory_budget = None
+        self.pack_dtype = "float32"
+        self.pt_format = "pt"
+        self.pt_dtype = "float32"
         self.parser = InteractiveParser(
             prog="" if len(sys.argv) < 2 else None, client=self
         )
         self.categories = self.load_categories("AudioCLI.modules")
-        self.device = self.detect_device()
+        # None until set or detected on first use, detecting imports torch
+        self.device_setting = None
         self.one_shot_args = {
             "overwrite_mode": None,
             "pt_save": False,
+            "pack": False,
             "target": [],
             "output": "",
+            "shard": None,
         }
         self.overwrite_mode = None
         self.pt_save = False
         super().__init__(*args, **kwargs)
 
     def load_from_settings(self):
-        json_path = os.path.join(FILE_DIR, "last_settings.json")
-        if os.path.exists(json_path):
-            with open(json_path, "r") as f:
+        if os.path.exists(SETTINGS_PATH):
+            with open(SETTINGS_PATH, "r") as f:
                 settings = json.load(f)
             self.target_data.from_settings(settings)
             self.output_dir = settings["output_dir"]
             self.batch_size = settings["batch_size"]
-            self.device = torch.device(settings["device"])
+            self.device_setting = settings.get("device", None)
+            self.pipeline = settings.get("pipeline", False)
+            self.stream_block = settings.get("stream_block", None)
+            self.executor = settings.get("executor", "thread")
+            self.batching = settings.get("batching", False)
+            self.cache = settings.get("cache", "off")
+            self.overlap = settings.get("overlap", None)
+            self.coordinator = settings.get("coordinator", None)
+            self.cluster_token = settings.get("cluster_token", None)
+            self.memory_budget = settings.get("memory_budget", None)
+            self.pack_dtype = settings.get("pack_dtype", "float32")
+            self.pt_format = settings.get("pt_format", "pt")
+            self.pt_dtype = settings.get("pt_dtype", "float32")
             cprint("Loaded settings from last session.", color="green")
 
     def save_to_settings(self):
-        json_path = os.path.join(FILE_DIR, "last_settings.json")
         settings = {}
         settings["search_paths"] = self.target_data.search_paths
+        settings["filter"] = self.target_data.filter
         settings["output_dir"] = self.output_dir
         settings["batch_size"] = self.batch_size
-        settings["device"] = str(self.device)
-        open(json_path, "w").write(json.dumps(settings, indent=4))
+        settings["device"] = self.device_setting
+        settings["pipeline"] = self.pipeline
+        settings["stream_block"] = self.stream_block
+        settings["executor"] = self.executor
+        settings["batching"] = self.batching
+        settings["cache"] = self.cache
+        settings["overlap"] = self.overlap
+        settings["coordinator"] = self.coordinator
+        settings["cluster_token"] = self.cluster_token
+        settings["memory_budget"] = self.memory_budget
+        settings["pack_dtype"] = self.pack_dtype
+        settings["pt_format"] = self.pt_format
+        settings["pt_dtype"] = self.pt_dtype
+        open(SETTINGS_PATH, "w").write(json.dumps(settings, indent=4))
 
     def get_save_paths(self, id_str):
         output_overwrite = False
@@ -185,39 +147,57 @@ class InteractiveClient:
         if self.one_shot_args["overwrite_mode"] == "o":
             output_overwrite = True
         batches = []
-        chunked = chunks(self.target_data.file_paths, self.batch_size)
+        chunked = chunks(self.shard_paths(self.target_data.file_paths), self.batch_size)
         for fp_batch in chunked:
-            save_paths = []
-            for file_path in fp_batch:
-                if output_overwrite:
-                    save_path = file_path
-                else:
-                    if self.output_dir is None:
-                        save_path = (
-                            os.path.splitext(file_path)[0]
-                            + id_str
-                            + os.path.splitext(file_path)[1]
-                        )
-                    else:
-                        save_path = os.path.join(
-                            self.output_dir, os.path.basename(file_path)
-                        )
-                        save_path = (
-                            os.path.splitext(save_path)[0]
-                            + id_str
-                            + os.path.splitext(save_path)[1]
-                        )
-                save_paths.append(save_path)
-
+            save_paths = [
+                self.get_save_path(file_path, id_str, output_overwrite)
+                for file_path in fp_batch
+            ]
             batches.append((fp_batch, save_paths))
 
         return batches
 
+    def shard_paths(self, file_paths):
+        """The files this host works on, all of them unless the command runs with --shard i/n."""
+        shard = self.one_shot_args.get("shard")
+        if not shard:
+            return file_paths
+        index, count = shard
+        sharded = [path for path in file_paths if in_shard(path, index, count)]
+        cprint(
+            f"Shard {index}/{count}: {len(sharded)} of {len(file_paths)} files.",
+            color="yellow",
+        )
+        return sharded
+
+    def get_save_path(self, file_path, id_str, overwrite=False):
+        # absolute, tasks can run in worker processes (or a daemon's pool) started from another directory
+        file_path = os.path.abspath(file_path)
+        if overwrite:
+            return file_path
+        if self.output_dir is None:
+            return (
+                os.path.splitext(file_path)[0] + id_str + os.path.splitext(file_path)[1]
+            )
+        save_path = os.path.join(
+            os.path.abspath(self.output_dir), os.path.basename(file_path)
+        )
+        return os.path.splitext(save_path)[0] + id_str + os.path.splitext(save_path)[1]
+
+    @property
+    def device(self):
+        if self.device_setting is None:
+            self.detect_device()
+        return self.device_setting
+
+    @device.setter
+    def device(self, device):
+        self.device_setting = str(device)
+
     def detect_device(self, print=True):
-        if torch.cuda.is_available():
-            device = torch.device("cuda")
-        else:
-            device = torch.device("cpu")
+        import torch
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
         self.device = device
         if print:
             if self.device != "cpu":
@@ -229,49 +209,101 @@ class InteractiveClient:
             else:
                 cprint(
                     "No CUDA/MPS Detected! Using CPU, change using: 'target device <device>'",
-                    color="orange",
+                    color="yellow",
                 )
         return device
 
     def load_categories(self, package_name):
-        categories = {}
-
-        def load_module(module, sp):
-            # iterate over all objects in the module
-            for obj_name in dir(module):
-                obj = getattr(module, obj_name)
-
-                # check if object is a class and is a subclass of BaseCommandCategory
-                if (
-                    isinstance(obj, type)
-                    and issubclass(obj, BaseCommandCategory)
-                    and obj != BaseCommandCategory
-                ):
-                    instance = obj(
-                        main_parser=sp, client=self
-                    )  # instantiate the class]
-                    categories[obj.__name__] = instance
-
-        def load_package(package, sp):
-            # iterate over all modules and packages in the package
-            for _, module_name, is_pkg in pkgutil.iter_modules(package.__path__):
-                full_name = f"{package.__name__}.{module_name}"
-                if is_pkg:
-                    load_package(importlib.import_module(full_name), sp)
-                else:
-                    load_module(importlib.import_module(full_name), sp)
+        """
+        Build the category parsers from the command manifest, discovering the categories first if it is missing or outdated.
+        Category modules are only imported once one of their commands runs.
+        """
+        manifest_path = os.path.join(FILE_DIR, "command_manifest.json")
+        stamps = module_stamps(package_name)
+        manifest = load_manifest(manifest_path, stamps)
+        loaded = {}
+        if manifest is None:
+            discovered = discover_categories(package_name, BaseCommandCategory, self)
+            manifest = build_manifest(stamps, discovered)
+            save_manifest(manifest_path, manifest)
+            loaded = {
+                class_name: instance for class_name, (_, instance) in discovered.items()
+            }
 
         sp = self.parser.add_subparsers(
             dest="_category", metavar="category", help="(<category> -h for more info.)"
         )
+        for entry in manifest["categories"]:
+            add_category_parser(sp, entry)
 
-        load_package(importlib.import_module(package_name), sp)
-
+        categories = Categories(self, manifest["categories"], loaded)
         self.parser.categories = categories
 
         return categories
 
 
+class Categories:
+    """
+    Command categories by class name, instantiated on first access.
+    The manifest entries answer everything the parser needs (names, commands, fusable stages) without importing the category module.
+    """
+
+    def __init__(self, client, entries, loaded=None):
+        self.client = client
+        self.entries = {entry["class"]: entry for entry in entries}
+        self.loaded = loaded or {}
+
+    def __getitem__(self, class_name):
+        if class_name not in self.loaded:
+            entry = self.entries[class_name]
+            module = importlib.import_module(entry["module"])
+            self.loaded[class_name] = getattr(module, class_name)(
+                main_parser=None, client=self.client
+            )
+        return self.loaded[class_name]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return [entry["name"] for entry in self.entries.values()]
+
+    def entry(self, name):
+        """Manifest entry of the category called name (as typed on the command line), or None."""
+        for entry in self.entries.values():
+            if entry["name"] == name:
+                return entry
+        return None
+
+    def find(self, name):
+        """Instance of the category called name, or None."""
+        entry = self.entry(name)
+        return self[entry["class"]] if entry else None
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """
+    Profile the commands run inside the block, print the per-stage summary afterwards.
+    A non-empty path also runs cProfile (in the main thread and every task) and saves its stats and the per-file records.
+    """
+    profiler = profiling.enable(cprofile=bool(path))
+    main = cProfile.Profile() if path else None
+    if main:
+        main.enable()
+    try:
+        yield profiler
+    finally:
+        profiling.disable()
+        if main:
+            main.disable()
+            main.create_stats()
+            profiler.stats.append(main.stats)
+        profiler.report()
+        if path:
+            profiler.dump(path)
+
+
 class InteractiveParser(icli.ArgumentParser):
     def __init__(self, *args, **kwargs):
         self.client = kwargs.pop("client", None)
@@ -282,8 +314,22 @@ class InteractiveParser(icli.ArgumentParser):
             "o" if kwargs.pop("o", False) else None
         )
         self.client.one_shot_args["pt_save"] = kwargs.pop("pt", False)
+        self.client.one_shot_args["pack"] = kwargs.pop("pack", False)
         self.client.one_shot_args["target"] = kwargs.pop("target", [])
         self.client.one_shot_args["output"] = kwargs.pop("output", "")
+        try:
+            self.client.one_shot_args["shard"] = parse_shard(kwargs.pop("shard", ""))
+        except ValueError as e:
+            cprint(f"Error: {e}", color="red")
+            return
+        profile = kwargs.pop("profile", None)
+        if profile is not None:
+            with profiled(profile):
+                self._run(_category, _command, **kwargs)
+        else:
+            self._run(_category, _command, **kwargs)
+
+    def _run(self, _category, _command=None, **kwargs):
         override = (
             True
             if self.client.one_shot_args["target"]
@@ -291,62 +337,110 @@ class InteractiveParser(icli.ArgumentParser):
             else False
         )
 
-        if override:
-            if self.client.one_shot_args["target"]:
-                original_search_paths = self.client.target_data.search_paths
-                self.client.target_data.search_paths = self.client.one_shot_args[
-                    "target"
-                ]
-                self.client.target_data.scan(self.client.one_shot_args["target"])
-            if self.client.one_shot_args["output"]:
-                original_output_dir = self.client.output_dir
-                self.client.output_dir = self.client.one_shot_args["output"]
-
         try:
-            for category_name, category in self.client.categories.items():
-                if _category == category.name:
-                    if _command in category._get_commands().keys():
-                        func = category._get_commands()[_command]
-                        self.client.target_data.scan(
-                            self.client.target_data.search_paths
-                        )
-                        func(**kwargs)
-                        if override:
-                            if self.client.one_shot_args["target"]:
-                                self.client.target_data.search_paths = (
-                                    original_search_paths
-                                )
-                            if self.client.one_shot_args["output"]:
-                                self.client.output_dir = original_output_dir
-
-                        self.client.save_to_settings()
-                        self.client.target_data.scan(
-                            self.client.target_data.search_paths
+            if override:
+                if self.client.one_shot_args["target"]:
+                    original_search_paths = self.client.target_data.search_paths
+                    self.client.target_data.search_paths = self.client.one_shot_args[
+                        "target"
+                    ]
+                    self.client.target_data.scan(self.client.one_shot_args["target"])
+                if self.client.one_shot_args["output"]:
+                    original_output_dir = self.client.output_dir
+                    self.client.output_dir = self.client.one_shot_args["output"]
+
+            category = self.client.categories.find(_category)
+            if category is not None:
+                if _command in category._get_commands().keys():
+                    func = category._get_commands()[_command]
+                    self.client.target_data.scan(self.client.target_data.search_paths)
+                    func(**kwargs)
+                    if override:
+                        if self.client.one_shot_args["target"]:
+                            self.client.target_data.search_paths = original_search_paths
+                        if self.client.one_shot_args["output"]:
+                            self.client.output_dir = original_output_dir
+
+                    self.client.save_to_settings()
+                    self.client.target_data.scan(self.client.target_data.search_paths)
+                    if self.client.target_data.contains_data():
+                        cprint(
+                            f"Current target paths: {self.client.target_data.search_paths} | ({len(self.client.target_data.file_paths)}) files",
+                            color="green",
                         )
-                        if self.client.target_data.contains_data():
-                            cprint(
-                                f"Current target paths: {self.client.target_data.search_paths} | ({len(self.client.target_data.file_paths)}) files",
-                                color="green",
-                            )
 
-                        self.client.one_shot_args = {}
-                        return
+                    self.client.one_shot_args = {}
+                    return
+                else:
+                    if _command:
+                        cprint(
+                            f"Error: command {_command} does not exist for category {_category}.",
+                            color="red",
+                        )
                     else:
-                        if _command:
-                            cprint(
-                                f"Error: command {_command} does not exist for category {_category}.",
-                                color="red",
-                            )
-                        else:
-                            cprint(
-                                f"Error: command not specified for category {_category}. Type {_category} -h for more info.",
-                                color="red",
-                            )
+                        cprint(
+                            f"Error: command not specified for category {_category}. Type {_category} -h for more info.",
+                            color="red",
+                        )
             cprint(f"Error: category {_category} does not exist.", color="red")
         except Exception as e:
             cprint(f"Error: {e}", color="red")
             traceback.print_exc()
 
+    def can_fuse(self, args):
+        """
+        Check whether a parsed command can be fused into a pipeline with its neighbours.
+        """
+        if not self.client.pipeline:
+            return False
+        if getattr(args, "target", None) or getattr(args, "output", None):
+            return False
+        # answered from the manifest, so the category module is not imported yet
+        entry = self.client.categories.entry(args._category)
+        return entry is not None and args._command in entry["stages"]
+
+    def run_pipeline(self, commands):
+        """
+        Run consecutive fusable commands as a single pass over the target files.
+        """
+        if not commands:
+            return
+        if len(commands) == 1:
+            self.run(**commands[0])
+            return
+        profile = next(
+            (c["profile"] for c in commands if c.get("profile") is not None), None
+        )
+        if profile is not None:
+            with profiled(profile):
+                self._run_pipeline(commands)
+        else:
+            self._run_pipeline(commands)
+
+    def _run_pipeline(self, commands):
+        try:
+            category = self.client.categories.find(commands[0]["_category"])
+            if category is not None:
+                self.client.one_shot_args["pt_save"] = commands[-1].get("pt", False)
+                self.client.one_shot_args["pack"] = commands[-1].get("pack", False)
+                self.client.one_shot_args["shard"] = parse_shard(
+                    next((c["shard"] for c in commands if c.get("shard")), "")
+                )
+                self.client.target_data.scan(self.client.target_data.search_paths)
+                category._run_pipeline(commands)
+                self.client.save_to_settings()
+                self.client.target_data.scan(self.client.target_data.search_paths)
+                if self.client.target_data.contains_data():
+                    cprint(
+                        f"Current target paths: {self.client.target_data.search_paths} | ({len(self.client.target_data.file_paths)}) files",
+                        color="green",
+                    )
+                self.client.one_shot_args = {}
+                return
+        except Exception as e:
+            cprint(f"Error: {e}", color="red")
+            traceback.print_exc()
+
     def get_interactive_prompt(self):
         if self.current_section:
             ps = "/".join(self.current_section) + "> "
@@ -378,6 +472,16 @@ class InteractiveParser(icli.ArgumentParser):
                 except:
                     pass
 
+        pending = []
+
+        def run_pending():
+            if pending:
+                try:
+                    self.run_pipeline(pending)
+                except:
+                    self.handle_interactive_exception()
+                pending.clear()
+
         if stream:
             input_strings = stream.readlines()
             if not input_strings:
@@ -531,6 +635,14 @@ class InteractiveParser(icli.ArgumentParser):
                         except:
                             self.handle_interactive_parser_exception()
                             continue
+                        if self.send_args_as_dict and self.can_fuse(a):
+                            # chained commands are held back and run in a single pass
+                            pending.append(a.__dict__)
+                            # saving as .pt or packing ends the chain
+                            if getattr(a, "pt", False) or getattr(a, "pack", False):
+                                run_pending()
+                            continue
+                        run_pending()
                         try:
                             if self.send_args_as_dict:
                                 self.run(**a.__dict__)
@@ -540,6 +652,7 @@ class InteractiveParser(icli.ArgumentParser):
                             self.handle_interactive_exception()
                         if pidx < len(input_val) - 1:
                             print()
+                    run_pending()
                     if do_repeat:
                         time.sleep(repeat_seconds)
                         if do_repeat == _REPEAT_CONT_CLS:
@@ -0,0 +1,347 @@
+from termcolor import cprint
+import collections
+import importlib
+import ipaddress
+import hashlib
+import secrets
+import hmac
+import threading
+import socket
+import json
+import zlib
+import time
+import os
+
+"""
+Distributed processing over TCP.
+A coordinator serves the planned tasks of one command to worker nodes, which pull them one at a time, run them against a shared filesystem and acknowledge them with their result.
+Every host has to see the target and output files at the same paths.
+Tasks held by a worker that disconnects before acknowledging them are served again, failed tasks are reported and not retried.
+Every connection starts with a challenge-response on a shared token (target cluster_token, or the AUDIOCLI_CLUSTER_TOKEN environment variable), so workers only take tasks from, and coordinators only serve, hosts that know it.
+Coordinators listen on 127.0.0.1 unless given a host, and need a token for any other host.
+Messages are json lines: workers send {"get": true} and {"ack": id, "result": ...} (or {"ack": id, "error": ...}), the coordinator answers get with {"job", "id", "fn", "task", "cwd"}, {"wait": seconds} while the last tasks run elsewhere, or {"done": job}.
+Static partitioning without a coordinator is done with in_shard.
+"""
+
+# task functions a worker runs by name, a coordinator can't make it import anything else
+TASK_FUNCTIONS = {
+    "process_file": "AudioCLI.src.ops",
+    "process_batch": "AudioCLI.src.batch",
+    "remove_silent_file": "AudioCLI.src.ops",
+    "chunk_file": "AudioCLI.src.ops",
+}
+
+# seconds between connection attempts of a worker, and between get requests while the last tasks run elsewhere
+RETRY = 1.0
+TOKEN_ENV = "AUDIOCLI_CLUSTER_TOKEN"
+
+
+def parse_address(text, default_host="127.0.0.1", any_port=False):
+    """'host:port' or ':port' as (host, port), port 0 (any free port) only with any_port, raises ValueError."""
+    host, _, port = text.rpartition(":")
+    lowest = 0 if any_port else 1
+    if not port.isdigit() or not lowest <= int(port) < 65536:
+        raise ValueError(f"{text} is not an address, use host:port ie: 127.0.0.1:7070")
+    return host or default_host, int(port)
+
+
+def parse_shard(text):
+    """'i/n' as (i, n) with 0 <= i < n, None for an empty string, raises ValueError."""
+    if not text:
+        return None
+    index, _, count = text.partition("/")
+    if not index.isdigit() or not count.isdigit() or not int(index) < int(count):
+        raise ValueError(f"shard must be i/n with 0 <= i < n ie: 0/4, not {text}")
+    return int(index), int(count)
+
+
+def in_shard(path, index, count):
+    """Whether a file belongs to shard index of count, the same on every host that sees it at the same path."""
+    key = os.path.abspath(path).encode("utf-8", "surrogateescape")
+    return zlib.crc32(key) % count == index
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _receive(lines):
+    line = next(lines, None)
+    if line is None:
+        raise ConnectionError("connection closed")
+    return json.loads(line)
+
+
+def cluster_token(setting=None):
+    """Shared token of this host, the environment variable takes precedence over the setting."""
+    return os.environ.get(TOKEN_ENV) or setting or ""
+
+
+def _sign(token, challenge):
+    return hmac.new(
+        token.encode("utf-8"), challenge.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _authenticate(sock, lines, token, challenge):
+    """
+    Answer the challenge of the other side and check its answer to our own one, the token itself is never sent.
+    Raises PermissionError when the other side doesn't know the token.
+    """
+    own = secrets.token_hex(16)
+    _send(sock, {"auth": _sign(token, challenge), "challenge": own})
+    message = _receive(lines)
+    if "error" in message:
+        raise PermissionError(message["error"])
+    if not hmac.compare_digest(str(message.get("auth", "")), _sign(token, own)):
+        raise PermissionError("wrong cluster token")
+
+
+def localize(task, device):
+    """Task with the device of its options replaced by the device of this host."""
+    return [
+        (
+            {**item, "device": device}
+            if isinstance(item, dict) and "device" in item
+            else item
+        )
+        for item in task
+    ]
+
+
+def run_task(fn_name, task, cwd, device):
+    """Run a task sent by a coordinator, relative paths are resolved against the coordinator's working directory."""
+    if os.path.isdir(cwd):
+        os.chdir(cwd)
+    module = importlib.import_module(TASK_FUNCTIONS[fn_name])
+    return getattr(module, fn_name)(localize(task, device))
+
+
+class Coordinator:
+    """
+    Serve tasks of one command to workers until all of them are acknowledged.
+    Results are collected in task order, progress (a tqdm bar) is updated for every acknowledged task.
+    """
+
+    def __init__(self, address, fn_name, tasks, progress=None, token=""):
+        if fn_name not in TASK_FUNCTIONS:
+            raise ValueError(f"{fn_name} can't run on workers")
+        self.address = parse_address(address, any_port=True)
+        if not token and not _is_loopback(self.address[0]):
+            raise ValueError(
+                f"serving on {self.address[0]} needs a cluster token, set one with 'target cluster_token <token>' or {TOKEN_ENV}"
+            )
+        self.token = token
+        self.fn_name = fn_name
+        self.tasks = tasks
+        self.progress = progress
+        self.job = f"{socket.gethostname()}-{os.getpid()}-{time.time()}"
+        self.cwd = os.getcwd()
+        self.todo = collections.deque(range(len(tasks)))
+        self.results = [None] * len(tasks)
+        self.remaining = len(tasks)
+        self.failed = 0
+        self.condition = threading.Condition()
+        self.server = None
+
+    def run(self):
+        """Serve the tasks, returns their results in task order."""
+        server = socket.create_server(self.address)
+        server.settimeout(0.5)
+        # the port actually listened on when given port 0
+        self.address = server.getsockname()[:2]
+        self.server = server
+        acceptor = threading.Thread(target=self._accept, daemon=True)
+        acceptor.start()
+        try:
+            with self.condition:
+                while self.remaining:
+                    self.condition.wait(0.5)
+        finally:
+            self.server.close()
+            acceptor.join()
+        return self.results
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                # closed once every task is acknowledged
+                return
+            conn.settimeout(None)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn, lines):
+        challenge = secrets.token_hex(16)
+        _send(conn, {"challenge": challenge})
+        message = _receive(lines)
+        if not hmac.compare_digest(
+            str(message.get("auth", "")), _sign(self.token, challenge)
+        ):
+            _send(conn, {"error": "wrong cluster token"})
+            raise PermissionError("wrong cluster token")
+        _send(conn, {"auth": _sign(self.token, str(message.get("challenge", "")))})
+
+    def _serve(self, conn):
+        leased = set()
+        try:
+            with conn:
+                lines = iter(conn.makefile("r", encoding="utf-8"))
+                try:
+                    self._handshake(conn, lines)
+                except PermissionError:
+                    cprint(
+                        f"Error: rejected {conn.getpeername()[0]}, wrong cluster token.",
+                        color="red",
+                    )
+                    return
+                for line in lines:
+                    message = json.loads(line)
+                    if "ack" in message:
+                        self._ack(message, leased)
+                    if message.get("get"):
+                        _send(conn, self._next(leased))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.condition:
+                # the worker went away, its unacknowledged tasks go to the next worker that asks
+                self.todo.extendleft(leased)
+
+    def _next(self, leased):
+        with self.condition:
+            if self.todo:
+                task_id = self.todo.popleft()
+                leased.add(task_id)
+                return {
+                    "job": self.job,
+                    "id": task_id,
+                    "fn": self.fn_name,
+                    "task": self.tasks[task_id],
+                    "cwd": self.cwd,
+                }
+            if self.remaining:
+                return {"wait": RETRY}
+            return {"done": self.job}
+
+    def _ack(self, message, leased):
+        task_id = message["ack"]
+        with self.condition:
+            if task_id not in leased:
+                return
+            leased.remove(task_id)
+            result = message.get("result")
+            if "error" in message:
+                self.failed += 1
+                cprint(
+                    f"Error: {self.tasks[task_id][0]}: {message['error']}", color="red"
+                )
+            self.results[task_id] = result
+            self.remaining -= 1
+            if self.progress is not None:
+                self.progress.update(result if isinstance(result, int) else 1)
+            self.condition.notify_all()
+
+
+class Worker:
+    """
+    Pull tasks from a coordinator over several connections and run them with run(fn_name, task, cwd), see run_task.
+    Waits for the coordinator to come up, also between commands, and stops after jobs commands (0 runs until interrupted).
+    """
+
+    def __init__(self, address, run, connections=1, jobs=0, token=""):
+        self.address = parse_address(address)
+        self.token = token
+        self.run = run
+        self.connections = connections
+        self.jobs = jobs
+        self.done = set()
+        self.tasks = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Run until jobs commands are done, returns the number of tasks this worker ran."""
+        pullers = [
+            threading.Thread(target=self._pull, daemon=True)
+            for _ in range(self.connections)
+        ]
+        for puller in pullers:
+            puller.start()
+        try:
+            while any(puller.is_alive() for puller in pullers):
+                self.stopped.wait(0.5)
+        finally:
+            self.stopped.set()
+        return self.tasks
+
+    def _finish(self, job):
+        with self.lock:
+            if job not in self.done:
+                self.done.add(job)
+                cprint(f"Job {job} done, {self.tasks} tasks run.", color="green")
+            if self.jobs and len(self.done) >= self.jobs:
+                self.stopped.set()
+
+    def _pull(self):
+        while not self.stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                self.stopped.wait(RETRY)
+                continue
+            try:
+                with sock:
+                    self._pull_from(sock)
+            except PermissionError as e:
+                # both sides need the same token, retrying won't help
+                cprint(f"Error: {self.address[0]}:{self.address[1]}: {e}.", color="red")
+                self.stopped.set()
+                return
+            except (OSError, ValueError):
+                pass
+            # the coordinator stops listening after a command, wait for the next one
+            self.stopped.wait(RETRY)
+
+    def _pull_from(self, sock):
+        lines = iter(sock.makefile("r", encoding="utf-8"))
+        _authenticate(
+            sock, lines, self.token, str(_receive(lines).get("challenge", ""))
+        )
+        _send(sock, {"get": True})
+        for line in lines:
+            message = json.loads(line)
+            if "done" in message:
+                self._finish(message["done"])
+                return
+            if "wait" in message:
+                if self.stopped.wait(message["wait"]):
+                    return
+                _send(sock, {"get": True})
+                continue
+            try:
+                reply = {
+                    "ack": message["id"],
+                    "result": self.run(message["fn"], message["task"], message["cwd"]),
+                }
+                json.dumps(reply)
+            except Exception as e:
+                reply = {"ack": message["id"], "error": f"{type(e).__name__}: {e}"}
+            with self.lock:
+                self.tasks += 1
+            _send(sock, reply)
+            if self.stopped.is_set():
+                return
+            _send(sock, {"get": True})
@@ -0,0 +1,263 @@
+from termcolor import cprint
+import contextlib
+import threading
+import socket
+import struct
+import json
+import sys
+import os
+
+"""
+Warm daemon for one-shot commands.
+'audiocli serve' keeps one client running, so torch, the transform kernels, the worker pools and the scan index stay loaded between commands.
+One-shot 'audiocli <category> <command>' calls send their arguments over a local unix socket and print the output the daemon streams back, they fall back to running the command themselves when no daemon is listening.
+Messages are json lines: the request {"argv", "cwd", "tty"} (or {"stop": true}), answered with {"out": text} and {"err": text} while the command runs and {"exit": code} when it is done.
+This module is imported before anything else on every launch, keep it free of heavy imports.
+"""
+
+_UID = os.getuid() if hasattr(os, "getuid") else None
+
+
+def _default_socket_path():
+    # a directory only this user can enter, other users can't take the socket path or reach the socket
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "audiocli.sock")
+    return os.path.join(
+        os.environ.get("TMPDIR", "/tmp"), f"audiocli-{_UID or 0}", "daemon.sock"
+    )
+
+
+SOCKET_PATH = os.environ.get("AUDIOCLI_SOCKET", _default_socket_path())
+
+
+def available():
+    # unix sockets are missing on older windows pythons, AUDIOCLI_NO_DAEMON forces commands to run locally
+    return hasattr(socket, "AF_UNIX") and not os.environ.get("AUDIOCLI_NO_DAEMON")
+
+
+def _check_owner(path):
+    """Raise PermissionError if path belongs to another user."""
+    if _UID is not None and os.stat(path).st_uid != _UID:
+        raise PermissionError(f"{path} belongs to another user")
+
+
+def _connect(path):
+    """Connect to the daemon socket at path, raises PermissionError if the socket or the daemon belongs to another user."""
+    _check_owner(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if hasattr(socket, "SO_PEERCRED"):
+            # the socket file could have been replaced since the check, ask for the listening process' user
+            credentials = sock.getsockopt(
+                socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+            )
+            if struct.unpack("3i", credentials)[1] != _UID:
+                raise PermissionError(f"the daemon on {path} runs as another user")
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _make_private_dir(path):
+    """Create the socket directory with mode 0700, raises PermissionError if it exists and other users can use it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.stat(path)
+    if _UID is not None and (stat.st_uid != _UID or stat.st_mode & 0o077):
+        raise PermissionError(f"{path} must be a directory of this user with mode 700")
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def forward(argv, path=SOCKET_PATH):
+    """
+    Run a one-shot command on the daemon, writing its output to stdout and stderr as it arrives.
+
+    Returns the exit code of the command, or None when no daemon is listening.
+    """
+    if not available():
+        return None
+    try:
+        sock = _connect(path)
+    except PermissionError as e:
+        cprint(f"Warning: {e}, running the command here.", color="yellow")
+        return None
+    except OSError:
+        return None
+    with sock:
+        _send(
+            sock,
+            {"argv": list(argv), "cwd": os.getcwd(), "tty": sys.stdout.isatty()},
+        )
+        try:
+            for line in sock.makefile("r", encoding="utf-8"):
+                message = json.loads(line)
+                if "exit" in message:
+                    return message["exit"]
+                stream = sys.stdout if "out" in message else sys.stderr
+                stream.write(message.get("out", message.get("err", "")))
+                stream.flush()
+        except KeyboardInterrupt:
+            cprint(
+                "\nDetached, the command keeps running on the daemon.", color="yellow"
+            )
+            return 130
+    cprint("Error: the daemon closed the connection.", color="red")
+    return 1
+
+
+def stop(path=SOCKET_PATH):
+    """Ask the daemon listening on path to stop, returns False if none is listening."""
+    if not available():
+        return False
+    try:
+        sock = _connect(path)
+    except PermissionError as e:
+        cprint(f"Error: {e}.", color="red")
+        return False
+    except OSError:
+        return False
+    with sock:
+        _send(sock, {"stop": True})
+        sock.makefile("r", encoding="utf-8").readline()
+    return True
+
+
+class _Connection:
+    """Client connection of the running command, writes from worker threads are sent one message at a time."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                _send(self.sock, message)
+            except OSError:
+                # the client detached, the command finishes without output
+                self.closed = True
+
+
+class _Stream:
+    """Text stream standing in for stdout or stderr while a command runs for a client."""
+
+    def __init__(self, connection, key, tty):
+        self.connection = connection
+        self.key = key
+        self.tty = tty
+        self.encoding = "utf-8"
+
+    def write(self, text):
+        if text:
+            self.connection.send({self.key: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        # termcolor and tqdm check this, answer for the client's terminal
+        return self.tty
+
+
+def _settings_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _run(client, request, connection):
+    """Run the argv of a request in the client's working directory, returns the exit code."""
+    import traceback
+
+    stdout = _Stream(connection, "out", request.get("tty", False))
+    stderr = _Stream(connection, "err", False)
+    cwd = os.getcwd()
+    code = 0
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(request.get("cwd", cwd))
+            client.parser.launch(list(request["argv"]))
+        except SystemExit as e:
+            # argparse exits after -h and on bad arguments
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            cprint(f"Error: {e}", color="red")
+            traceback.print_exc()
+            code = 1
+        finally:
+            os.chdir(cwd)
+    return code
+
+
+def serve(client, settings_path, path=SOCKET_PATH):
+    """
+    Run commands sent by one-shot calls on client until stopped, one command at a time.
+    Settings changed by a session that did not go through the daemon are reloaded before the next command.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        cprint("Error: the daemon needs unix socket support.", color="red")
+        return
+    try:
+        if path == _default_socket_path() and not os.environ.get("XDG_RUNTIME_DIR"):
+            _make_private_dir(os.path.dirname(path))
+        if os.path.exists(path):
+            _check_owner(path)
+            try:
+                _connect(path).close()
+                cprint(f"Error: a daemon is already listening on {path}.", color="red")
+                return
+            except OSError:
+                # left behind by a daemon that did not shut down cleanly
+                os.unlink(path)
+    except PermissionError as e:
+        cprint(f"Error: {e}.", color="red")
+        return
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen()
+    settings_mtime = _settings_mtime(settings_path)
+    cprint(
+        f"AudioCLI daemon listening on {path}, stop with 'audiocli serve stop' or Ctrl+C.",
+        color="green",
+    )
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = json.loads(
+                        conn.makefile("r", encoding="utf-8").readline()
+                    )
+                except ValueError:
+                    continue
+                connection = _Connection(conn)
+                if request.get("stop"):
+                    connection.send({"exit": 0})
+                    break
+                cprint(f"> {' '.join(request['argv'])}", color="cyan")
+                if _settings_mtime(settings_path) != settings_mtime:
+                    with contextlib.redirect_stdout(
+                        _Stream(connection, "out", request.get("tty", False))
+                    ):
+                        client.load_from_settings()
+                code = _run(client, request, connection)
+                settings_mtime = _settings_mtime(settings_path)
+                connection.send({"exit": code})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        cprint("AudioCLI daemon stopped.", color="yellow")
@@ -0,0 +1,186 @@
+from AudioCLI.src.tensors import tensor_path
+import concurrent.futures
+import importlib.metadata
+import hashlib
+import json
+import shutil
+import sqlite3
+import threading
+import os
+
+"""
+Cache of derived outputs, so reruns only process new or changed files.
+Every output is recorded with a key made from its input (size and mtime, or a content hash), the stages that produced it and the library versions.
+Outputs whose key is unchanged are skipped, and in hash mode an output of identical input elsewhere is hard-linked (or copied) instead of recomputed.
+"""
+
+
+def _versions():
+    versions = {}
+    for package in ["AudioCLI", "torch", "torchaudio", "pedalboard", "aeiou"]:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def _hash_file(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_path(save_path, options):
+    """Path a task actually writes to, tensor files (-pt) replace the audio extension and packed items (-pack) have none."""
+    if options.get("pack"):
+        return None
+    if options.get("pt_save"):
+        return tensor_path(save_path, options.get("pt_format", "pt"))
+    return save_path
+
+
+# bumped whenever the key gains a field or an output changes format, older records then miss once and are rewritten
+KEY_VERSION = 4
+
+
+class DerivedCache:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.versions = _versions()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, key TEXT, size INTEGER, mtime INTEGER)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS outputs_key ON outputs (key)")
+
+    def task_key(self, filepath, save_path, stages, options, mode):
+        """
+        Key of a task, mode 'stat' identifies the input by path, size and mtime, 'hash' by its content.
+        Tensor outputs (-pt) are also keyed by their format and sample type.
+        """
+        if mode == "hash":
+            source = _hash_file(filepath)
+        else:
+            stat = os.stat(filepath)
+            source = [os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns]
+        return hashlib.sha1(
+            json.dumps(
+                [
+                    KEY_VERSION,
+                    source,
+                    stages,
+                    os.path.splitext(output_path(save_path, options))[1],
+                    (
+                        [options.get("pt_format", "pt"), options.get("pt_dtype")]
+                        if options.get("pt_save")
+                        else None
+                    ),
+                    self.versions,
+                ]
+            ).encode()
+        ).hexdigest()
+
+    def _current(self, path, key=None):
+        """Check that a recorded output is still on disk as it was written, optionally with a given key."""
+        row = self.conn.execute(
+            "SELECT key, size, mtime FROM outputs WHERE path = ?", (path,)
+        ).fetchone()
+        if not row or (key is not None and row[0] != key):
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (row[1], row[2])
+
+    def plan(self, tasks, mode, max_workers=16):
+        """
+        Split per-file tasks (filepath, save_path, stages, options) into the ones that still need to run.
+        Outputs that are current are skipped, outputs that exist for the same key elsewhere are linked.
+
+        Returns the remaining tasks, a dict of output path: key to record after running, and the number of skipped and linked files.
+        """
+        # overwriting tasks replace their own input, their key can never match again
+        cacheable = [task for task in tasks if task[0] != task[1]]
+        remaining = [task for task in tasks if task[0] == task[1]]
+
+        def key_task(task):
+            filepath, save_path, stages, options = task
+            try:
+                return self.task_key(filepath, save_path, stages, options, mode)
+            except OSError:
+                return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            keys = list(executor.map(key_task, cacheable))
+
+        pending = {}
+        skipped = 0
+        linked = 0
+        with self.lock, self.conn:
+            for task, key in zip(cacheable, keys):
+                if key is None:
+                    remaining.append(task)
+                    continue
+                path = output_path(task[1], task[3])
+                if self._current(path, key):
+                    skipped += 1
+                    continue
+                if self._link(key, path):
+                    linked += 1
+                    continue
+                self._unshare(path)
+                remaining.append(task)
+                pending[path] = key
+        return remaining, pending, skipped, linked
+
+    def _unshare(self, path):
+        # outputs are written in place, a hard-linked output would change its twin as well
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _link(self, key, path):
+        rows = self.conn.execute(
+            "SELECT path FROM outputs WHERE key = ? AND path != ?", (key, path)
+        ).fetchall()
+        for (source,) in rows:
+            if not self._current(source):
+                continue
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                if os.path.exists(path):
+                    os.remove(path)
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copy2(source, path)
+            except OSError:
+                continue
+            self._record(path, key)
+            return True
+        return False
+
+    def record(self, pending, since):
+        """Record outputs written after since (a time.time() timestamp) under their keys."""
+        with self.lock, self.conn:
+            for path, key in pending.items():
+                try:
+                    if os.stat(path).st_mtime >= since:
+                        self._record(path, key)
+                except OSError:
+                    continue
+
+    def _record(self, path, key):
+        stat = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+            (path, key, stat.st_size, stat.st_mtime_ns),
+        )
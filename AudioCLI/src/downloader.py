@@ -0,0 +1,424 @@
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from AudioCLI.src.derived_cache import output_path
+import requests
+import concurrent.futures
+import urllib.parse
+import contextlib
+import functools
+import random
+import json
+import io
+import time
+import os
+
+"""
+Concurrent downloader for open HTTP directory listings.
+Directory listings and files are fetched by one pool of worker threads sharing a session, so the worker count bounds the number of requests in flight and connections are kept alive and reused.
+Bodies are streamed to disk in chunks through a .part file that is moved in place when complete. Failed requests are retried with exponential backoff and a partial file is resumed with a Range request.
+Bodies can also be processed straight from memory, so only the processed output is ever written.
+Downloads are recorded with their ETag, Last-Modified and length in a mirror manifest in the output directory, so a sync only fetches files that changed upstream.
+"""
+
+AUDIO_EXTS = (".wav", ".mp3", ".ogg", ".m4a")
+RETRY_STATUS = [408, 429, 500, 502, 503, 504]
+CHUNK_SIZE = 1 << 16
+TIMEOUT = (10, 60)  # connect, read
+MIRROR_FILE = ".audiocli_mirror.json"
+
+
+class RetryableError(Exception):
+    """A request failed in a way that may succeed when tried again."""
+
+
+_RETRYABLE = (
+    RetryableError,
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def make_session(workers):
+    """Session whose connection pool keeps a keep-alive connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def with_retries(fn, retries=3, backoff=0.5):
+    """Call fn(), retrying retryable failures up to retries times with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except _RETRYABLE:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2**attempt * (0.5 + random.random()))
+
+
+def _check_status(response, url):
+    if response.status_code in RETRY_STATUS:
+        raise RetryableError(f"{url}: HTTP {response.status_code}")
+    response.raise_for_status()
+
+
+def parse_listing(url, html):
+    """
+    Split the links of a directory listing page into audio file urls and subdirectory urls below url.
+    Parent directories, sort links and links to other hosts are left out.
+    """
+    files, dirs = [], []
+    for link in BeautifulSoup(html, "html.parser").find_all("a"):
+        href = link.get("href")
+        if not href:
+            continue
+        target = urllib.parse.urldefrag(urllib.parse.urljoin(url, href))[0]
+        if not target.startswith(url) or target == url or "?" in target:
+            continue
+        path = urllib.parse.urlparse(target).path
+        if path.endswith("/"):
+            dirs.append(target)
+        elif path.lower().endswith(AUDIO_EXTS):
+            files.append(target)
+    return list(dict.fromkeys(files)), list(dict.fromkeys(dirs))
+
+
+def _list_once(session, url):
+    response = session.get(url, timeout=TIMEOUT)
+    _check_status(response, url)
+    return parse_listing(url, response.content)
+
+
+def list_directory(session, url, retries=3, backoff=0.5):
+    """Fetch and parse a directory listing, returns its audio file urls and subdirectory urls."""
+    return with_retries(functools.partial(_list_once, session, url), retries, backoff)
+
+
+def local_path(root, url, output_dir):
+    """Path below output_dir mirroring the position of url below the root listing."""
+    relative = urllib.parse.unquote(
+        urllib.parse.urlparse(url).path[len(urllib.parse.urlparse(root).path) :]
+    )
+    # decoded names can contain anything, never leave output_dir
+    parts = [part for part in relative.split("/") if part not in ["", ".", ".."]]
+    return os.path.join(output_dir, *parts)
+
+
+def load_mirror(output_dir):
+    """Mirror manifest of an output directory: url -> local path, ETag, Last-Modified and length of the downloaded version."""
+    try:
+        with open(os.path.join(output_dir, MIRROR_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_mirror(output_dir, mirror):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MIRROR_FILE)
+    with open(path + ".part", "w") as f:
+        json.dump(mirror, f, indent=4)
+    os.replace(path + ".part", path)
+
+
+def _validators(response):
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _unchanged(validators, known, length):
+    """Whether a response describes the same version of a file as its mirror entry."""
+    if validators["etag"] and known.get("etag"):
+        return validators["etag"] == known["etag"]
+    if validators["last_modified"] and known.get("last_modified"):
+        return (
+            validators["last_modified"] == known["last_modified"]
+            and length == known["length"]
+        )
+    return False
+
+
+class _FilePart:
+    """Partial download on disk, next to the file it becomes."""
+
+    def __init__(self, path):
+        self.path = path + ".part"
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def open(self, append):
+        return open(self.path, "ab" if append else "wb")
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _MemoryPart:
+    """Partial download in memory, for bodies that are processed before anything is written."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def size(self):
+        return self.buffer.getbuffer().nbytes
+
+    def open(self, append):
+        if not append:
+            self.discard()
+        self.buffer.seek(0, io.SEEK_END)
+        return contextlib.nullcontext(self.buffer)
+
+    def discard(self):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+
+def _intact(path, known):
+    """Whether the output recorded in a mirror entry is still on disk as it was written."""
+    return (
+        known is not None
+        and known.get("path") == path
+        and os.path.exists(path)
+        and os.path.getsize(path) == known.get("size")
+    )
+
+
+def _fetch_once(session, url, part, known):
+    offset = part.size()
+    # identity encoding keeps Content-Length and byte ranges in terms of the file itself
+    headers = {"Accept-Encoding": "identity"}
+    conditional = known is not None and not offset
+    if conditional:
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304 and conditional:
+            return None
+        if response.status_code == 416 and offset:
+            # the partial file may already hold the whole body
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit() and int(total) == offset:
+                return {**_validators(response), "length": offset}
+            part.discard()
+            raise RetryableError(f"{url}: partial download does not match, restarting")
+        _check_status(response, url)
+        validators = _validators(response)
+        expected = response.headers.get("Content-Length")
+        if (
+            conditional
+            and expected is not None
+            and _unchanged(validators, known, int(expected))
+        ):
+            # the server ignores conditional requests but reports the mirrored version, skip the body
+            return None
+        if response.status_code != 206:
+            # the server ignored the range, start over
+            offset = 0
+        written = 0
+        with part.open(append=bool(offset)) as f:
+            for block in response.iter_content(CHUNK_SIZE):
+                f.write(block)
+                written += len(block)
+    if expected is not None and written != int(expected):
+        raise RetryableError(f"{url}: received {written} of {expected} bytes")
+    return {**validators, "length": offset + written}
+
+
+def fetch_file(session, url, path, retries=3, backoff=0.5, known=None):
+    """
+    Stream url to path through path.part, resuming from the partial file on every retry.
+    With known, the mirror entry of an earlier download, the file is only fetched if it changed upstream.
+
+    Returns the mirror entry of the downloaded file (path, size, ETag, Last-Modified and length upstream), or None if it was unchanged.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part = _FilePart(path)
+    result = with_retries(
+        functools.partial(
+            _fetch_once, session, url, part, known if _intact(path, known) else None
+        ),
+        retries,
+        backoff,
+    )
+    if result is None:
+        return None
+    os.replace(part.path, path)
+    return {"path": path, "size": result["length"], **result}
+
+
+def fetch_processed(
+    session, url, save_path, stages, options, retries=3, backoff=0.5, known=None
+):
+    """
+    Fetch url into memory and run stages (see AudioCLI.src.ops) on the body, only the processed result is written to save_path.
+    Retries resume the body in memory, known works like in fetch_file.
+
+    Returns the mirror entry of the written output, or None if the file was unchanged upstream.
+    """
+    from AudioCLI.src.ops import process_buffer
+
+    out_path = output_path(save_path, options)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    part = _MemoryPart()
+    result = with_retries(
+        functools.partial(
+            _fetch_once, session, url, part, known if _intact(out_path, known) else None
+        ),
+        retries,
+        backoff,
+    )
+    if result is None:
+        return None
+    part.buffer.seek(0)
+    ext = os.path.splitext(urllib.parse.urlparse(url).path)[1]
+    process_buffer(part.buffer, ext, save_path, stages, options)
+    return {"path": out_path, "size": os.path.getsize(out_path), **result}
+
+
+class DownloadReport:
+    def __init__(self):
+        self.downloaded = []  # (url, path, size)
+        self.unchanged = []  # (url, path)
+        self.failed = []  # (url, error)
+        self.deleted = []  # paths
+        self.listing_failed = False
+
+
+def _prune(mirror, root, found, output_dir, recursive):
+    """Delete mirrored files below root that were not found upstream, returns their paths."""
+    output_dir = os.path.abspath(output_dir)
+    deleted = []
+    for url, entry in list(mirror.items()):
+        if not url.startswith(root) or url in found:
+            continue
+        if not recursive and "/" in url[len(root) :]:
+            continue
+        path = os.path.abspath(entry["path"])
+        # only ever delete what the mirror downloaded itself
+        if path.startswith(output_dir + os.sep) and os.path.exists(path):
+            os.remove(path)
+            deleted.append(path)
+        del mirror[url]
+    return deleted
+
+
+def download_directory(
+    url,
+    output_dir,
+    workers=4,
+    recursive=True,
+    retries=3,
+    backoff=0.5,
+    progress=None,
+    sync=False,
+    delete=False,
+    stages=None,
+    id_str="",
+    options=None,
+):
+    """
+    Download every audio file of an open directory listing (and its subdirectories when recursive) to output_dir, mirroring the directory tree.
+    Listings are crawled concurrently with the downloads, at most workers requests are in flight at once.
+    Every download is recorded in the mirror manifest of output_dir. With sync, files whose mirrored version is unchanged upstream (by ETag or Last-Modified) are skipped.
+    With delete, mirrored files that are no longer listed upstream are removed, unless a listing could not be read.
+    With stages, every body is decoded from memory and processed before anything is written, the output is named with id_str appended like process commands do (see fetch_processed).
+    progress, ie: a tqdm bar, has its total raised as files are found and is updated as they finish.
+
+    Returns a DownloadReport.
+    """
+    root = url if url.endswith("/") else url + "/"
+    session = make_session(workers)
+    mirror = load_mirror(output_dir)
+    report = DownloadReport()
+    seen = {root}
+    found = set()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # future: (url, local path), listings have no local path
+            future = executor.submit(list_directory, session, root, retries, backoff)
+            pending = {future: (root, None)}
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    target, path = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        report.failed.append((target, e))
+                        if path is None:
+                            report.listing_failed = True
+                        elif progress is not None:
+                            progress.update(1)
+                        continue
+                    if path is not None:
+                        if result is None:
+                            report.unchanged.append((target, mirror[target]["path"]))
+                        else:
+                            report.downloaded.append(
+                                (target, result["path"], result["length"])
+                            )
+                            mirror[target] = result
+                        if progress is not None:
+                            progress.update(1)
+                        continue
+                    files, dirs = result
+                    for file_url in files:
+                        found.add(file_url)
+                        file_path = local_path(root, file_url, output_dir)
+                        known = mirror.get(file_url) if sync else None
+                        if stages:
+                            base, ext = os.path.splitext(file_path)
+                            future = executor.submit(
+                                fetch_processed,
+                                session,
+                                file_url,
+                                base + id_str + ext,
+                                stages,
+                                options or {},
+                                retries,
+                                backoff,
+                                known,
+                            )
+                        else:
+                            future = executor.submit(
+                                fetch_file,
+                                session,
+                                file_url,
+                                file_path,
+                                retries,
+                                backoff,
+                                known,
+                            )
+                        pending[future] = (file_url, file_path)
+                    if progress is not None and files:
+                        progress.total += len(files)
+                        progress.refresh()
+                    if recursive:
+                        for dir_url in dirs:
+                            if dir_url not in seen:
+                                seen.add(dir_url)
+                                future = executor.submit(
+                                    list_directory, session, dir_url, retries, backoff
+                                )
+                                pending[future] = (dir_url, None)
+        if delete and not report.listing_failed:
+            report.deleted = _prune(mirror, root, found, output_dir, recursive)
+    finally:
+        session.close()
+        # keep what was downloaded so far, even when interrupted
+        if mirror or os.path.exists(os.path.join(output_dir, MIRROR_FILE)):
+            save_mirror(output_dir, mirror)
+    return report
@@ -0,0 +1,74 @@
+from aeiou.datasets import PhaseFlipper, Mono, Stereo
+from collections import OrderedDict
+import torch
+import torchaudio.transforms as T
+import threading
+
+"""
+Shared registry of prebuilt transforms.
+Building a resample or pitch shift transform computes its sinc kernel, which only depends on the rates/steps and the device.
+Transforms are kept in a thread-safe LRU keyed by those parameters, so files with the same settings share one transform.
+"""
+
+MAX_TRANSFORMS = 64
+MAX_BYTES = (
+    1 << 30
+)  # some rate pairs (ie: pitch shifting 48k) need kernels of several hundred MB
+
+_transforms = OrderedDict()
+_lock = threading.Lock()
+
+
+def _nbytes(aug_tf):
+    if not isinstance(aug_tf, torch.nn.Module):
+        return 0
+    tensors = list(aug_tf.parameters()) + list(aug_tf.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _build_resample(orig_freq, new_freq, device):
+    return T.Resample(int(orig_freq), int(new_freq)).to(device)
+
+
+def _build_pitch(sample_rate, n_steps, device):
+    aug_tf = T.PitchShift(int(sample_rate), int(n_steps)).to(device)
+    # PitchShift builds its kernel lazily on the first call, do it now so the shared transform is never initialised by two threads at once
+    with torch.no_grad():
+        aug_tf(torch.zeros(1, aug_tf.n_fft * 2, device=device))
+    return aug_tf.requires_grad_(False)
+
+
+BUILDERS = {
+    "resample": _build_resample,
+    "pitch": _build_pitch,
+    "phaseflip": lambda device: PhaseFlipper(p=1.0),
+    "mono": lambda device: Mono(),
+    "stereo": lambda device: Stereo(),
+}
+
+
+def get_transform(name, *params, device="cpu"):
+    """
+    Return the shared transform for name and params on device, building it on first use.
+
+    ie: get_transform("resample", 48000, 44100, device="cuda")
+    """
+    key = (name, params, str(device))
+    with _lock:
+        if key in _transforms:
+            _transforms.move_to_end(key)
+            return _transforms[key]
+        aug_tf = BUILDERS[name](*params, device=torch.device(device))
+        _transforms[key] = aug_tf
+        while len(_transforms) > 1 and (
+            len(_transforms) > MAX_TRANSFORMS
+            or sum(_nbytes(tf) for tf in _transforms.values()) > MAX_BYTES
+        ):
+            _transforms.popitem(last=False)
+        return aug_tf
+
+
+def clear():
+    """Drop all cached transforms."""
+    with _lock:
+        _transforms.clear()
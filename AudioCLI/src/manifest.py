@@ -0,0 +1,260 @@
+from AudioCLI.src.util import extract_arg_help
+import importlib.util
+import importlib
+import inspect
+import pkgutil
+import json
+import os
+
+"""
+Precomputed command manifest.
+Discovering categories means importing every module under modules/ and reflecting on every command (argspec and docstring help).
+The result is saved as JSON together with the mtime and size of every module file, later launches build the argparse tree from it without importing anything.
+Adding, removing or editing a module file invalidates the manifest and it is rebuilt on the next launch.
+"""
+
+# bump when the manifest layout or the way parsers are built from it changes
+VERSION = 3
+
+_TYPES = {bool: "bool", list: "list"}
+
+
+def module_stamps(package_name):
+    """(mtime, size) of every python file under a package, keyed by path, without importing the package."""
+    spec = importlib.util.find_spec(package_name)
+    stamps = {}
+    stack = list(spec.submodule_search_locations)
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir() and entry.name != "__pycache__":
+                stack.append(entry.path)
+            elif entry.name.endswith(".py"):
+                stat = entry.stat()
+                stamps[entry.path] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
+
+
+def load_manifest(path, stamps):
+    """Return the saved manifest if it was built from the same module files, None otherwise."""
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != VERSION or manifest.get("stamps") != stamps:
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    # a read-only install, or a default json can't hold, just rebuilds the manifest every launch
+    try:
+        data = json.dumps(manifest, indent=4)
+        with open(path, "w") as f:
+            f.write(data)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def discover_categories(package_name, base_class, client):
+    """
+    Import every module under a package and instantiate its command categories without building parsers.
+
+    Returns a dict of class name: (module name, instance).
+    """
+    categories = {}
+
+    def load_package(package):
+        for _, module_name, is_pkg in pkgutil.iter_modules(package.__path__):
+            module = importlib.import_module(f"{package.__name__}.{module_name}")
+            if is_pkg:
+                load_package(module)
+                continue
+            for obj_name in dir(module):
+                obj = getattr(module, obj_name)
+                if (
+                    isinstance(obj, type)
+                    and issubclass(obj, base_class)
+                    and obj != base_class
+                    and obj.__name__ not in categories
+                ):
+                    categories[obj.__name__] = (
+                        obj.__module__,
+                        obj(main_parser=None, client=client),
+                    )
+
+    load_package(importlib.import_module(package_name))
+    return categories
+
+
+def describe_command(command_name, function):
+    """Reflect a command function into its manifest entry: help text and arguments with type, default and help."""
+    spec = inspect.getfullargspec(function)
+    defaults = (
+        dict(zip(spec.args[-len(spec.defaults) :], spec.defaults))
+        if spec.defaults
+        else {}
+    )
+    args = []
+    for arg in spec.args:
+        if arg == "self":
+            continue
+        annotation = spec.annotations.get(arg, None)
+        args.append(
+            {
+                "name": arg,
+                "type": _TYPES.get(annotation, getattr(annotation, "__name__", None)),
+                "default": defaults.get(arg, None),
+                # a None default is still optional, ie: a list normalised in the command
+                "required": arg not in defaults,
+                "help": extract_arg_help(arg, function.__doc__),
+            }
+        )
+    return {"name": command_name, "help": function.__doc__, "args": args}
+
+
+def describe_category(class_name, module_name, category):
+    """Manifest entry of a category instance."""
+    return {
+        "class": class_name,
+        "module": module_name,
+        "name": category.name,
+        "description": category.description,
+        "can_process": category._can_process(),
+        "can_shard": category._can_shard(),
+        "stages": list(category._get_stages()),
+        "commands": [
+            describe_command(command_name, function)
+            for command_name, function in category._get_commands().items()
+        ],
+    }
+
+
+def build_manifest(stamps, discovered):
+    """Manifest of categories returned by discover_categories, valid for the module files in stamps."""
+    return {
+        "version": VERSION,
+        "stamps": stamps,
+        "categories": [
+            describe_category(class_name, module_name, instance)
+            for class_name, (module_name, instance) in discovered.items()
+        ],
+    }
+
+
+def add_category_parser(main_parser, entry):
+    """Add the parser of a category and its commands from a manifest entry."""
+    cat_parser = main_parser.add_parser(entry["name"], help=entry["description"])
+    subparsers = cat_parser.add_subparsers(
+        dest="_command",
+        metavar="command",
+        help="(<category> <command> -h for more info.)",
+    )
+    for command in entry["commands"]:
+        add_command_parser(
+            subparsers, command, entry["can_process"], entry["can_shard"]
+        )
+    return cat_parser
+
+
+def add_command_parser(subparsers, command, can_process=False, can_shard=False):
+    command_parser = subparsers.add_parser(
+        command["name"],
+        help=(
+            command["help"] if command["help"] else "No help text available"
+        ),  # use function docstring as command help text
+    )
+
+    for arg in command["args"]:
+        default = arg["default"]
+        help_text = arg["help"]
+
+        if arg["type"] == "bool":
+            if default is None:  # Required argument
+                default = False
+                action = "store_true"
+            else:
+                default = bool(default)  # Ensure default is a boolean
+                action = "store_true" if not default else "store_false"
+
+            command_parser.add_argument(
+                f"--{arg['name'].replace('_', '-')}",
+                default=default,
+                help=help_text,
+                action=action,
+            )
+
+        else:
+            nargs = "+" if arg["type"] == "list" else None
+
+            if arg["required"]:  # If no default value, create a positional argument
+                command_parser.add_argument(
+                    arg["name"],
+                    nargs=nargs,
+                    help=help_text,
+                    action="store",
+                )
+            else:  # If a default value exists, create an optional argument
+                command_parser.add_argument(
+                    f"--{arg['name'].replace('_', '-')}",
+                    nargs=nargs,
+                    default=default,
+                    help=help_text,
+                    action="store",
+                )
+    # add args for -target
+    command_parser.add_argument(
+        "-target",
+        nargs="+",
+        default=[],
+        help="Target files or directories.",
+    )
+    command_parser.add_argument(
+        "-output",
+        default="",
+        help="Output directory.",
+    )
+    command_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help="Print per-stage timings of the command, with a path also save cProfile stats there and per-file records next to it as .csv.",
+    )
+
+    if can_process:
+        # add args for -o
+        command_parser.add_argument(
+            "-o",
+            action="store_true",
+            default=False,
+            help="Overwrite source file.",
+        )
+        # add args for -pt (saving as pytorch file)
+        command_parser.add_argument(
+            "-pt",
+            action="store_true",
+            default=False,
+            help="Save as tensor file, pytorch .pt unless set with 'target pt_format'.",
+        )
+        # add args for -pack (packing into memory-mappable shards)
+        command_parser.add_argument(
+            "-pack",
+            action="store_true",
+            default=False,
+            help="Pack outputs into memory-mappable shards in the output directory.",
+        )
+    if can_shard:
+        command_parser.add_argument(
+            "--shard",
+            default="",
+            metavar="I/N",
+            help="Only work on shard i of n of the target files ie: 0/4, the same files on every host that sees them at the same paths.",
+        )
+    return command_parser
@@ -0,0 +1,104 @@
+from AudioCLI.src.util import chunks, probe_file
+import concurrent.futures
+import operator
+import sqlite3
+import threading
+import os
+
+"""
+Header-only audio metadata index.
+Sample rate, channel count and frame count are read from file headers in parallel and cached by path, size and mtime, so only new or changed files are probed.
+"""
+
+FIELDS = ["sr", "channels", "frames", "duration", "size"]
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class MetadataIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, sr INTEGER, channels INTEGER, frames INTEGER)"
+            )
+
+    def lookup(self, paths, max_workers=16):
+        """
+        Return a dict of path: info for every readable file in paths, probing the headers of new or changed files.
+        info holds sr, channels, frames, duration (seconds) and size (bytes).
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stats = dict(zip(paths, executor.map(_stat, paths)))
+            cached = {}
+            with self.lock:
+                for batch in chunks(list(paths), 500):
+                    rows = self.conn.execute(
+                        f"SELECT * FROM meta WHERE path IN ({','.join('?' * len(batch))})",
+                        batch,
+                    )
+                    for path, size, mtime, sr, channels, frames in rows:
+                        if stats.get(path) == (size, mtime):
+                            cached[path] = (sr, channels, frames)
+            to_probe = [p for p in paths if stats[p] is not None and p not in cached]
+            probed = dict(zip(to_probe, executor.map(probe_file, to_probe)))
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, *stats[path], *info) for path, info in probed.items()],
+            )
+
+        infos = {}
+        for path, (sr, channels, frames) in {**cached, **probed}.items():
+            if not sr:
+                continue  # unreadable header
+            infos[path] = {
+                "sr": sr,
+                "channels": channels,
+                "frames": frames,
+                "duration": frames / sr,
+                "size": stats[path][0],
+            }
+        return infos
+
+
+def parse_filter(expression):
+    """
+    Parse a filter expression into a list of (field, operator, value) conditions.
+    Conditions are joined with 'and' ie: 'sr != 44100 and duration > 30'.
+    """
+    conditions = []
+    for part in expression.split(" and "):
+        tokens = part.split()
+        if len(tokens) != 3:
+            raise ValueError(f"Invalid condition '{part.strip()}'")
+        field, op, value = tokens
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{field}', use one of {FIELDS}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}', use one of {list(OPERATORS)}")
+        conditions.append((field, op, float(value)))
+    return conditions
+
+
+def matches(info, conditions):
+    """Check whether a file info dict satisfies every condition."""
+    return all(OPERATORS[op](info[field], value) for field, op, value in conditions)
@@ -0,0 +1,352 @@
+from AudioCLI.src.util import load_file, load_buffer, save_output
+from AudioCLI.src.stream import (
+    can_stream,
+    stream_file,
+    scan_level,
+    read_windows,
+    ArrayReader,
+)
+from AudioCLI.src.wav import can_pcm, pcm_file, parse_wav, PcmReader, write_window
+from AudioCLI.src.kernels import get_transform
+from AudioCLI.src.derived_cache import output_path
+from AudioCLI.src.profiling import stage
+from pedalboard.io import AudioFile
+import numpy as np
+import torch
+from torch.nn import functional as F
+import os
+import collections
+import functools
+import concurrent.futures
+import contextlib
+import io
+from aeiou.datasets import RandPool
+import random
+
+"""
+Per-file audio operations used by the process category.
+Every operation takes an audio tensor (channels x n_samples) and its sample rate and returns the processed audio and its new sample rate.
+Operations are referenced by name in stages, a stage being a tuple of (op_name, op_args).
+"""
+
+
+def resample(audio, sr, sample_rate):
+    aug_tf = get_transform("resample", int(sr), int(sample_rate), device=audio.device)
+    return aug_tf(audio), int(sample_rate)
+
+
+def phaseflip(audio, sr):
+    aug_tf = get_transform("phaseflip", device=audio.device)
+    return aug_tf(audio), sr
+
+
+def noise(audio, sr, noise_level):
+    auged = audio + float(noise_level) * random.random() * (
+        2 * torch.rand_like(audio) - 1
+    )
+    return auged, sr
+
+
+def pool(audio, sr):
+    aug_tf = RandPool(p=1.0)
+    return aug_tf(audio), sr
+
+
+def stretch(audio, length, grain=1024, decimate=4):
+    """
+    Time stretch audio (... x channels x n_samples) to length samples with WSOLA, without an STFT.
+    Hann grains are written every grain // 2 samples, each read from wherever within grain // 2 of its nominal position continues the previous grain best, so waveforms line up and pitch is kept.
+    The search runs on a copy decimated by decimate and is refined at full rate, channels share one alignment.
+    """
+    shape = audio.shape[:-1]
+    channels = audio.shape[-2] if audio.dim() > 1 else 1
+    audio = audio.reshape(-1, channels, audio.shape[-1])
+    items, _, in_len = audio.shape
+    device = audio.device
+    hop = grain // 2
+    tolerance = hop
+    step = in_len / length * hop
+    n_frames = -(-length // hop) + 2
+    # frame 0 is read one step before the start, the output starts one hop into the overlap-added frames
+    front = tolerance + int(step) + 1
+    padded = F.pad(audio, (front, grain + 2 * tolerance + int(step) + 2 * decimate))
+    guide = padded.mean(dim=1)
+    coarse = F.avg_pool1d(guide[:, None], decimate)[:, 0]
+    rows = torch.arange(items, device=device)[:, None]
+    span = torch.arange(grain, device=device)
+    coarse_span = torch.arange(grain // decimate, device=device)
+    coarse_size = (grain + 2 * tolerance) // decimate + 1
+    fine = torch.arange(grain + 2 * decimate, device=device)
+    starts = torch.empty(items, n_frames, dtype=torch.long, device=device)
+    starts[:, 0] = front - int(round(step))
+    for k in range(1, n_frames):
+        natural = (starts[:, k - 1] + hop)[:, None]
+        low = (front + int(round((k - 1) * step)) - tolerance) // decimate
+        corr = F.conv1d(
+            coarse[None, :, low : low + coarse_size],
+            coarse[rows, natural // decimate + coarse_span][:, None],
+            groups=items,
+        )[0]
+        best = ((low + corr.argmax(dim=-1, keepdim=True) - 1) * decimate).clamp(min=0)
+        corr = F.conv1d(
+            guide[rows, best + fine][None],
+            guide[rows, natural + span][:, None],
+            groups=items,
+        )[0]
+        starts[:, k] = (best + corr.argmax(dim=-1, keepdim=True))[:, 0]
+    frames = padded[
+        rows[:, :, None, None],
+        torch.arange(channels, device=device)[None, :, None, None],
+        starts[:, None, :, None] + span,
+    ] * torch.hann_window(grain, dtype=audio.dtype, device=device)
+    # periodic hann windows at half overlap sum to one, no normalisation needed
+    out = F.fold(
+        frames.reshape(items * channels, n_frames, grain).transpose(1, 2),
+        output_size=(1, (n_frames - 1) * hop + grain),
+        kernel_size=(1, grain),
+        stride=(1, hop),
+    )
+    return out[..., hop : hop + length].reshape(*shape, length)
+
+
+def fast_pitch(audio, sr, pitch):
+    """
+    Pitch shift in the time domain: resample to change pitch and duration, then stretch back to the original length.
+    The intermediate rate is rounded to 50 Hz to keep resample kernels small, an error of a few cents at most.
+    """
+    ratio = 2.0 ** (int(pitch) / 12)
+    new_sr = max(50, int(round(int(sr) / ratio / 50)) * 50)
+    aug_tf = get_transform("resample", int(sr), new_sr, device=audio.device)
+    return stretch(aug_tf(audio), audio.shape[-1])
+
+
+def pitch(audio, sr, pitch, mode="quality"):
+    if mode == "fast":
+        return fast_pitch(audio, sr, pitch), sr
+    aug_tf = get_transform("pitch", int(sr), int(pitch), device=audio.device)
+    return aug_tf(audio), sr
+
+
+def bitdepth(audio, sr, bit_depth):
+    # bit depth is applied when saving, see apply_stages
+    return audio, sr
+
+
+def stereo(audio, sr):
+    aug_tf = get_transform("stereo", device=audio.device)
+    return aug_tf(audio), sr
+
+
+def mono(audio, sr):
+    aug_tf = get_transform("mono", device=audio.device)
+    return aug_tf(audio), sr
+
+
+OPS = {
+    "resample": resample,
+    "phaseflip": phaseflip,
+    "noise": noise,
+    "pool": pool,
+    "pitch": pitch,
+    "bitdepth": bitdepth,
+    "stereo": stereo,
+    "mono": mono,
+}
+
+
+def quantize(audio, bit_depth):
+    """Round audio to the resolution of an integer bit depth, like saving and reloading it would."""
+    scale = 2 ** (int(bit_depth) - 1)
+    return torch.clamp(torch.round(audio * scale), -scale, scale - 1) / scale
+
+
+def apply_stages(audio, sr, stages):
+    """
+    Run a list of stages on an audio tensor in memory.
+
+    Returns the processed audio, its sample rate and the bit depth to save with (None for default).
+    """
+    bits = None
+    for idx, (name, args) in enumerate(stages):
+        audio, sr = OPS[name](audio, sr, **args)
+        if len(audio.shape) == 1:
+            audio = audio.unsqueeze(0)
+        bits = int(args["bit_depth"]) if name == "bitdepth" else None
+        if bits and bits < 32 and idx < len(stages) - 1:
+            # intermediate bit depth changes would have been written to disk
+            audio = quantize(audio, bits)
+    return audio, sr, bits
+
+
+def process_file(args):
+    """
+    Decode a file once, run all stages on it and encode the result once.
+    Integer PCM WAV files only converted to mono, stereo and then to 8, 16 or 24 bits skip decoding, see AudioCLI.src.wav.
+    Other files are streamed block by block when a block size is set and all stages support it.
+
+    Args:
+        args (tuple): (filepath, save_path, stages, options)
+    """
+    filepath, save_path, stages, options = args
+    out_path = output_path(save_path, options)
+    try:
+        if can_pcm(filepath, save_path, stages, options):
+            with stage("pcm", filepath, read=filepath, written=out_path):
+                pcm_file(filepath, save_path, stages)
+            return
+        if (
+            options.get("block_size")
+            and not options.get("pt_save")
+            and not options.get("pack")
+            and can_stream(stages)
+        ):
+            with stage("stream", filepath, read=filepath, written=out_path):
+                stream_file(filepath, save_path, stages, options["block_size"])
+            return
+        with stage("decode", filepath, read=filepath):
+            audio, sr = load_file(filepath)
+        with stage("transform", filepath):
+            auged, sr, bits = apply_stages(
+                audio.to(options.get("device", "cpu")), sr, stages
+            )
+            auged = auged.to("cpu")
+        with stage("encode", filepath, written=out_path):
+            save_output(save_path, auged, int(sr), bits=bits, options=options)
+    except Exception as e:
+        print(e)
+
+
+def process_buffer(buffer, ext, save_path, stages, options):
+    """
+    Decode a file held in memory, run all stages on it and encode the result once, ie: a downloaded body that is never written raw.
+    Errors are raised, unlike in process_file.
+
+    Returns the path written to.
+    """
+    out_path = output_path(save_path, options)
+    with stage("decode", save_path):
+        audio, sr = load_buffer(buffer, ext)
+    with stage("transform", save_path):
+        auged, sr, bits = apply_stages(
+            audio.to(options.get("device", "cpu")), sr, stages
+        )
+        auged = auged.to("cpu")
+    with stage("encode", save_path, written=out_path):
+        save_output(save_path, auged, int(sr), bits=bits, options=options)
+    return out_path
+
+
+def silence_level(audio, criterion="peak"):
+    """Absolute peak or RMS of an audio tensor."""
+    if criterion == "rms":
+        return float(audio.double().square().mean().sqrt())
+    return float(audio.abs().max())
+
+
+def remove_silent_file(args):
+    """
+    Remove a file if its level (absolute peak or RMS) stays below the threshold.
+    Files are scanned block by block and the scan stops at the first block that proves the file is not silent.
+
+    Args:
+        args (tuple): (filepath, threshold, criterion, dry_run)
+
+    Returns:
+        tuple: (filepath, level, silent), level is None if the file could not be read
+    """
+    filepath, threshold, criterion, dry_run = args
+    try:
+        with stage("scan", filepath):
+            try:
+                level, silent = scan_level(filepath, threshold, criterion)
+            except Exception:
+                # formats pedalboard can't read are decoded whole
+                audio, sr = load_file(filepath)
+                level = silence_level(audio, criterion) if audio.numel() else 0.0
+                silent = level < float(threshold)
+        if silent and not dry_run:
+            os.remove(filepath)
+        return filepath, level, silent
+    except Exception as e:
+        print(e)
+        return filepath, None, False
+
+
+def _save_chunk(path, window, sr, options):
+    # copy out of the shared buffer, a view would also pin (and torch.save) the whole buffer
+    chunk = torch.from_numpy(np.ascontiguousarray(window))
+    save_output(path, chunk, sr, options=options)
+
+
+def chunk_file(args):
+    """
+    Split a file into windows of length seconds every hop seconds, saved as save_path_{index}.
+    Windows are pulled from a seekable reader so memory stays around one window, and are written by a pool of writer threads.
+    Integer PCM WAV windows are sliced from the memory-mapped file and written as raw bytes.
+
+    Args:
+        args (tuple): (filepath, save_path, length, hop, pad, clean, options)
+    """
+    filepath, save_path, length, hop, pad, clean, options = args
+    pt_save = options.get("pt_save", False)
+    writers = options.get("writers", 4)
+    root, ext = os.path.splitext(save_path)
+    try:
+        if (
+            not pt_save
+            and not options.get("pack")
+            and ext.lower() == ".wav"
+            and parse_wav(filepath)
+        ):
+            reader = PcmReader(filepath)
+            write = functools.partial(write_window, info=reader.info)
+        else:
+            try:
+                reader = AudioFile(filepath)
+            except Exception:
+                # formats pedalboard can't read are decoded whole
+                audio, sr = load_file(filepath)
+                reader = ArrayReader(audio.numpy(), sr)
+            write = functools.partial(
+                _save_chunk, sr=int(reader.samplerate), options=options
+            )
+        with stage(
+            "chunk", filepath, read=filepath
+        ), concurrent.futures.ThreadPoolExecutor(max_workers=writers) as executor:
+            in_flight = collections.deque()
+            with reader:
+                windows = read_windows(reader, length, hop, pad)
+                for index, window in enumerate(windows, start=1):
+                    in_flight.append(
+                        executor.submit(write, f"{root}_{index}{ext}", window)
+                    )
+                    # bound the windows waiting to be written
+                    if len(in_flight) > writers * 2:
+                        in_flight.popleft().result()
+            for future in in_flight:
+                future.result()
+        if clean:
+            os.remove(filepath)
+    except Exception as e:
+        print(e)
+
+
+def run_captured(fn, task):
+    """
+    Run fn(task) in a worker process with its output captured.
+    Workers print to the terminal the pool was started from, the caller prints the output where its own goes (ie: to a daemon's client).
+
+    Returns (result, output).
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        result = fn(task)
+    return result, output.getvalue()
+
+
+def init_worker():
+    """
+    Initialise a worker process of the process executor.
+    Every process runs one file at a time, so torch is kept to a single thread to avoid oversubscribing the cores.
+    """
+    torch.set_num_threads(1)
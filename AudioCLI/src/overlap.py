@@ -0,0 +1,163 @@
+from AudioCLI.src.util import load_file, save_output
+from AudioCLI.src.ops import apply_stages
+from AudioCLI.src.derived_cache import output_path
+from AudioCLI.src.profiling import stage
+from AudioCLI.src.wav import can_pcm, pcm_file
+import queue
+import threading
+
+"""
+Overlapped decode -> compute -> encode pipeline.
+A pool of decoder threads feeds a compute stage through a bounded queue, and the compute stage feeds a pool of encoder threads the same way.
+Reading, transforming and writing different files run at the same time, so throughput approaches the slowest stage instead of the sum of all three.
+The bounded queues keep at most queue_size decoded (or processed) files in memory per stage, a memory budget also holds back decoding while the estimated size of the files in flight would exceed it.
+"""
+
+_DONE = object()
+
+
+class _Budget:
+    """Estimated bytes of the files between decoding and encoding, a file larger than the whole budget runs once nothing else is in flight."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while self.budget and self.used and self.used + size > self.budget:
+                self.condition.wait()
+            self.used += size
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class _StageQueue(queue.Queue):
+    """Queue that knows how many workers read from it."""
+
+    def __init__(self, maxsize, consumers):
+        super().__init__(maxsize)
+        self.consumers = consumers
+
+
+# items passed between stages start with the estimated size of their file, see _Budget
+
+
+def _decode(item):
+    size, task = item
+    filepath, save_path, stages, options = task
+    if can_pcm(filepath, save_path, stages, options):
+        # the PCM fast path is done in one go, like in AudioCLI.src.ops.process_file
+        with stage(
+            "pcm", filepath, read=filepath, written=output_path(save_path, options)
+        ):
+            pcm_file(filepath, save_path, stages)
+        return None
+    with stage("decode", filepath, read=filepath):
+        audio, sr = load_file(filepath)
+    return size, task, audio, sr
+
+
+def _compute(item):
+    size, task, audio, sr = item
+    filepath, save_path, stages, options = task
+    device = options.get("device", "cpu")
+    with stage("transform", filepath):
+        auged, sr, bits = apply_stages(audio.to(device), sr, stages)
+        auged = auged.to("cpu")
+    return size, task, auged, sr, bits
+
+
+def _encode(item):
+    size, task, auged, sr, bits = item
+    filepath, save_path, stages, options = task
+    with stage("encode", filepath, written=output_path(save_path, options)):
+        save_output(save_path, auged, int(sr), bits=bits, options=options)
+
+
+def _worker(fn, inbox, outbox, done, budget):
+    """Apply fn to every item of inbox until _DONE, failed items and items finished early (fn returns None) are reported to done (and leave the budget) right away."""
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            return
+        if fn is _decode:
+            budget.acquire(item[0])
+        try:
+            result = fn(item)
+        except Exception as e:
+            print(e)
+            budget.release(item[0])
+            done.put(1)
+            continue
+        if outbox is None or result is None:
+            budget.release(item[0])
+            done.put(1)
+        else:
+            outbox.put(result)
+
+
+def _start_stage(fn, size, inbox, outbox, done, budget):
+    """Start size workers, once they all stopped _DONE is passed on to every worker of the next stage."""
+    workers = [
+        threading.Thread(
+            target=_worker, args=(fn, inbox, outbox, done, budget), daemon=True
+        )
+        for _ in range(size)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def close():
+        for worker in workers:
+            worker.join()
+        if outbox is not None:
+            # the next stage has its own worker count, every one of them needs a _DONE
+            for _ in range(outbox.consumers):
+                outbox.put(_DONE)
+
+    closer = threading.Thread(target=close, daemon=True)
+    closer.start()
+    return closer
+
+
+def run_overlapped(
+    tasks,
+    decoders=4,
+    computers=1,
+    encoders=4,
+    queue_size=8,
+    sizes=None,
+    budget=None,
+):
+    """
+    Run per-file tasks (filepath, save_path, stages, options) through the three stage pipeline.
+    Stages run on options['device'], files are moved there after decoding and back before encoding.
+    With the estimated peak memory of every task (sizes, see AudioCLI.src.scheduler.estimate_tasks) and a budget, files are decoded largest first and only while the files in flight fit the budget.
+
+    Yields 1 for every file as it finishes (or fails), use it to drive a progress bar.
+    """
+    sizes = sizes or [0] * len(tasks)
+    todo = _StageQueue(0, decoders)
+    decoded = _StageQueue(queue_size, computers)
+    computed = _StageQueue(queue_size, encoders)
+    done = queue.Queue()
+    for index in sorted(range(len(tasks)), key=lambda index: -sizes[index]):
+        todo.put((sizes[index], tasks[index]))
+    for _ in range(decoders):
+        todo.put(_DONE)
+
+    budget = _Budget(budget)
+    closers = [
+        _start_stage(_decode, decoders, todo, decoded, done, budget),
+        _start_stage(_compute, computers, decoded, computed, done, budget),
+        _start_stage(_encode, encoders, computed, None, done, budget),
+    ]
+    for _ in range(len(tasks)):
+        yield done.get()
+    for closer in closers:
+        closer.join()
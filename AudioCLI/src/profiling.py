@@ -0,0 +1,194 @@
+from termcolor import cprint
+import contextlib
+import threading
+import cProfile
+import pstats
+import time
+import csv
+import os
+
+"""
+Per-stage profiling of commands run with --profile.
+Code wraps the work it does per file in stage(name, ...), which records wall time, CPU time of the calling thread and bytes read/written while a profiler is enabled and does nothing otherwise.
+Tasks running in worker processes collect their records locally and send them back with their result, see run_profiled.
+"""
+
+_profiler = None
+
+
+class _Stats:
+    """Holder that lets pstats load a cProfile stats dict sent back from a worker."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    def __init__(self, cprofile=False):
+        self.cprofile = cprofile
+        self.records = []
+        self.stats = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def merge(self, profiled):
+        """Take the records and cProfile stats of a run_profiled result, returns the task result."""
+        result, records, stats = profiled
+        with self.lock:
+            self.records.extend(records)
+            if stats:
+                self.stats.append(stats)
+        return result
+
+    def summary(self):
+        """
+        Aggregate records per stage.
+
+        Returns a list of (stage, count, total wall, p50, p90, p99, max wall, total cpu, bytes read, bytes written), slowest stage first.
+        """
+        stages = {}
+        for name, path, wall, cpu, read, written in self.records:
+            stages.setdefault(name, []).append((wall, cpu, read, written))
+        rows = []
+        for name, values in stages.items():
+            walls = sorted(wall for wall, _, _, _ in values)
+
+            def percentile(p):
+                return walls[min(len(walls) - 1, int(p / 100 * len(walls)))]
+
+            rows.append(
+                (
+                    name,
+                    len(values),
+                    sum(walls),
+                    percentile(50),
+                    percentile(90),
+                    percentile(99),
+                    walls[-1],
+                    sum(cpu for _, cpu, _, _ in values),
+                    sum(read for _, _, read, _ in values),
+                    sum(written for _, _, _, written in values),
+                )
+            )
+        return sorted(rows, key=lambda row: -row[2])
+
+    def report(self):
+        rows = self.summary()
+        if not rows:
+            cprint("Profile: no stages recorded.", color="yellow")
+            return
+        cprint(
+            f"{'stage':<12}{'count':>7}{'total s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'cpu s':>10}{'read MB':>10}{'write MB':>10}",
+            color="yellow",
+        )
+        for name, count, total, p50, p90, p99, top, cpu, read, written in rows:
+            cprint(
+                f"{name:<12}{count:>7}{total:>10.2f}{p50 * 1000:>10.1f}{p90 * 1000:>10.1f}{p99 * 1000:>10.1f}{top * 1000:>10.1f}{cpu:>10.2f}{read / (1 << 20):>10.1f}{written / (1 << 20):>10.1f}",
+                color="green",
+            )
+
+    def dump(self, path):
+        """Write the cProfile stats to path and the per-file records next to it as .csv."""
+        if self.stats:
+            stats = pstats.Stats(_Stats(self.stats[0]))
+            for extra in self.stats[1:]:
+                stats.add(_Stats(extra))
+            stats.dump_stats(path)
+            cprint(f"Saved cProfile stats to {path}", color="green")
+        csv_path = os.path.splitext(path)[0] + ".csv"
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["stage", "path", "wall", "cpu", "bytes_read", "bytes_written"]
+            )
+            writer.writerows(self.records)
+        cprint(f"Saved per-file stage records to {csv_path}", color="green")
+
+
+def enable(cprofile=False):
+    global _profiler
+    _profiler = Profiler(cprofile)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    return profiler
+
+
+def active():
+    return _profiler
+
+
+def _size(path):
+    if path is None:
+        return 0
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+@contextlib.contextmanager
+def stage(name, path=None, read=None, written=None):
+    """
+    Record the time spent in the block as stage name for path.
+    read and written are files whose size is counted as bytes read/written, written is measured after the block.
+    """
+    if _profiler is None:
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        _profiler.add(
+            (
+                name,
+                path,
+                time.perf_counter() - wall,
+                time.thread_time() - cpu,
+                _size(read),
+                _size(written),
+            )
+        )
+
+
+def run_profiled(fn, cprofile, task):
+    """
+    Run fn(task) as a profiled task, optionally under cProfile.
+    In a worker process with no profiler of its own the stage records are collected locally.
+
+    Returns (result, stage records, cProfile stats dict or None) for Profiler.merge.
+    """
+    global _profiler
+    local = _profiler is None
+    if local:
+        _profiler = Profiler()
+    profile = cProfile.Profile() if cprofile else None
+    if profile:
+        try:
+            profile.enable()
+        except ValueError:
+            # python 3.12+ allows one active profiler per process, which then sees every thread already
+            profile = None
+    try:
+        result = fn(task)
+    finally:
+        if profile:
+            profile.disable()
+            profile.create_stats()
+        records = []
+        if local:
+            records = _profiler.records
+            _profiler = None
+    return result, records, profile.stats if profile else None
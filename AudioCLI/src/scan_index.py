@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import os
+
+"""
+Persistent on-disk index of scanned target directories.
+Stores the mtime of every directory and the size/mtime of every audio file found in it.
+Rescans stat every directory but only list the ones whose mtime changed, the file list of unchanged directories comes from the index.
+"""
+
+
+class ScanIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime INTEGER)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime INTEGER)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+
+    def scan(self, root, exts, recursive=True):
+        """
+        Bring the index up to date for a root directory and return its audio files.
+        """
+        root = os.path.abspath(root)
+        with self.lock, self.conn:
+            stack = [root]
+            while stack:
+                path = stack.pop()
+                subdirs = self._update_dir(path, exts)
+                if recursive:
+                    stack.extend(subdirs)
+            return self._files(root, recursive)
+
+    def files(self, root, recursive=True):
+        """
+        Return the indexed audio files of a root directory without touching the filesystem.
+        Returns None if the root has never been scanned.
+        """
+        root = os.path.abspath(root)
+        with self.lock:
+            known = self.conn.execute(
+                "SELECT 1 FROM dirs WHERE path = ? AND mtime >= 0", (root,)
+            ).fetchone()
+            if not known:
+                return None
+            return self._files(root, recursive)
+
+    def _files(self, root, recursive):
+        if recursive:
+            # every path under root sorts between root/ and root0 ('0' follows '/')
+            rows = self.conn.execute(
+                "SELECT path FROM files WHERE (path > ? AND path < ?) ORDER BY path",
+                (root + os.sep, root + chr(ord(os.sep) + 1)),
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT path FROM files WHERE dir = ? ORDER BY path", (root,)
+            )
+        return [row[0] for row in rows]
+
+    def _update_dir(self, path, exts):
+        """
+        Relist a directory if its mtime changed since the last scan, returns its subdirectories.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget_dir(path)
+            return []
+        row = self.conn.execute(
+            "SELECT mtime FROM dirs WHERE path = ?", (path,)
+        ).fetchone()
+        if row and row[0] == mtime:
+            return [
+                sub[0]
+                for sub in self.conn.execute(
+                    "SELECT path FROM dirs WHERE parent = ?", (path,)
+                )
+            ]
+
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in exts:
+                            stat = entry.stat()
+                            files.append(
+                                (entry.path, path, stat.st_size, stat.st_mtime_ns)
+                            )
+                    except OSError:
+                        continue
+        except OSError:
+            # unreadable directories (and paths that are not directories) are skipped like an empty one, and listed again next scan
+            self._forget_dir(path)
+            self.conn.execute(
+                "INSERT INTO dirs VALUES (?, ?, ?)", (path, os.path.dirname(path), -1)
+            )
+            return []
+
+        self.conn.execute("DELETE FROM files WHERE dir = ?", (path,))
+        self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", files)
+        known_subdirs = [
+            sub[0]
+            for sub in self.conn.execute(
+                "SELECT path FROM dirs WHERE parent = ?", (path,)
+            )
+        ]
+        for sub in set(known_subdirs) - set(subdirs):
+            self._forget_dir(sub)
+        parent = os.path.dirname(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, parent, mtime)
+        )
+        # new subdirectories are added with a placeholder mtime so they get listed
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO dirs VALUES (?, ?, ?)",
+            [(sub, path, -1) for sub in subdirs],
+        )
+        return subdirs
+
+    def _forget_dir(self, path):
+        """Remove a directory and everything below it from the index."""
+        prefix = (path + os.sep, path + chr(ord(os.sep) + 1))
+        self.conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+        self.conn.execute("DELETE FROM dirs WHERE path > ? AND path < ?", prefix)
+        self.conn.execute("DELETE FROM files WHERE dir = ?", (path,))
+        self.conn.execute("DELETE FROM files WHERE path > ? AND path < ?", prefix)
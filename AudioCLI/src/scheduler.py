@@ -0,0 +1,105 @@
+import concurrent.futures
+import os
+
+"""
+Size-aware scheduling of per-file tasks.
+The decoded size of every file is estimated from its header, tasks are submitted largest first so one long file at the end of the list doesn't set the wall-clock time.
+Tasks are only submitted while the estimated memory of the tasks in flight stays within a budget, and never more than a window of tasks at once.
+A task larger than the whole budget still runs, once nothing else is in flight.
+"""
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text):
+    """Byte count of a size like '8G', '512M' or '1.5G', raises ValueError."""
+    text = text.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in _UNITS else ""
+    number = float(text[: len(text) - len(unit)])
+    if number <= 0:
+        raise ValueError("size must be positive")
+    return int(number * _UNITS[unit])
+
+
+def format_size(size):
+    for unit in ["T", "G", "M", "K"]:
+        if size >= _UNITS[unit]:
+            return f"{size / _UNITS[unit]:.1f}{unit}"
+    return f"{size}B"
+
+
+def peak_bytes(info, stages=()):
+    """
+    Estimated peak memory of decoding a file (header metadata: sr, channels, frames) to float32 and running stages on it.
+    Every stage holds its input and output, resample, mono and stereo change the output size.
+    """
+    frames, channels, sr = info["frames"], info["channels"], info["sr"]
+    size = peak = frames * channels * 4
+    for name, args in stages:
+        if name == "resample":
+            frames = frames * int(args["sample_rate"]) // max(1, int(sr))
+            sr = int(args["sample_rate"])
+        elif name == "stereo":
+            channels = 2
+        elif name == "mono":
+            channels = 1
+        new_size = frames * channels * 4
+        peak = max(peak, size + new_size)
+        size = new_size
+    return peak
+
+
+def task_paths(task):
+    """Source files of a task, tasks start with a filepath or a list of them (batches)."""
+    return task[0] if isinstance(task[0], list) else [task[0]]
+
+
+def estimate_tasks(tasks, metadata):
+    """
+    Estimated peak memory of every task, from a metadata dict (path: info) of their source files.
+    Stages are taken from (filepath(s), save_path(s), stages, options) tasks, files without readable headers count their size on disk.
+    """
+    sizes = []
+    for task in tasks:
+        stages = task[2] if len(task) == 4 and isinstance(task[2], list) else []
+        size = 0
+        for path in task_paths(task):
+            info = metadata.get(path)
+            if info:
+                size += peak_bytes(info, stages)
+            else:
+                try:
+                    size += os.path.getsize(path)
+                except OSError:
+                    pass
+        sizes.append(size)
+    return sizes
+
+
+def run_scheduled(executor, fn, tasks, sizes, window, budget=None):
+    """
+    Submit fn(task) to executor largest task first, keeping at most window tasks and budget bytes (estimated) in flight.
+
+    Yields (task index, result) as tasks finish.
+    """
+    order = sorted(range(len(tasks)), key=lambda index: -sizes[index])
+    in_flight = {}
+    used = 0
+    position = 0
+    while position < len(order) or in_flight:
+        while position < len(order) and len(in_flight) < window:
+            index = order[position]
+            if in_flight and budget and used + sizes[index] > budget:
+                break
+            in_flight[executor.submit(fn, tasks[index])] = index
+            used += sizes[index]
+            position += 1
+        done, _ = concurrent.futures.wait(
+            in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            index = in_flight.pop(future)
+            used -= sizes[index]
+            yield index, future.result()
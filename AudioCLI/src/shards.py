@@ -0,0 +1,147 @@
+from AudioCLI.src.tensors import to_dtype
+import numpy as np
+import threading
+import socket
+import json
+import time
+import os
+
+"""
+Packed, memory-mappable dataset export (-pack).
+Processed audio is appended to a few large shard files as raw channels x frames arrays of int16, float16 or float32, every item aligned to 64 bytes.
+Every writer (one per process, on every host of a cluster) appends to its own shards and index lines (name, shard, offset, channels, frames, sr, dtype), so workers never share a file.
+finish_pack merges the index lines into index.json, ShardReader memory-maps the shards and slices every item without copying.
+"""
+
+INDEX_FILE = "index.json"
+ALIGN = 64
+# bytes a writer puts in one shard before starting the next
+SHARD_SIZE = 1 << 30
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class ShardWriter:
+    def __init__(self, pack_dir, shard_size=SHARD_SIZE):
+        os.makedirs(pack_dir, exist_ok=True)
+        self.pack_dir = pack_dir
+        self.shard_size = shard_size
+        # unique per writer, several hosts can write to the same pack on a shared filesystem
+        self.prefix = f"{socket.gethostname()}_{os.getpid()}_{time.time_ns()}"
+        self.index_path = os.path.join(pack_dir, f"{self.prefix}.jsonl")
+        self.index = open(self.index_path, "a")
+        self.number = 0
+        self.shard = None
+        self.lock = threading.Lock()
+
+    def _next_shard(self):
+        if self.shard is not None:
+            self.shard.close()
+            self.number += 1
+        self.shard_name = f"{self.prefix}_{self.number:04d}.bin"
+        self.shard = open(os.path.join(self.pack_dir, self.shard_name), "wb")
+
+    def write(self, name, audio, sr, dtype="float32"):
+        data = to_dtype(audio, dtype)
+        with self.lock:
+            if self.shard is None or (
+                self.shard.tell() and self.shard.tell() + data.nbytes > self.shard_size
+            ):
+                self._next_shard()
+            offset = self.shard.tell()
+            self.shard.write(data.tobytes())
+            self.shard.write(b"\0" * (-data.nbytes % ALIGN))
+            self.shard.flush()
+            entry = {
+                "name": name,
+                "shard": self.shard_name,
+                "offset": offset,
+                "channels": data.shape[0],
+                "frames": data.shape[1],
+                "sr": int(sr),
+                "dtype": dtype,
+                "time": time.time(),
+            }
+            self.index.write(json.dumps(entry) + "\n")
+            self.index.flush()
+
+    def close(self):
+        if self.shard is not None:
+            self.shard.close()
+        self.index.close()
+
+
+def pack_item(pack_dir, save_path, audio, sr, dtype="float32"):
+    """Append a processed file to the pack, named after its save path without extension."""
+    with _writers_lock:
+        writer = _writers.get(pack_dir)
+        if writer is None or not os.path.exists(writer.index_path):
+            # new pack, or removed since an earlier command of this (long-lived worker) process
+            if writer is not None:
+                writer.close()
+            writer = _writers[pack_dir] = ShardWriter(pack_dir)
+    name = os.path.splitext(os.path.basename(save_path))[0]
+    writer.write(name, audio, sr, dtype)
+
+
+def finish_pack(pack_dir):
+    """
+    Merge the index lines of every writer into index.json, the latest item of a name replaces earlier ones.
+
+    Returns the number of items, shards and bytes of shard data.
+    """
+    entries = []
+    for file_name in os.listdir(pack_dir):
+        if file_name.endswith(".jsonl"):
+            with open(os.path.join(pack_dir, file_name), "r") as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+    items = {}
+    for entry in sorted(entries, key=lambda entry: entry["time"]):
+        items[entry.pop("name")] = entry
+    index_path = os.path.join(pack_dir, INDEX_FILE)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump({"align": ALIGN, "items": items}, f)
+    os.replace(index_path + ".tmp", index_path)
+    shards = {entry["shard"] for entry in items.values()}
+    size = sum(os.path.getsize(os.path.join(pack_dir, shard)) for shard in shards)
+    return len(items), len(shards), size
+
+
+class ShardReader:
+    """
+    Read a pack: reader[name] is a read-only channels x frames view into the memory-mapped shard, reader.sr(name) its sample rate.
+    Views convert to tensors without copying, ie: torch.from_numpy(reader[name]) (torch warns the array is read-only).
+    """
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        with open(os.path.join(pack_dir, INDEX_FILE), "r") as f:
+            self.items = json.load(f)["items"]
+        self.maps = {}
+
+    def _map(self, shard):
+        if shard not in self.maps:
+            self.maps[shard] = np.memmap(
+                os.path.join(self.pack_dir, shard), dtype=np.uint8, mode="r"
+            )
+        return self.maps[shard]
+
+    def __getitem__(self, name):
+        entry = self.items[name]
+        dtype = np.dtype(entry["dtype"])
+        size = entry["channels"] * entry["frames"] * dtype.itemsize
+        data = self._map(entry["shard"])[entry["offset"] : entry["offset"] + size]
+        return data.view(dtype).reshape(entry["channels"], entry["frames"])
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, name):
+        return name in self.items
+
+    def sr(self, name):
+        return self.items[name]["sr"]
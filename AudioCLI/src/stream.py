@@ -0,0 +1,303 @@
+from AudioCLI.src.kernels import get_transform
+from pedalboard.io import AudioFile
+from torch.nn import functional as F
+import numpy as np
+import torch
+import random
+import os
+
+"""
+Block-wise streaming versions of the per-file operations in AudioCLI.src.ops.
+Files are read and written in fixed-size frame blocks, so memory per worker depends on the block size and not the file length.
+Every block processor takes a numpy array (channels x n_frames) and returns the processed block, flush() returns any audio still held back.
+"""
+
+# default bit depth when none is requested, matches saving float tensors with torchaudio
+DEFAULT_BITS = {"wav": 32, "flac": 16}
+
+
+class BlockOp:
+    def __init__(self, sr):
+        self.sr = sr
+
+    def process(self, block):
+        return block
+
+    def flush(self):
+        return None
+
+
+class BlockResample(BlockOp):
+    """
+    Windowed-sinc resampling with the kernel of the shared T.Resample transform, see AudioCLI.src.kernels.
+    The input a kernel overlaps past the end of a block is carried over to the next one, so the output is the same as resampling the whole file.
+    """
+
+    def __init__(self, sr, sample_rate):
+        super().__init__(int(sample_rate))
+        self.transform = (
+            get_transform("resample", int(sr), self.sr) if int(sr) != self.sr else None
+        )
+        self.buffer = None
+        self.frames = 0  # input frames taken
+        self.written = 0  # output frames returned
+
+    def _convolve(self, block):
+        tf = self.transform
+        orig, width = tf.orig_freq // tf.gcd, tf.width
+        size = tf.kernel.shape[-1]
+        if self.buffer is None:
+            # the whole-file transform pads width zeros in front
+            self.buffer = torch.zeros(block.shape[0], width)
+        self.buffer = torch.cat([self.buffer, block], dim=-1)
+        steps = (self.buffer.shape[-1] - size) // orig + 1
+        if steps <= 0:
+            return torch.zeros(block.shape[0], 0)
+        out = F.conv1d(
+            self.buffer[:, None, : (steps - 1) * orig + size], tf.kernel, stride=orig
+        )
+        self.buffer = self.buffer[:, steps * orig :]
+        return out.transpose(1, 2).reshape(block.shape[0], -1)
+
+    def process(self, block):
+        if self.transform is None:
+            return block
+        self.frames += block.shape[-1]
+        block = torch.from_numpy(np.ascontiguousarray(block, dtype=np.float32))
+        out = self._convolve(block)
+        self.written += out.shape[-1]
+        return out.numpy()
+
+    def flush(self):
+        if self.transform is None or self.buffer is None:
+            return None
+        tf = self.transform
+        orig, new = tf.orig_freq // tf.gcd, tf.new_freq // tf.gcd
+        # the padding behind the input and the output length of the whole-file transform, computed the same way
+        out = self._convolve(torch.zeros(self.buffer.shape[0], tf.width + orig))
+        length = int(torch.ceil(torch.as_tensor(new * self.frames / orig)))
+        return out[:, : max(0, length - self.written)].numpy()
+
+
+class BlockMono(BlockOp):
+    def process(self, block):
+        return block.mean(axis=0, keepdims=True)
+
+
+class BlockStereo(BlockOp):
+    def process(self, block):
+        if block.shape[0] == 1:
+            return np.repeat(block, 2, axis=0)
+        return block[:2]
+
+
+class BlockPhaseflip(BlockOp):
+    def process(self, block):
+        return -block
+
+
+class BlockNoise(BlockOp):
+    def __init__(self, sr, noise_level):
+        super().__init__(sr)
+        # one noise scale per file, like the in-memory version
+        self.scale = float(noise_level) * random.random()
+
+    def process(self, block):
+        noise = 2 * np.random.rand(*block.shape).astype(block.dtype) - 1
+        return block + self.scale * noise
+
+
+class BlockBitdepth(BlockOp):
+    def __init__(self, sr, bit_depth, quantize=False):
+        super().__init__(sr)
+        self.scale = 2 ** (int(bit_depth) - 1)
+        self.quantize = quantize and int(bit_depth) < 32
+
+    def process(self, block):
+        if not self.quantize:
+            return block
+        return np.clip(np.round(block * self.scale), -self.scale, self.scale - 1) / (
+            self.scale
+        )
+
+
+STREAM_OPS = {
+    "resample": BlockResample,
+    "mono": BlockMono,
+    "stereo": BlockStereo,
+    "phaseflip": BlockPhaseflip,
+    "noise": BlockNoise,
+    "bitdepth": BlockBitdepth,
+}
+
+
+def can_stream(stages):
+    """Check whether every stage has a block-wise version."""
+    return all(name in STREAM_OPS for name, _ in stages)
+
+
+def _build_chain(stages, sr):
+    chain = []
+    bits = None
+    for idx, (name, args) in enumerate(stages):
+        if name == "bitdepth":
+            op = BlockBitdepth(sr, args["bit_depth"], quantize=idx < len(stages) - 1)
+        else:
+            op = STREAM_OPS[name](sr, **args)
+        bits = int(args["bit_depth"]) if name == "bitdepth" else None
+        sr = op.sr
+        chain.append(op)
+    return chain, sr, bits
+
+
+def _run_chain(chain, block, start=0):
+    for op in chain[start:]:
+        if block is None or block.shape[-1] == 0:
+            return None
+        block = op.process(block)
+    return block
+
+
+def stream_file(filepath, save_path, stages, block_size):
+    """
+    Run stages on a file block by block, reading and writing block_size frames at a time.
+    The output is written next to the destination and moved in place when done, so overwriting the source is safe.
+    """
+    root, ext = os.path.splitext(save_path)
+    tmp_path = root + ".part" + ext
+    writer = None
+    try:
+        with AudioFile(filepath) as reader:
+            chain, out_sr, bits = _build_chain(stages, reader.samplerate)
+            bits = bits or DEFAULT_BITS.get(ext[1:].lower())
+
+            def write(block):
+                nonlocal writer
+                if block is None or block.shape[-1] == 0:
+                    return
+                if writer is None:
+                    kwargs = {"bit_depth": bits} if bits else {}
+                    writer = AudioFile(
+                        tmp_path, "w", out_sr, num_channels=block.shape[0], **kwargs
+                    )
+                writer.write(block)
+
+            while reader.tell() < reader.frames:
+                write(_run_chain(chain, reader.read(int(block_size))))
+            # push audio held back by stateful ops through the rest of the chain
+            for idx, op in enumerate(chain):
+                write(_run_chain(chain, op.flush(), start=idx + 1))
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, save_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def scan_level(filepath, threshold, criterion="peak", block_size=16384):
+    """
+    Measure the absolute peak or the RMS of a file block by block, stopping as soon as the result is known to reach threshold.
+    For peak that is the first block over threshold, for RMS the point where the running sum of squares alone reaches it.
+
+    Returns the level (measured so far when stopped early) and whether it stays below threshold.
+    """
+    with AudioFile(filepath) as reader:
+        # frames is an estimate for some formats, read until the file runs out
+        total = max(1, reader.frames * reader.num_channels)
+        limit = float(threshold) ** 2 * total
+        level = 0.0
+        while True:
+            block = reader.read(int(block_size))
+            if block.size == 0:
+                break
+            if criterion == "rms":
+                level += float(np.square(block, dtype=np.float64).sum())
+                if level >= limit:
+                    return float(np.sqrt(level / total)), False
+            else:
+                level = max(level, float(np.abs(block).max()))
+                if level >= float(threshold):
+                    return level, False
+    if criterion == "rms":
+        level = float(np.sqrt(level / total))
+    return level, level < float(threshold)
+
+
+class ArrayReader:
+    """Minimal in-memory stand-in for a pedalboard AudioFile reader, for files pedalboard can't open."""
+
+    def __init__(self, audio, samplerate):
+        self.audio = audio
+        self.samplerate = samplerate
+        self.num_channels = audio.shape[0]
+        self.frames = audio.shape[-1]
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def read(self, num_frames):
+        block = self.audio[:, self.position : self.position + int(num_frames)]
+        self.position += block.shape[-1]
+        return block
+
+    def seek(self, position):
+        self.position = min(int(position), self.frames)
+
+    def tell(self):
+        return self.position
+
+
+def read_windows(reader, length, hop, pad=True, read_size=1 << 18):
+    """
+    Yield windows of length seconds every hop seconds from a reader as (channels x frames) arrays.
+    Windows are strided views into a buffer of at most one window plus read_size frames, gaps between windows (hop > length) are seeked over.
+    The last window holds the remaining audio not covered yet, padded to length with silence if pad.
+    """
+    window = max(1, int(round(float(length) * reader.samplerate)))
+    step = max(1, int(round(float(hop) * reader.samplerate)))
+    read_size = max(int(read_size), window)
+    buf = np.zeros((reader.num_channels, 0), dtype=getattr(reader, "dtype", np.float32))
+    offset = 0  # file position of buf[:, 0]
+    start = 0  # file position of the next window
+    end = 0  # file position where the last window ended
+    eof = False
+    while True:
+        if start - offset >= buf.shape[-1]:
+            skip = start - offset - buf.shape[-1]
+            if skip and not eof:
+                reader.seek(min(reader.tell() + skip, reader.frames))
+            buf = buf[:, :0]
+        else:
+            buf = buf[:, start - offset :]
+        offset = start
+        if not eof:
+            block = reader.read(read_size)
+            eof = block.shape[-1] < read_size
+            buf = np.concatenate([buf, block], axis=-1)
+        n_full = (buf.shape[-1] - window) // step + 1 if buf.shape[-1] >= window else 0
+        if n_full:
+            views = np.lib.stride_tricks.sliding_window_view(buf, window, axis=-1)
+            for idx in range(0, n_full * step, step):
+                yield views[:, idx]
+            start = offset + n_full * step
+            end = offset + (n_full - 1) * step + window
+        if eof:
+            break
+    tail = buf[:, start - offset :]
+    if tail.shape[-1] and offset + buf.shape[-1] > end:
+        if pad:
+            filler = np.zeros(
+                (tail.shape[0], window - tail.shape[-1]), dtype=tail.dtype
+            )
+            if getattr(reader, "silence", None) is not None:
+                filler[:] = reader.silence
+            tail = np.concatenate([tail, filler], axis=-1)
+        yield tail
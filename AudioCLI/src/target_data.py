@@ -1,11 +1,26 @@
-from aeiou.core import fast_scandir
+from AudioCLI.src.scan_index import ScanIndex
+from AudioCLI.src.metadata import MetadataIndex, parse_filter, matches
+from AudioCLI.src.profiling import stage
+import sqlite3
 import os
 
+INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scan_index.db"
+)
+
 
 class TargetData:
-    def __init__(self):
+    def __init__(self, index_path=INDEX_PATH):
         self.search_paths = []
         self.file_paths = []
+        self.filter = None
+        self.unfiltered_count = 0
+        try:
+            self.index = ScanIndex(index_path) if index_path else None
+            self.meta = MetadataIndex(index_path) if index_path else None
+        except sqlite3.Error:
+            self.index = None
+            self.meta = None
 
     def contains_data(self):
         return self.file_paths
@@ -15,19 +30,68 @@ class TargetData:
         self.file_paths = []
         exts = [".mp3", ".wav", ".ogg", ".flac"]
         for path in search_paths:
-            if recursive:
-                _, files = fast_scandir(path, exts)
-            else:
-                # get all audio files in the directory
-                files = [
-                    os.path.join(path, f)
-                    for f in os.listdir(path)
-                    if os.path.isfile(os.path.join(path, f))
-                    and os.path.splitext(f)[1].lower() in exts
-                ]
+            with stage("scan", path):
+                if self.index is not None:
+                    files = self.index.scan(path, exts, recursive=recursive)
+                elif recursive:
+                    from aeiou.core import fast_scandir
+
+                    _, files = fast_scandir(os.path.abspath(path), exts)
+                else:
+                    # get all audio files in the directory
+                    files = [
+                        os.path.join(os.path.abspath(path), f)
+                        for f in os.listdir(path)
+                        if os.path.isfile(os.path.join(path, f))
+                        and os.path.splitext(f)[1].lower() in exts
+                    ]
             self.file_paths.extend(files)
+        self.unfiltered_count = len(self.file_paths)
+        self.apply_filter()
         return len(self.file_paths)
 
+    def metadata(self, paths=None):
+        """
+        Return header metadata (sr, channels, frames, duration, size) for paths, all target files by default.
+        """
+        paths = self.file_paths if paths is None else paths
+        if self.meta is None:
+            self.meta = MetadataIndex(":memory:")
+        with stage("metadata"):
+            return self.meta.lookup(paths)
+
+    def set_filter(self, expression):
+        """
+        Only keep target files matching a filter expression ie: 'sr != 44100 and duration > 30'. None clears the filter.
+        """
+        if expression is not None:
+            parse_filter(expression)  # raises ValueError on a bad expression
+        self.filter = expression
+        if self.filter is None and self.search_paths:
+            self.scan(self.search_paths)
+        else:
+            self.apply_filter()
+
+    def apply_filter(self):
+        if not self.filter:
+            return
+        conditions = parse_filter(self.filter)
+        infos = self.metadata()
+        self.file_paths = [
+            path
+            for path in self.file_paths
+            if path in infos and matches(infos[path], conditions)
+        ]
+
     def from_settings(self, settings):
         self.search_paths = settings["search_paths"]
+        self.filter = settings.get("filter", None)
+        # load the file list from the index, the next scan only relists changed directories
+        if self.index is not None:
+            indexed = [self.index.files(path) for path in self.search_paths]
+            if all(files is not None for files in indexed):
+                self.file_paths = [path for files in indexed for path in files]
+                self.unfiltered_count = len(self.file_paths)
+                self.apply_filter()
+                return
         self.scan(self.search_paths)
@@ -0,0 +1,101 @@
+import struct
+import json
+import os
+
+# numpy is imported where it is used, the format and dtype names are read by the target category on every launch
+
+"""
+Tensor output formats of -pt.
+'pt' pickles the tensor with torch.save, 'safetensors' and 'npy' write a small header and the raw array, so they load without unpickling and can be memory-mapped.
+Audio can be stored as float32, float16 or int16 (full scale), see to_dtype.
+safetensors files hold one tensor named 'audio' with the sample rate in the metadata and load with the safetensors package as well as load_tensor.
+"""
+
+PT_FORMATS = {"pt": ".pt", "safetensors": ".safetensors", "npy": ".npy"}
+DTYPES = ("int16", "float16", "float32")
+_SAFETENSORS_DTYPES = {"float32": "F32", "float16": "F16", "int16": "I16"}
+
+
+def to_dtype(audio, dtype):
+    """Audio tensor or array as a contiguous channels x frames numpy array of dtype, int16 is scaled to full range."""
+    import numpy as np
+
+    if hasattr(audio, "detach"):
+        audio = audio.detach().to("cpu").numpy()
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 1:
+        audio = audio[None]
+    if dtype == "int16":
+        audio = np.clip(np.round(audio * 32767), -32768, 32767)
+    return np.ascontiguousarray(audio, dtype=dtype)
+
+
+def tensor_path(save_path, pt_format="pt"):
+    """Path a tensor is saved to, the format extension replaces the audio extension."""
+    return os.path.splitext(save_path)[0] + PT_FORMATS[pt_format]
+
+
+def _save_safetensors(path, array, sr):
+    header = {
+        "audio": {
+            "dtype": _SAFETENSORS_DTYPES[array.dtype.name],
+            "shape": list(array.shape),
+            "data_offsets": [0, array.nbytes],
+        },
+        "__metadata__": {"sample_rate": str(int(sr))},
+    }
+    header = json.dumps(header).encode("utf-8")
+    # the data starts 8 byte aligned
+    header += b" " * (-len(header) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(array.tobytes())
+
+
+def save_tensor(save_path, audio, sr, pt_format="pt", dtype="float32"):
+    """Save an audio tensor in a -pt format, returns the path written to."""
+    import numpy as np
+
+    path = tensor_path(save_path, pt_format)
+    array = to_dtype(audio, dtype)
+    if pt_format == "npy":
+        np.save(path, array)
+    elif pt_format == "safetensors":
+        _save_safetensors(path, array, sr)
+    else:
+        import torch
+
+        torch.save(torch.from_numpy(array), path)
+    return path
+
+
+def load_tensor(path, mmap=True):
+    """
+    Load a tensor saved by save_tensor as a channels x frames numpy array.
+    .npy and .safetensors files are memory-mapped (read-only, zero copy) unless mmap is False, .pt files are unpickled by torch.
+    """
+    import numpy as np
+
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r" if mmap else None)
+    if path.endswith(".safetensors"):
+        with open(path, "rb") as f:
+            (size,) = struct.unpack("<Q", f.read(8))
+            entry = json.loads(f.read(size))["audio"]
+        dtype = {code: name for name, code in _SAFETENSORS_DTYPES.items()}[
+            entry["dtype"]
+        ]
+        start, end = entry["data_offsets"]
+        if mmap:
+            data = np.memmap(path, dtype=np.uint8, mode="r")[
+                8 + size + start : 8 + size + end
+            ]
+        else:
+            with open(path, "rb") as f:
+                f.seek(8 + size + start)
+                data = np.frombuffer(f.read(end - start), dtype=np.uint8)
+        return data.view(dtype).reshape(entry["shape"])
+    import torch
+
+    return torch.load(path).numpy()
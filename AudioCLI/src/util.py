@@ -1,9 +1,6 @@
-from pedalboard.io import AudioFile
-import torch
-import torchaudio
-import torch.nn as nn
 import re
-import os
+
+# torch, torchaudio and pedalboard are imported where they are used, importing them takes seconds and most commands never decode audio
 
 
 def chunks(lst, n):
@@ -13,6 +10,10 @@ def chunks(lst, n):
 
 
 def load_file(filename):
+    from pedalboard.io import AudioFile
+    import torch
+    import torchaudio
+
     ext = filename.split(".")[-1]
     if ext == "mp3":
         with AudioFile(filename) as f:
@@ -24,18 +25,51 @@ def load_file(filename):
     return audio, in_sr
 
 
-def save_to_file(paths, audios, srs, bits=None, pt_save=False):
+def load_buffer(buffer, ext):
+    """Decode an encoded file held in memory (a file-like object), ext picks the decoder like the extension does in load_file."""
+    from pedalboard.io import AudioFile
+    import torch
+    import torchaudio
+
+    ext = ext.lstrip(".").lower()
+    if ext == "mp3":
+        with AudioFile(buffer) as f:
+            audio = torch.from_numpy(f.read(f.frames))
+            in_sr = f.samplerate
+    else:
+        audio, in_sr = torchaudio.load(buffer, format=ext)
+    return audio, in_sr
+
+
+def probe_file(filename):
+    """Read sample rate, channel count and frame count from the file header without decoding."""
+    from pedalboard.io import AudioFile
+
+    try:
+        with AudioFile(filename) as f:
+            return f.samplerate, f.num_channels, f.frames
+    except Exception:
+        return None, None, 0
+
+
+def save_to_file(
+    paths, audios, srs, bits=None, pt_save=False, pt_format="pt", pt_dtype="float32"
+):
+    from pedalboard.io import AudioFile
+    import torchaudio
+
     paths = [paths] if not isinstance(paths, list) else paths
     audios = [audios] if not isinstance(audios, list) else audios
-    srs = [srs] if not isinstance(srs, list) else srs
-    bits = [bits] if not isinstance(bits, list) else bits
+    srs = [srs] * len(paths) if not isinstance(srs, list) else srs
+    bits = [bits] * len(paths) if not isinstance(bits, list) else bits
     for save_path, audio, sr, bit in zip(paths, audios, srs, bits):
         audio = audio.to("cpu")
         audio = audio.detach()
         if pt_save:
-            save_path = os.path.splitext(save_path)[0] + ".pt"
-            torch.save(audio, save_path)
-            return
+            from AudioCLI.src.tensors import save_tensor
+
+            save_tensor(save_path, audio, sr, pt_format, pt_dtype)
+            continue
         if save_path.endswith(".mp3"):
             with AudioFile(save_path, "w", int(sr), num_channels=audio.shape[0]) as f:
                 f.write(audio.numpy())
@@ -48,6 +82,38 @@ def save_to_file(paths, audios, srs, bits=None, pt_save=False):
                 torchaudio.save(save_path, audio, sr)
 
 
+def save_output(paths, audios, srs, bits=None, options=None):
+    """
+    Save processed audio the way the task options ask: packed into shards (-pack, see AudioCLI.src.shards), as tensor files (-pt, see AudioCLI.src.tensors) or as audio.
+    Takes single items or lists like save_to_file.
+    """
+    options = options or {}
+    if options.get("pack"):
+        from AudioCLI.src.shards import pack_item
+
+        paths = [paths] if not isinstance(paths, list) else paths
+        audios = [audios] if not isinstance(audios, list) else audios
+        srs = [srs] * len(paths) if not isinstance(srs, list) else srs
+        for save_path, audio, sr in zip(paths, audios, srs):
+            pack_item(
+                options["pack"],
+                save_path,
+                audio,
+                sr,
+                options.get("pack_dtype", "float32"),
+            )
+        return
+    save_to_file(
+        paths,
+        audios,
+        srs,
+        bits=bits,
+        pt_save=options.get("pt_save", False),
+        pt_format=options.get("pt_format", "pt"),
+        pt_dtype=options.get("pt_dtype", "float32"),
+    )
+
+
 def extract_arg_help(arg, docstring):
     """
     Given an argument name and a docstring, try to extract a helpful
@@ -0,0 +1,289 @@
+import numpy as np
+import struct
+import os
+
+"""
+PCM WAV fast path.
+mono, stereo and bitdepth on integer PCM WAV files only need integer channel arithmetic, chunking only needs byte slicing.
+Only chains ending in bitdepth 8, 16 or 24 take it, those are the ones save_to_file writes as integer PCM, everything else is saved as float there and must not change format with the path taken.
+The data chunk is memory-mapped and processed in its native integer format block by block, the output gets a freshly written header.
+Anything else (compressed formats, float WAV, .pt or packed output) goes through load_file/save_to_file as before.
+"""
+
+PCM_OPS = ["mono", "stereo", "bitdepth"]
+PCM_BITS = [8, 16, 24]
+BLOCK_FRAMES = 1 << 18
+
+_EXTENSIBLE = 0xFFFE
+_PCM_GUID_TAIL = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+
+class PcmInfo:
+    def __init__(self, channels, samplerate, bits, offset, frames):
+        self.channels = channels
+        self.samplerate = samplerate
+        self.bits = bits
+        self.offset = offset
+        self.frames = frames
+
+
+def parse_wav(path):
+    """
+    Read the header of an integer PCM WAV file.
+
+    Returns a PcmInfo, or None if the file is not a plain 8/16/24/32 bit integer PCM WAV.
+    """
+    if not path.lower().endswith(".wav"):
+        return None
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(chunk_size)
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b"data":
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+            offset = f.tell()
+    except (OSError, struct.error):
+        return None
+    if fmt is None or len(fmt) < 16:
+        return None
+    tag, channels, samplerate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == _EXTENSIBLE:
+        if len(fmt) < 40 or struct.unpack("<H", fmt[24:26])[0] != 1:
+            return None
+    elif tag != 1:
+        return None
+    if bits not in [8, 16, 24, 32] or block_align != channels * bits // 8:
+        return None
+    # streamed files can carry a placeholder data size, trust the file size instead
+    data_size = min(chunk_size, size - offset)
+    if data_size < block_align:
+        return None
+    return PcmInfo(channels, samplerate, bits, offset, data_size // block_align)
+
+
+def can_pcm(filepath, save_path, stages, options):
+    """Check whether a task can run on the PCM fast path."""
+    return (
+        not options.get("pt_save")
+        and not options.get("pack")
+        and save_path.lower().endswith(".wav")
+        and all(name in PCM_OPS for name, _ in stages)
+        and _out_bits(stages) in PCM_BITS
+        and parse_wav(filepath) is not None
+    )
+
+
+def _sample_dtype(bits):
+    return {8: "u1", 16: "<i2", 24: "V3", 32: "<i4"}[bits]
+
+
+def open_pcm(path, info=None):
+    """Memory-map the data chunk of a PCM WAV file as a frames x channels array of its native sample type."""
+    info = info or parse_wav(path)
+    return np.memmap(
+        path,
+        dtype=_sample_dtype(info.bits),
+        mode="r",
+        offset=info.offset,
+        shape=(info.frames, info.channels),
+    )
+
+
+def wav_header(channels, samplerate, bits, frames):
+    """Header of an integer PCM WAV file, extensible format for more than 2 channels or 16 bits like libsndfile."""
+    block_align = channels * bits // 8
+    data_size = frames * block_align
+    if channels > 2 or bits > 16:
+        mask = (1 << channels) - 1 if channels <= 18 else 0
+        fmt = struct.pack(
+            "<HHIIHHHHI2s14s",
+            _EXTENSIBLE,
+            channels,
+            samplerate,
+            samplerate * block_align,
+            block_align,
+            bits,
+            22,
+            bits,
+            mask,
+            b"\x01\x00",
+            _PCM_GUID_TAIL,
+        )
+    else:
+        fmt = struct.pack(
+            "<HHIIHH",
+            1,
+            channels,
+            samplerate,
+            samplerate * block_align,
+            block_align,
+            bits,
+        )
+    return (
+        struct.pack("<4sI4s", b"RIFF", 4 + 8 + len(fmt) + 8 + data_size, b"WAVE")
+        + struct.pack("<4sI", b"fmt ", len(fmt))
+        + fmt
+        + struct.pack("<4sI", b"data", data_size)
+    )
+
+
+def decode(block, bits):
+    """Native samples (frames x channels) to integer values on the signed scale of bits, int32 up to 16 bits and int64 above."""
+    if bits == 8:
+        return block.astype(np.int32) - 128
+    if bits == 24:
+        # place the 3 bytes in the top of an int32 and shift back down to sign extend
+        padded = np.zeros((*block.shape, 4), dtype=np.uint8)
+        padded[..., 1:] = (
+            np.ascontiguousarray(block).view(np.uint8).reshape(*block.shape, 3)
+        )
+        return (padded.view("<i4")[..., 0] >> 8).astype(np.int64)
+    return block.astype(np.int32 if bits == 16 else np.int64)
+
+
+def encode(values, bits):
+    """Integer values on the signed scale of bits to native little-endian sample bytes."""
+    if bits == 8:
+        return (values + 128).astype(np.uint8).tobytes()
+    if bits == 24:
+        values = values.astype("<i4").reshape(-1)
+        out = np.empty((values.size, 3), dtype=np.uint8)
+        out[:, 0] = values & 0xFF
+        out[:, 1] = (values >> 8) & 0xFF
+        out[:, 2] = (values >> 16) & 0xFF
+        return out.tobytes()
+    return values.astype({16: "<i2", 32: "<i4"}[bits]).tobytes()
+
+
+def _mono(values, bits):
+    # mean over channels, rounded half up in integer math
+    n = values.shape[1]
+    # adding channel columns one by one is much faster than a sum over the short channel axis
+    total = values[:, :1].copy()
+    for channel in range(1, n):
+        total += values[:, channel : channel + 1]
+    if n & (n - 1) == 0:
+        shift = n.bit_length() - 1
+        return (total + (n >> 1)) >> shift, bits
+    return (2 * total + n) // (2 * n), bits
+
+
+def _stereo(values, bits):
+    if values.shape[1] == 1:
+        return np.repeat(values, 2, axis=1), bits
+    return values[:, :2], bits
+
+
+def _bitdepth(values, bits, bit_depth):
+    bit_depth = int(bit_depth)
+    if bit_depth > 16:
+        values = values.astype(np.int64)
+    if bit_depth >= bits:
+        return values << (bit_depth - bits), bit_depth
+    shift = bits - bit_depth
+    values = (values + (1 << (shift - 1))) >> shift
+    limit = 1 << (bit_depth - 1)
+    return np.clip(values, -limit, limit - 1), bit_depth
+
+
+_OPS = {"mono": _mono, "stereo": _stereo, "bitdepth": _bitdepth}
+
+
+def _out_bits(stages):
+    # the bit depth the float path saves with, see AudioCLI.src.ops.apply_stages
+    if stages and stages[-1][0] == "bitdepth":
+        return int(stages[-1][1]["bit_depth"])
+    return None
+
+
+def _out_channels(channels, stages):
+    for name, _ in stages:
+        if name == "mono":
+            channels = 1
+        elif name == "stereo":
+            channels = 2
+    return channels
+
+
+def pcm_file(filepath, save_path, stages, block_frames=BLOCK_FRAMES):
+    """
+    Run mono, stereo and bitdepth stages ending in bitdepth 8, 16 or 24 on an integer PCM WAV file without converting it to float.
+    Samples are raised to the output bit depth first, so mono rounds at the output resolution like the float path does.
+    The output is written next to the destination and moved in place when done, so overwriting the source is safe.
+    """
+    info = parse_wav(filepath)
+    data = open_pcm(filepath, info)
+    channels, bits = _out_channels(info.channels, stages), _out_bits(stages)
+    root, ext = os.path.splitext(save_path)
+    tmp_path = root + ".part" + ext
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(wav_header(channels, info.samplerate, bits, info.frames))
+            for start in range(0, info.frames, block_frames):
+                values, values_bits = (
+                    decode(data[start : start + block_frames], info.bits),
+                    info.bits,
+                )
+                if bits > values_bits:
+                    values, values_bits = _bitdepth(values, values_bits, bits)
+                for name, args in stages:
+                    values, values_bits = _OPS[name](values, values_bits, **args)
+                f.write(encode(values, values_bits))
+        del data
+        os.replace(tmp_path, save_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class PcmReader:
+    """Reader over a memory-mapped PCM WAV file, returns channels x frames views of the native samples."""
+
+    def __init__(self, path):
+        self.info = parse_wav(path)
+        self.data = open_pcm(path, self.info)
+        self.samplerate = self.info.samplerate
+        self.num_channels = self.info.channels
+        self.frames = self.info.frames
+        self.dtype = self.data.dtype
+        # zero bytes are silence for every format except unsigned 8 bit
+        self.silence = 128 if self.info.bits == 8 else None
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.data = None
+        return False
+
+    def read(self, num_frames):
+        block = self.data[self.position : self.position + int(num_frames)].T
+        self.position += block.shape[-1]
+        return block
+
+    def seek(self, position):
+        self.position = min(int(position), self.frames)
+
+    def tell(self):
+        return self.position
+
+
+def write_window(path, window, info):
+    """Write a channels x frames window of native samples as a PCM WAV file."""
+    with open(path, "wb") as f:
+        f.write(wav_header(info.channels, info.samplerate, info.bits, window.shape[-1]))
+        f.write(np.ascontiguousarray(window.T).tobytes())
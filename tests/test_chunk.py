@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from AudioCLI.src.ops import chunk_file
+from AudioCLI.src.stream import ArrayReader, read_windows
+from AudioCLI.src.wav import open_pcm, parse_wav
+
+SUBTYPES = {8: "PCM_U8", 16: "PCM_16", 24: "PCM_24"}
+
+
+def reference_windows(audio, window, step, pad):
+    """Windows every step frames, then the audio not covered yet padded to window."""
+    windows = []
+    start = end = 0
+    while start + window <= audio.shape[-1]:
+        windows.append(audio[:, start : start + window])
+        end = start + window
+        start += step
+    if start < audio.shape[-1] and audio.shape[-1] > end:
+        tail = audio[:, start:]
+        if pad:
+            tail = np.pad(tail, ((0, 0), (0, window - tail.shape[-1])))
+        windows.append(tail)
+    return windows
+
+
+def ramp(frames, channels=2):
+    values = np.arange(1, frames + 1, dtype=np.float32)
+    return np.stack([values * (-1) ** c for c in range(channels)])
+
+
+def test_overlapping_windows_and_padded_tail():
+    # 10 Hz, windows of 10 frames every 5
+    audio = ramp(37)
+    windows = [
+        w.copy() for w in read_windows(ArrayReader(audio, 10), 1.0, 0.5, read_size=12)
+    ]
+    assert [w[0, 0] for w in windows] == [1, 6, 11, 16, 21, 26, 31]
+    np.testing.assert_array_equal(windows[1][:, :5], windows[0][:, 5:])
+    # the tail starts at the next window and is padded with silence
+    np.testing.assert_array_equal(windows[-1][0], [31, 32, 33, 34, 35, 36, 37, 0, 0, 0])
+    assert all(w.shape == (2, 10) for w in windows)
+
+
+@pytest.mark.parametrize("frames", [37, 40, 9, 55])
+@pytest.mark.parametrize("length,hop", [(1.0, 1.0), (1.0, 0.3), (1.0, 1.5), (0.5, 2.0)])
+@pytest.mark.parametrize("pad", [True, False])
+@pytest.mark.parametrize("read_size", [4, 12, 1 << 18])
+def test_windows_match_reference(frames, length, hop, pad, read_size):
+    audio = ramp(frames)
+    windows = [
+        w.copy()
+        for w in read_windows(ArrayReader(audio, 10), length, hop, pad, read_size)
+    ]
+    expected = reference_windows(audio, int(length * 10), int(round(hop * 10)), pad)
+    assert len(windows) == len(expected)
+    for window, reference in zip(windows, expected):
+        np.testing.assert_array_equal(window, reference)
+
+
+def write_pcm(path, bits, frames, channels=2, sr=1000):
+    rng = np.random.default_rng(bits)
+    limit = 1 << (bits - 1)
+    values = rng.integers(-limit, limit, size=(frames, channels))
+    sf.write(path, values / limit, sr, subtype=SUBTYPES[bits])
+    return values
+
+
+def read_pcm(path):
+    """Native samples (frames x channels) of a PCM WAV file and its bit depth."""
+    info = parse_wav(path)
+    return np.array(open_pcm(path, info)), info.bits
+
+
+def chunks(tmp_path, ext):
+    paths = sorted(
+        (p for p in os.listdir(tmp_path) if p.startswith("out_")),
+        key=lambda p: int(p[4:].split(".")[0]),
+    )
+    assert all(p.endswith(ext) for p in paths)
+    return [str(tmp_path / p) for p in paths]
+
+
+@pytest.mark.parametrize("bits", [8, 16, 24])
+def test_chunk_pcm_wav(tmp_path, bits):
+    src = str(tmp_path / "in.wav")
+    write_pcm(src, bits, 2300)
+    source, _ = read_pcm(src)
+    chunk_file((src, str(tmp_path / "out.wav"), 1.0, 0.5, True, False, {}))
+    paths = chunks(tmp_path, ".wav")
+    # full windows at 0, 500 and 1000 frames, the tail from 1500 is padded
+    assert len(paths) == 4
+    for index, path in enumerate(paths):
+        window, window_bits = read_pcm(path)
+        assert window_bits == bits
+        assert sf.info(path).subtype == SUBTYPES[bits]
+        assert window.shape == (1000, 2)
+        start = index * 500
+        covered = source[start : start + 1000]
+        np.testing.assert_array_equal(window[: len(covered)], covered)
+    # the padding is silence, which is 128 for unsigned 8 bit
+    padding = np.ascontiguousarray(window[800:]).view(np.uint8)
+    assert (padding == (128 if bits == 8 else 0)).all()
+    assert os.path.exists(src)
+
+
+def test_chunk_clean_keeps_padded_tail(tmp_path):
+    src = str(tmp_path / "in.wav")
+    source = write_pcm(src, 16, 1500)
+    chunk_file((src, str(tmp_path / "out.wav"), 1.0, 1.0, True, True, {}))
+    assert not os.path.exists(src)
+    paths = chunks(tmp_path, ".wav")
+    assert len(paths) == 2
+    tail, _ = read_pcm(paths[-1])
+    np.testing.assert_array_equal(tail[:500], source[1000:])
+    assert not tail[500:].any()
+
+
+def test_chunk_without_pad(tmp_path):
+    src = str(tmp_path / "in.wav")
+    source = write_pcm(src, 16, 1500)
+    chunk_file((src, str(tmp_path / "out.wav"), 1.0, 1.0, False, False, {}))
+    tail, _ = read_pcm(chunks(tmp_path, ".wav")[-1])
+    np.testing.assert_array_equal(tail, source[1000:])
+
+
+def test_chunk_non_wav(tmp_path):
+    src = str(tmp_path / "in.flac")
+    source = write_pcm(src, 16, 2300) / 32768
+    chunk_file((src, str(tmp_path / "out.flac"), 1.0, 0.5, True, False, {}))
+    paths = chunks(tmp_path, ".flac")
+    assert len(paths) == 4
+    for index, path in enumerate(paths):
+        window, sr = sf.read(path, always_2d=True)
+        assert sr == 1000
+        assert window.shape == (1000, 2)
+        covered = source[index * 500 : index * 500 + 1000]
+        np.testing.assert_allclose(window[: len(covered)], covered, atol=1 / 32768)
+    assert not window[800:].any()
@@ -0,0 +1,131 @@
+import collections
+import socket
+import threading
+import time
+
+import pytest
+
+from AudioCLI.src import cluster
+from AudioCLI.src.cluster import Coordinator, Worker
+
+TOKEN = "secret"
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(cluster, "RETRY", 0.05)
+
+
+def start_coordinator(tasks, token=TOKEN, fn_name="process_file"):
+    """Run a coordinator on a free localhost port in a thread, returns it, its thread and its address."""
+    coordinator = Coordinator("127.0.0.1:0", fn_name, tasks, token=token)
+    output = {}
+    thread = threading.Thread(
+        target=lambda: output.setdefault("results", coordinator.run()), daemon=True
+    )
+    thread.start()
+    deadline = time.time() + 5
+    while coordinator.server is None and time.time() < deadline:
+        time.sleep(0.01)
+    host, port = coordinator.address
+    return coordinator, thread, output, f"{host}:{port}"
+
+
+class Recorder:
+    """Worker run function that counts every task it is given."""
+
+    def __init__(self, fail=()):
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.fail = fail
+
+    def __call__(self, fn_name, task, cwd):
+        with self.lock:
+            self.calls[task[0]] += 1
+        if task[0] in self.fail:
+            raise RuntimeError("broken file")
+        return task[0].upper()
+
+
+def start_worker(address, run, token=TOKEN):
+    worker = Worker(address, run, jobs=1, token=token)
+    thread = threading.Thread(target=worker.start, daemon=True)
+    thread.start()
+    return worker, thread
+
+
+def join(*threads):
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_every_task_is_acknowledged_once():
+    tasks = [[f"f{i}"] for i in range(40)]
+    coordinator, thread, output, address = start_coordinator(tasks)
+    run = Recorder()
+    workers = [start_worker(address, run) for _ in range(2)]
+    join(thread, *[t for _, t in workers])
+    assert output["results"] == [f"F{i}" for i in range(40)]
+    assert run.calls == {f"f{i}": 1 for i in range(40)}
+    assert sum(worker.tasks for worker, _ in workers) == 40
+    assert coordinator.failed == 0
+
+
+def test_failed_tasks_leave_none():
+    tasks = [["a"], ["b"], ["c"]]
+    coordinator, thread, output, address = start_coordinator(tasks)
+    run = Recorder(fail=["b"])
+    join(thread, start_worker(address, run)[1])
+    assert output["results"] == ["A", None, "C"]
+    assert coordinator.failed == 1
+    # failed tasks are reported, not retried
+    assert run.calls["b"] == 1
+
+
+def test_wrong_token_is_rejected():
+    tasks = [["a"], ["b"]]
+    coordinator, thread, output, address = start_coordinator(tasks)
+    intruder_run = Recorder()
+    intruder, intruder_thread = start_worker(address, intruder_run, token="wrong")
+    join(intruder_thread)
+    assert intruder.tasks == 0
+    assert not intruder_run.calls
+    assert coordinator.remaining == 2
+
+    run = Recorder()
+    join(thread, start_worker(address, run)[1])
+    assert output["results"] == ["A", "B"]
+
+
+def test_task_of_a_disconnected_worker_is_served_again():
+    tasks = [["a"], ["b"], ["c"]]
+    coordinator, thread, output, address = start_coordinator(tasks)
+    host, port = cluster.parse_address(address)
+    # the reader holds the connection open as well, both are closed to disconnect
+    with socket.create_connection((host, port)) as sock, sock.makefile(
+        "r", encoding="utf-8"
+    ) as reader:
+        lines = iter(reader)
+        challenge = cluster._receive(lines)["challenge"]
+        cluster._authenticate(sock, lines, TOKEN, challenge)
+        cluster._send(sock, {"get": True})
+        taken = cluster._receive(lines)
+    # gone without acknowledging its task
+    assert taken["task"] == ["a"]
+
+    run = Recorder()
+    join(thread, start_worker(address, run)[1])
+    assert output["results"] == ["A", "B", "C"]
+    assert run.calls == {"a": 1, "b": 1, "c": 1}
+
+
+def test_non_loopback_host_needs_a_token():
+    with pytest.raises(ValueError):
+        Coordinator("0.0.0.0:0", "process_file", [], token="")
+    Coordinator("0.0.0.0:0", "process_file", [], token=TOKEN)
+
+
+def test_unknown_task_function_is_refused():
+    with pytest.raises(ValueError):
+        Coordinator("127.0.0.1:0", "os.remove", [], token=TOKEN)
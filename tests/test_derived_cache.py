@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+from AudioCLI.src.derived_cache import DerivedCache, output_path
+
+MONO = [("mono", {})]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DerivedCache(str(tmp_path / "index.db"))
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def run(cache, tasks, mode="stat"):
+    """Plan tasks, write an output for every remaining one and record it, returns the remaining tasks, skipped and linked counts."""
+    remaining, pending, skipped, linked = cache.plan(tasks, mode)
+    for filepath, save_path, stages, options in remaining:
+        with open(filepath, "rb") as f:
+            write(output_path(save_path, options), b"out:" + f.read())
+    cache.record(pending, 0)
+    return remaining, skipped, linked
+
+
+def task(tmp_path, name="a", ext=".wav", stages=MONO, options=None):
+    return (
+        str(tmp_path / f"{name}.wav"),
+        str(tmp_path / f"{name}_out{ext}"),
+        stages,
+        options or {},
+    )
+
+
+def test_unchanged_input_is_skipped(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    tasks = [task(tmp_path)]
+    assert run(cache, tasks) == (tasks, 0, 0)
+    assert run(cache, tasks) == ([], 1, 0)
+
+
+def test_touched_input_is_recomputed(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    tasks = [task(tmp_path)]
+    run(cache, tasks)
+    stat = os.stat(tmp_path / "a.wav")
+    os.utime(tmp_path / "a.wav", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_changed_output_is_recomputed(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    tasks = [task(tmp_path)]
+    run(cache, tasks)
+    write(tmp_path / "a_out.wav", b"edited")
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_changed_stage_argument_is_recomputed(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    run(cache, [task(tmp_path, stages=[("resample", {"sample_rate": 44100})])])
+    tasks = [task(tmp_path, stages=[("resample", {"sample_rate": 48000})])]
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_output_extension_is_keyed(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    run(cache, [task(tmp_path)])
+    # same output path, the key tells the formats apart
+    key_wav = cache.task_key(*task(tmp_path), "stat")
+    key_flac = cache.task_key(*task(tmp_path, ext=".flac"), "stat")
+    assert key_wav != key_flac
+    tasks = [task(tmp_path, ext=".flac")]
+    assert run(cache, tasks)[0] == tasks
+
+
+@pytest.mark.parametrize(
+    "changed", [{"pt_format": "safetensors"}, {"pt_dtype": "int16"}]
+)
+def test_tensor_format_and_dtype_are_keyed(tmp_path, cache, changed):
+    write(tmp_path / "a.wav", b"a")
+    options = {"pt_save": True, "pt_format": "npy", "pt_dtype": "float32"}
+    run(cache, [task(tmp_path, options=options)])
+    tasks = [task(tmp_path, options={**options, **changed})]
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_library_versions_are_keyed(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    tasks = [task(tmp_path)]
+    run(cache, tasks)
+    cache.versions = {**cache.versions, "torchaudio": "0.0.0"}
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_stat_and_hash_keys_differ(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    assert cache.task_key(*task(tmp_path), "stat") != cache.task_key(
+        *task(tmp_path), "hash"
+    )
+    # a hash key only depends on the content
+    write(tmp_path / "b.wav", b"a")
+    assert cache.task_key(*task(tmp_path), "hash") == cache.task_key(
+        *task(tmp_path, "b"), "hash"
+    )
+
+
+def test_overwriting_tasks_always_run(tmp_path, cache):
+    write(tmp_path / "a.wav", b"a")
+    path = str(tmp_path / "a.wav")
+    tasks = [(path, path, MONO, {})]
+    run(cache, tasks)
+    assert run(cache, tasks)[0] == tasks
+
+
+def test_identical_input_is_linked_and_unshared_before_overwrite(tmp_path, cache):
+    write(tmp_path / "a.wav", b"same")
+    write(tmp_path / "b.wav", b"same")
+    run(cache, [task(tmp_path, "a")], mode="hash")
+    tasks = [task(tmp_path, "a"), task(tmp_path, "b")]
+    assert run(cache, tasks, mode="hash") == ([], 1, 1)
+    assert os.path.samefile(tmp_path / "a_out.wav", tmp_path / "b_out.wav")
+
+    # b changes, its linked output must be detached before it is rewritten in place
+    write(tmp_path / "b.wav", b"different")
+    remaining, pending, _, _ = cache.plan(tasks, "hash")
+    assert [t[0] for t in remaining] == [str(tmp_path / "b.wav")]
+    assert not os.path.exists(tmp_path / "b_out.wav")
+    assert os.stat(tmp_path / "a_out.wav").st_nlink == 1
+    write(tmp_path / "b_out.wav", b"out:different")
+    cache.record(pending, 0)
+    with open(tmp_path / "a_out.wav", "rb") as f:
+        assert f.read() == b"out:same"
+    assert run(cache, tasks, mode="hash") == ([], 2, 0)
@@ -0,0 +1,47 @@
+import pytest
+
+from AudioCLI.src.metadata import matches, parse_filter
+
+INFO = {"sr": 48000, "channels": 2, "frames": 96000, "duration": 2.0, "size": 400000}
+
+
+def test_parse_filter():
+    assert parse_filter("sr != 44100 and duration > 30") == [
+        ("sr", "!=", 44100.0),
+        ("duration", ">", 30.0),
+    ]
+    assert parse_filter("  channels == 1 ") == [("channels", "==", 1.0)]
+
+
+@pytest.mark.parametrize(
+    "expression,expected",
+    [
+        ("sr == 48000", True),
+        ("sr != 48000", False),
+        ("channels >= 2 and duration < 2.5", True),
+        ("channels >= 2 and duration < 2", False),
+        ("frames <= 96000 and size > 1000 and sr > 44100", True),
+    ],
+)
+def test_matches(expression, expected):
+    assert matches(INFO, parse_filter(expression)) is expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "",
+        "sr",
+        "sr ==",
+        "sr == 44100 48000",
+        "bitrate > 128",
+        "sr => 44100",
+        "sr = 44100",
+        "sr > fast",
+        "sr > 44100 or channels == 1",
+        "sr > 44100 and",
+    ],
+)
+def test_bad_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        parse_filter(expression)
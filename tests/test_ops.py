@@ -0,0 +1,48 @@
+import math
+
+import pytest
+import torch
+
+from AudioCLI.src.ops import pitch, stretch
+
+SR = 44100
+
+
+def dominant_frequency(audio, sr=SR):
+    audio = audio.reshape(-1, audio.shape[-1])[0].double()
+    spectrum = torch.fft.rfft(
+        audio * torch.hann_window(audio.shape[-1], dtype=audio.dtype)
+    )
+    return float(torch.fft.rfftfreq(audio.shape[-1], 1 / sr)[spectrum.abs().argmax()])
+
+
+def tone(frequency, seconds=2.0, channels=1):
+    t = torch.arange(int(SR * seconds)) / SR
+    return torch.sin(2 * math.pi * frequency * t).repeat(channels, 1)
+
+
+@pytest.mark.parametrize("frequency,steps", [(440, 2), (440, 12), (1000, -5)])
+def test_pitch_fast_shifts_dominant_frequency(frequency, steps):
+    audio = tone(frequency, channels=2)
+    shifted, sr = pitch(audio, SR, steps, mode="fast")
+    assert sr == SR
+    assert shifted.shape == audio.shape
+    expected = frequency * 2 ** (steps / 12)
+    # within 10 cents
+    assert abs(1200 * math.log2(dominant_frequency(shifted) / expected)) < 10
+
+
+def test_pitch_fast_batched():
+    audio = torch.stack([tone(440), tone(1000)])
+    shifted, _ = pitch(audio, SR, 3, mode="fast")
+    assert shifted.shape == audio.shape
+    for item, frequency in zip(shifted, [440, 1000]):
+        expected = frequency * 2 ** (3 / 12)
+        assert abs(1200 * math.log2(dominant_frequency(item) / expected)) < 10
+
+
+@pytest.mark.parametrize("length", [44100, 60000, 30000])
+def test_stretch_keeps_frequency(length):
+    stretched = stretch(tone(440, seconds=1.0), length)
+    assert stretched.shape == (1, length)
+    assert abs(dominant_frequency(stretched) - 440) < 3
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from AudioCLI.src import scan_index
+from AudioCLI.src.scan_index import ScanIndex
+
+EXTS = [".wav", ".flac"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ScanIndex(str(tmp_path / "index.db"))
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "audio"
+    (root / "sub").mkdir(parents=True)
+    for path in ["a.wav", "notes.txt", "sub/b.flac"]:
+        (root / path).write_bytes(b"x")
+    return root
+
+
+@pytest.fixture
+def listed(monkeypatch):
+    """Directories listed by os.scandir in the scan index."""
+    calls = []
+    scandir = os.scandir
+
+    def counting(path):
+        calls.append(os.path.relpath(path))
+        return scandir(path)
+
+    monkeypatch.setattr(scan_index.os, "scandir", counting)
+    return calls
+
+
+def bump(path):
+    # directory mtimes can stay the same within one clock tick, move them on explicitly
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def names(paths, root):
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_scan_lists_audio_files(index, root):
+    assert names(index.scan(str(root), EXTS), root) == ["a.wav", "sub/b.flac"]
+    assert names(index.scan(str(root), EXTS, recursive=False), root) == ["a.wav"]
+    assert index.files(str(root)) == index.scan(str(root), EXTS)
+
+
+def test_unknown_root_has_no_files(index, root):
+    assert index.files(str(root)) is None
+
+
+def test_unchanged_directories_are_not_listed_again(index, root, listed):
+    index.scan(str(root), EXTS)
+    assert len(listed) == 2
+    listed.clear()
+    assert names(index.scan(str(root), EXTS), root) == ["a.wav", "sub/b.flac"]
+    assert listed == []
+
+
+def test_added_file_is_found(index, root, listed):
+    index.scan(str(root), EXTS)
+    listed.clear()
+    (root / "sub" / "c.wav").write_bytes(b"x")
+    bump(root / "sub")
+    assert names(index.scan(str(root), EXTS), root) == [
+        "a.wav",
+        "sub/b.flac",
+        "sub/c.wav",
+    ]
+    # only the changed directory is listed again
+    assert listed == [os.path.relpath(root / "sub")]
+
+
+def test_deleted_file_is_dropped(index, root):
+    index.scan(str(root), EXTS)
+    (root / "a.wav").unlink()
+    bump(root)
+    assert names(index.scan(str(root), EXTS), root) == ["sub/b.flac"]
+
+
+def test_touched_file_stays_listed(index, root, listed):
+    index.scan(str(root), EXTS)
+    listed.clear()
+    bump(root / "a.wav")
+    assert names(index.scan(str(root), EXTS), root) == ["a.wav", "sub/b.flac"]
+    assert listed == []
+
+
+def test_deleted_directory_is_forgotten(index, root):
+    index.scan(str(root), EXTS)
+    (root / "sub" / "b.flac").unlink()
+    (root / "sub").rmdir()
+    bump(root)
+    assert names(index.scan(str(root), EXTS), root) == ["a.wav"]
+
+
+def test_new_subdirectory_is_scanned(index, root):
+    index.scan(str(root), EXTS)
+    (root / "new" / "deep").mkdir(parents=True)
+    (root / "new" / "deep" / "d.wav").write_bytes(b"x")
+    bump(root)
+    assert "new/deep/d.wav" in names(index.scan(str(root), EXTS), root)
+
+
+def test_unlistable_path_is_skipped_and_retried(index, tmp_path):
+    path = tmp_path / "file.wav"
+    path.write_bytes(b"x")
+    assert index.scan(str(path), EXTS) == []
+    assert index.files(str(path)) is None
+    # it is listed again on the next scan once it is a directory
+    path.unlink()
+    path.mkdir()
+    (path / "e.wav").write_bytes(b"x")
+    assert names(index.scan(str(path), EXTS), path) == ["e.wav"]
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+
+from AudioCLI.src.ops import apply_stages
+from AudioCLI.src.stream import BlockResample, stream_file
+
+
+def sine(sr, frames, frequency=440.0, channels=2):
+    t = np.arange(frames) / sr
+    return np.stack(
+        [0.5 * np.sin(2 * math.pi * frequency * (c + 1) * t) for c in range(channels)]
+    ).astype(np.float32)
+
+
+@pytest.mark.parametrize("sr,new_sr", [(44100, 16000), (16000, 44100), (48000, 44100)])
+@pytest.mark.parametrize("frames", [44100, 12345])
+@pytest.mark.parametrize("block_size", [1000, 4096, 100000])
+def test_block_resample_matches_whole_file(sr, new_sr, frames, block_size):
+    audio = sine(sr, frames)
+    expected, _, _ = apply_stages(
+        torch.from_numpy(audio), sr, [("resample", {"sample_rate": new_sr})]
+    )
+    op = BlockResample(sr, new_sr)
+    blocks = [
+        op.process(audio[:, start : start + block_size])
+        for start in range(0, frames, block_size)
+    ]
+    result = np.concatenate(blocks + [op.flush()], axis=-1)
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected.numpy(), atol=1e-5)
+
+
+def test_block_resample_same_rate_passes_through():
+    audio = sine(44100, 1000)
+    op = BlockResample(44100, 44100)
+    assert op.process(audio) is audio
+    assert op.flush() is None
+
+
+@pytest.mark.parametrize(
+    "stages",
+    [
+        [("resample", {"sample_rate": 16000})],
+        [("mono", {}), ("resample", {"sample_rate": 22050}), ("phaseflip", {})],
+        [("resample", {"sample_rate": 32000}), ("bitdepth", {"bit_depth": 16})],
+    ],
+)
+def test_stream_file_matches_whole_file(tmp_path, stages):
+    src = str(tmp_path / "in.wav")
+    dst = str(tmp_path / "out.wav")
+    sf.write(src, sine(44100, 30000).T, 44100, subtype="FLOAT")
+    stream_file(src, dst, stages, block_size=4096)
+
+    expected, sr, bits = apply_stages(
+        torch.from_numpy(sine(44100, 30000)), 44100, stages
+    )
+    result, out_sr = sf.read(dst, always_2d=True, dtype="float32")
+    assert out_sr == sr
+    assert result.T.shape == expected.shape
+    # one step of the output bit depth when it is quantized on saving
+    atol = 2.0 ** (1 - bits) if bits else 1e-5
+    np.testing.assert_allclose(result.T, expected.numpy(), atol=atol)
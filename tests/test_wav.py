@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+
+from AudioCLI.src.ops import apply_stages, quantize
+from AudioCLI.src.util import load_file
+from AudioCLI.src.wav import can_pcm, decode, encode, parse_wav, pcm_file
+
+SR = 8000
+SUBTYPES = {8: "PCM_U8", 16: "PCM_16", 24: "PCM_24"}
+
+
+def write_wav(path, bits, channels, frames=3000, seed=0):
+    """Random full scale samples including both extremes, returns them as integers on the signed scale of bits."""
+    rng = np.random.default_rng(seed)
+    limit = 1 << (bits - 1)
+    values = rng.integers(-limit, limit, size=(frames, channels))
+    values[:channels] = -limit
+    values[channels : 2 * channels] = limit - 1
+    sf.write(path, values / limit, SR, subtype=SUBTYPES[bits])
+    return values
+
+
+def stage(name, **args):
+    return (name, args)
+
+
+@pytest.mark.parametrize("bits", [8, 16, 24])
+def test_decode_encode_roundtrip(tmp_path, bits):
+    path = str(tmp_path / "in.wav")
+    values = write_wav(path, bits, 2)
+    info = parse_wav(path)
+    assert (info.bits, info.channels, info.frames) == (bits, 2, len(values))
+    with open(path, "rb") as f:
+        f.seek(info.offset)
+        raw = f.read()
+    block = np.frombuffer(raw, dtype={8: "u1", 16: "<i2", 24: "V3"}[bits]).reshape(
+        -1, 2
+    )
+    decoded = decode(block, bits)
+    # 24 bit samples are sign extended, 8 bit samples lose their 128 offset
+    np.testing.assert_array_equal(decoded, values)
+    assert encode(decoded, bits) == raw
+
+
+@pytest.mark.parametrize("in_bits", [8, 16, 24])
+@pytest.mark.parametrize("channels", [1, 2, 3])
+@pytest.mark.parametrize("op", [None, "mono", "stereo"])
+@pytest.mark.parametrize("out_bits", [8, 16, 24])
+def test_pcm_file_matches_float_path(tmp_path, in_bits, channels, op, out_bits):
+    src = str(tmp_path / "in.wav")
+    dst = str(tmp_path / "out.wav")
+    write_wav(src, in_bits, channels)
+    stages = ([stage(op)] if op else []) + [stage("bitdepth", bit_depth=out_bits)]
+    assert can_pcm(src, dst, stages, {})
+    pcm_file(src, dst, stages, block_frames=1000)
+
+    audio, sr = load_file(src)
+    expected, _, bits = apply_stages(audio, sr, stages)
+    expected = quantize(expected, bits)
+    info = sf.info(dst)
+    assert info.subtype == SUBTYPES[out_bits]
+    assert info.samplerate == SR
+    result = torch.from_numpy(sf.read(dst, always_2d=True)[0].T.copy())
+    assert result.shape == expected.shape
+    # within one step of the output bit depth
+    lsb = 2.0 ** (1 - out_bits)
+    assert float((result - expected.double()).abs().max()) <= lsb * 1.001
+
+
+@pytest.mark.parametrize(
+    "stages",
+    [
+        [stage("mono")],
+        [stage("stereo")],
+        [stage("bitdepth", bit_depth=32)],
+        [stage("bitdepth", bit_depth=16), stage("mono")],
+        [stage("resample", sample_rate=16000), stage("bitdepth", bit_depth=16)],
+    ],
+)
+def test_float_output_chains_skip_pcm_path(tmp_path, stages):
+    src = str(tmp_path / "in.wav")
+    write_wav(src, 16, 2)
+    assert not can_pcm(src, str(tmp_path / "out.wav"), stages, {})
+
+
+def test_pcm_path_skips_tensor_output(tmp_path):
+    src = str(tmp_path / "in.wav")
+    write_wav(src, 16, 2)
+    stages = [stage("mono"), stage("bitdepth", bit_depth=16)]
+    assert not can_pcm(src, str(tmp_path / "out.wav"), stages, {"pt_save": True})
+    assert not can_pcm(src, str(tmp_path / "out.flac"), stages, {})